@@ -9,6 +9,8 @@ from core.utils.util import get_local_ip, validate_mcp_endpoint
 from core.http_server import SimpleHttpServer
 from core.websocket_server import WebSocketServer
 from core.utils.util import check_ffmpeg_installed
+from core.utils.http_client import get_http_clients
+from core.utils.tts_ws_pool import get_tts_ws_pools
 
 TAG = __name__
 logger = setup_logging()
@@ -128,6 +130,15 @@ async def main():
             timeout=3.0,
             return_when=asyncio.ALL_COMPLETED,
         )
+        # 输出各主机的连接复用情况，并关闭共享的HTTP连接池
+        http_clients = get_http_clients()
+        http_clients.log_stats()
+        await http_clients.close_async()
+        http_clients.close()
+        # 关闭TTS连接池中的空闲WebSocket连接
+        tts_ws_pools = get_tts_ws_pools()
+        tts_ws_pools.log_stats()
+        await tts_ws_pools.close_async()
         print("服务器已关闭，程序退出。")
 
 
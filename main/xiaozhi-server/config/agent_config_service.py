@@ -0,0 +1,138 @@
+"""
+设备差异化配置服务
+设备连接时需要从manager-api获取智能体配置。这里按设备缓存结果，同一设备并发连接只请求一次，
+缓存过期后先返回旧配置并在后台刷新，请求失败时退回旧配置，避免manager-api变慢时拖住所有连接
+"""
+
+import time
+import copy
+import asyncio
+from typing import Dict, Optional, Tuple
+from config.logger import setup_logging
+from config.manage_api_client import (
+    ManageApiClient,
+    DeviceNotFoundException,
+    DeviceBindException,
+    get_agent_models_async,
+)
+
+TAG = __name__
+logger = setup_logging()
+
+# 缓存有效期（秒），期间直接使用缓存
+DEFAULT_TTL = 60
+# 过期后仍可先返回旧配置、后台刷新的时长（秒）
+DEFAULT_STALE_TTL = 600
+
+
+class AgentConfigService:
+    """按 (设备ID, 客户端ID) 缓存差异化配置"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, stale_ttl: float = DEFAULT_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # key -> (获取时间, 配置)
+        self._cache: Dict[Tuple[str, str], Tuple[float, dict]] = {}
+        # key -> 正在进行的请求
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # 缓存失效的次数，用于丢弃失效前发出的请求结果
+        self._generation = 0
+
+    async def get(self, config: dict, device_id: str, client_id: str) -> dict:
+        """获取设备的差异化配置，返回副本，调用方可以随意修改"""
+        key = (device_id, client_id)
+        entry = self._cache.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                return copy.deepcopy(entry[1])
+            if age < self.stale_ttl:
+                # 先返回旧配置，后台刷新
+                self._fetch(key, config["selected_module"]).add_done_callback(
+                    self._log_refresh_error
+                )
+                return copy.deepcopy(entry[1])
+
+        try:
+            private_config = await asyncio.shield(
+                self._fetch(key, config["selected_module"])
+            )
+        except (DeviceNotFoundException, DeviceBindException):
+            raise
+        except Exception as e:
+            entry = self._cache.get(key)
+            if entry is None:
+                raise
+            logger.bind(tag=TAG).warning(
+                f"获取差异化配置失败，使用缓存的旧配置: {device_id}, {e}"
+            )
+            private_config = entry[1]
+        return copy.deepcopy(private_config)
+
+    def invalidate(self, device_id: Optional[str] = None):
+        """使缓存失效，不指定设备时清空全部"""
+        self._generation += 1
+        if device_id is None:
+            self._cache.clear()
+            self._inflight.clear()
+            return
+        for key in [k for k in self._cache if k[0] == device_id]:
+            self._cache.pop(key, None)
+        for key in [k for k in self._inflight if k[0] == device_id]:
+            self._inflight.pop(key, None)
+
+    def _fetch(self, key: Tuple[str, str], selected_module: dict) -> asyncio.Future:
+        """同一设备同时只发出一个请求，其余调用共享结果"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, selected_module))
+            # 等待者全部取消时也要取出异常，避免未处理异常的警告
+            future.add_done_callback(self._consume_exception)
+            self._inflight[key] = future
+        return future
+
+    async def _load(self, key: Tuple[str, str], selected_module: dict) -> dict:
+        generation = self._generation
+        try:
+            private_config = await get_agent_models_async(key[0], key[1], selected_module)
+            if private_config is None:
+                raise Exception("差异化配置为空")
+            # 请求期间缓存被清空（例如配置更新），结果不写入缓存
+            if generation == self._generation:
+                self._cache[key] = (time.monotonic(), private_config)
+            return private_config
+        except (DeviceNotFoundException, DeviceBindException):
+            # 设备已解绑，旧配置不再可用
+            self._cache.pop(key, None)
+            raise
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                self._inflight.pop(key, None)
+
+    @staticmethod
+    def _consume_exception(future: asyncio.Future):
+        if not future.cancelled():
+            future.exception()
+
+    @staticmethod
+    def _log_refresh_error(future: asyncio.Future):
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e is not None:
+            logger.bind(tag=TAG).warning(f"后台刷新差异化配置失败: {e}")
+
+
+_agent_config_service = None
+
+
+def get_agent_config_service() -> AgentConfigService:
+    """获取全局差异化配置服务，缓存时间取自manager-api配置"""
+    global _agent_config_service
+    if _agent_config_service is None:
+        api_config = getattr(ManageApiClient, "config", None) or {}
+        _agent_config_service = AgentConfigService(
+            ttl=api_config.get("agent_config_ttl", DEFAULT_TTL),
+            stale_ttl=api_config.get("agent_config_stale_ttl", DEFAULT_STALE_TTL),
+        )
+    return _agent_config_service
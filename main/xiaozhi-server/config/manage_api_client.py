@@ -1,12 +1,25 @@
 import os
 import time
 import base64
+import asyncio
 from typing import Optional, Dict
 
 import httpx
 
 TAG = __name__
 
+_logger = None
+
+
+def _get_logger():
+    """延迟初始化 logger 以避免循环导入（config.logger 依赖 config_loader，而后者导入本模块）"""
+    global _logger
+    if _logger is None:
+        from config.logger import setup_logging
+
+        _logger = setup_logging()
+    return _logger.bind(tag=TAG)
+
 
 class DeviceNotFoundException(Exception):
     pass
@@ -18,9 +31,45 @@ class DeviceBindException(Exception):
         super().__init__(f"设备绑定异常，绑定码: {bind_code}")
 
 
+class CircuitOpenException(Exception):
+    """manager-api连续失败，熔断期间不再发起请求"""
+
+    pass
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却时间过后放行一次试探请求"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # 半开状态：放行一次，失败后重新计时
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
 class ManageApiClient:
     _instance = None
     _client = None
+    _async_client = None
+    _async_loop = None
     _secret = None
 
     def __new__(cls, config):
@@ -47,6 +96,13 @@ class ManageApiClient:
         cls._secret = cls.config.get("secret")
         cls.max_retries = cls.config.get("max_retries", 6)  # 最大重试次数
         cls.retry_delay = cls.config.get("retry_delay", 10)  # 初始重试延迟(秒)
+        # 异步请求在连接建立时调用，重试次数和延迟更小，并且不阻塞事件循环
+        cls.async_max_retries = cls.config.get("async_max_retries", 2)
+        cls.async_retry_delay = cls.config.get("async_retry_delay", 1)
+        cls.circuit_breaker = CircuitBreaker(
+            failure_threshold=cls.config.get("circuit_failure_threshold", 5),
+            reset_timeout=cls.config.get("circuit_reset_timeout", 30),
+        )
         # NOTE(goody): 2025/4/16 http相关资源统一管理，后续可以增加线程池或者超时
         # 后续也可以统一配置apiToken之类的走通用的Auth
         cls._client = httpx.Client(
@@ -59,11 +115,35 @@ class ManageApiClient:
             timeout=cls.config.get("timeout", 30),  # 默认超时时间30秒
         )
 
+    @classmethod
+    def _get_async_client(cls) -> httpx.AsyncClient:
+        """异步客户端绑定在当前事件循环上，首次使用时创建"""
+        loop = asyncio.get_running_loop()
+        if cls._async_client is None or cls._async_loop is not loop:
+            cls._async_client = httpx.AsyncClient(
+                base_url=cls._client.base_url,
+                headers=cls._client.headers,
+                timeout=cls._client.timeout,
+            )
+            cls._async_loop = loop
+        return cls._async_client
+
     @classmethod
     def _request(cls, method: str, endpoint: str, **kwargs) -> Dict:
         """发送单次HTTP请求并处理响应"""
         endpoint = endpoint.lstrip("/")
         response = cls._client.request(method, endpoint, **kwargs)
+        return cls._parse_response(response)
+
+    @classmethod
+    async def _request_async(cls, method: str, endpoint: str, **kwargs) -> Dict:
+        """异步发送单次HTTP请求并处理响应"""
+        endpoint = endpoint.lstrip("/")
+        response = await cls._get_async_client().request(method, endpoint, **kwargs)
+        return cls._parse_response(response)
+
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> Dict:
         response.raise_for_status()
 
         result = response.json()
@@ -108,8 +188,8 @@ class ManageApiClient:
                 # 判断是否应该重试
                 if retry_count < cls.max_retries and cls._should_retry(e):
                     retry_count += 1
-                    print(
-                        f"{method} {endpoint} 请求失败，将在 {cls.retry_delay:.1f} 秒后进行第 {retry_count} 次重试"
+                    _get_logger().warning(
+                        f"{method} {endpoint} 请求失败: {e}，将在 {cls.retry_delay:.1f} 秒后进行第 {retry_count} 次重试"
                     )
                     time.sleep(cls.retry_delay)
                     continue
@@ -117,6 +197,34 @@ class ManageApiClient:
                     # 不重试，直接抛出异常
                     raise
 
+    @classmethod
+    async def _execute_request_async(cls, method: str, endpoint: str, **kwargs) -> Dict:
+        """带重试和熔断的异步请求执行器，重试等待期间不阻塞事件循环"""
+        retry_count = 0
+
+        while True:
+            if not cls.circuit_breaker.allow():
+                raise CircuitOpenException(f"manager-api暂不可用，{endpoint} 请求已熔断")
+            try:
+                result = await cls._request_async(method, endpoint, **kwargs)
+                cls.circuit_breaker.record_success()
+                return result
+            except Exception as e:
+                if not cls._should_retry(e):
+                    # 业务错误说明服务本身可用
+                    cls.circuit_breaker.record_success()
+                    raise
+                cls.circuit_breaker.record_failure()
+                if retry_count >= cls.async_max_retries:
+                    raise
+                retry_count += 1
+                # 指数退避
+                delay = cls.async_retry_delay * (2 ** (retry_count - 1))
+                _get_logger().warning(
+                    f"{method} {endpoint} 请求失败: {e}，将在 {delay:.1f} 秒后进行第 {retry_count} 次重试"
+                )
+                await asyncio.sleep(delay)
+
     @classmethod
     def safe_close(cls):
         """安全关闭连接池"""
@@ -145,6 +253,21 @@ def get_agent_models(
     )
 
 
+async def get_agent_models_async(
+    mac_address: str, client_id: str, selected_module: Dict
+) -> Optional[Dict]:
+    """异步获取代理模型配置"""
+    return await ManageApiClient._instance._execute_request_async(
+        "POST",
+        "/config/agent-models",
+        json={
+            "macAddress": mac_address,
+            "clientId": client_id,
+            "selectedModule": selected_module,
+        },
+    )
+
+
 def save_mem_local_short(mac_address: str, short_momery: str) -> Optional[Dict]:
     try:
         return ManageApiClient._instance._execute_request(
@@ -155,7 +278,7 @@ def save_mem_local_short(mac_address: str, short_momery: str) -> Optional[Dict]:
             },
         )
     except Exception as e:
-        print(f"存储短期记忆到服务器失败: {e}")
+        _get_logger().error(f"存储短期记忆到服务器失败: {e}")
         return None
 
 
@@ -181,7 +304,7 @@ def report(
             },
         )
     except Exception as e:
-        print(f"TTS上报失败: {e}")
+        _get_logger().error(f"TTS上报失败: {e}")
         return None
 
 
@@ -4,7 +4,7 @@ from aiohttp import web
 from config.logger import setup_logging
 from core.utils.util import get_vision_url, is_valid_image_file
 from core.utils.vllm import create_instance
-from config.config_loader import get_private_config_from_api
+from config.agent_config_service import get_agent_config_service
 from core.utils.auth import AuthToken
 import base64
 from typing import Tuple, Optional
@@ -96,7 +96,7 @@ class VisionHandler:
             current_config = copy.deepcopy(self.config)
             read_config_from_api = current_config.get("read_config_from_api", False)
             if read_config_from_api:
-                current_config = get_private_config_from_api(
+                current_config = await get_agent_config_service().get(
                     current_config,
                     device_id,
                     client_id,
@@ -10,6 +10,7 @@ import threading
 import traceback
 import subprocess
 import websockets
+import opuslib_next
 from core.utils.util import (
     extract_json_from_string,
     check_vad_update,
@@ -25,7 +26,6 @@ from core.utils.modules_initialize import (
 )
 from core.handle.reportHandle import report
 from core.providers.tts.default import DefaultTTS
-from concurrent.futures import ThreadPoolExecutor
 from core.utils.dialogue import Message, Dialogue
 from core.providers.asr.dto.dto import InterfaceType
 from core.handle.textHandle import handleTextMessage
@@ -33,12 +33,21 @@ from core.providers.tools.unified_tool_handler import UnifiedToolHandler
 from plugins_func.loadplugins import auto_import_modules
 from plugins_func.register import Action, ActionResponse
 from core.auth import AuthMiddleware, AuthenticationError
-from config.config_loader import get_private_config_from_api
+from config.agent_config_service import get_agent_config_service
 from core.providers.tts.dto.dto import ContentType, TTSMessageDTO, SentenceType
 from config.logger import setup_logging, build_module_string, create_connection_logger
 from config.manage_api_client import DeviceNotFoundException, DeviceBindException
 from core.utils.prompt_manager import PromptManager
 from core.utils.voiceprint_provider import VoiceprintProvider
+from core.utils.audio_ring_buffer import AudioRingBuffer
+from core.utils.audio_decode import PCMResampler
+from core.utils.opus_codec import (
+    DEFAULT_AUDIO_PARAMS,
+    MAX_PACKET_DURATION_MS,
+    SAMPLE_RATE,
+)
+from core.utils.worker_pool import AsyncQueue, get_worker_pool, get_chat_pool
+from core.utils.model_registry import get_model_registry
 from core.utils import textUtils
 
 TAG = __name__
@@ -81,6 +90,10 @@ class ConnectionHandler:
         self.max_output_size = 0
         self.chat_history_conf = 0
         self.audio_format = "opus"
+        # hello中协商的采样率和帧时长，下行编码、播放节奏和上行解码都按此处理
+        self.audio_params = DEFAULT_AUDIO_PARAMS
+        # 下行音频流控，首次发送音频时按协商的帧时长创建
+        self.audio_flow_controller = None
 
         # 客户端状态相关
         self.client_abort = False
@@ -90,11 +103,15 @@ class ConnectionHandler:
         # 线程任务相关
         self.loop = asyncio.get_event_loop()
         self.stop_event = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=5)
-
-        # 添加上报线程池
-        self.report_queue = queue.Queue()
-        self.report_thread = None
+        # 阻塞任务提交到所有连接共享的线程池，队列消费者作为事件循环中的任务运行
+        self.executor = get_worker_pool().executor_for(self)
+        # LLM对话整段流式输出期间占用线程，使用单独的线程池，不占用TTS等任务的线程
+        self.chat_executor = get_chat_pool().executor_for(self)
+        self.worker_tasks = set()
+
+        # 添加上报队列
+        self.report_queue = AsyncQueue()
+        self.report_task = None
         # 未来可以通过修改此处，调节asr的上报和tts的上报，目前默认都开启
         self.report_asr_enable = self.read_config_from_api
         self.report_tts_enable = self.read_config_from_api
@@ -105,6 +122,8 @@ class ConnectionHandler:
         self.tts = None
         self._asr = _asr
         self._vad = _vad
+        # 从共享模型注册表获得的实例，连接关闭时释放引用
+        self._model_refs = []
         self.llm = _llm
         self.memory = _memory
         self.intent = _intent
@@ -113,7 +132,14 @@ class ConnectionHandler:
         self.voiceprint_provider = None
 
         # vad相关变量
-        self.client_audio_buffer = bytearray()
+        # 解码后的PCM音频环形缓冲区，VAD按窗口读取，ASR按整句读取
+        self.audio_buffer = AudioRingBuffer()
+        # 每个音频包只在接收时解码一次，VAD、ASR和声纹识别共享解码结果
+        self.audio_decoder = opuslib_next.Decoder(SAMPLE_RATE, 1)
+        # PCM上行的重采样状态跨包保留，首个PCM包到达时按协商的采样率创建
+        self.uplink_resampler = None
+        self.last_pcm_frame = b""
+        self.vad_read_pos = 0
         self.client_have_voice = False
         self.last_activity_time = 0.0  # 统一的活动时间戳（毫秒）
         self.client_voice_stop = False
@@ -124,7 +150,9 @@ class ConnectionHandler:
         # 因为实际部署时可能会用到公共的本地ASR，不能把变量暴露给公共ASR
         # 所以涉及到ASR的变量，需要在这里定义，属于connection的私有变量
         self.asr_audio = []
-        self.asr_audio_queue = queue.Queue()
+        # 当前语音（含预录音）在audio_buffer中的起始位置
+        self.asr_audio_start = 0
+        self.asr_audio_queue = asyncio.Queue()
 
         # llm相关变量
         self.llm_finish_task = True
@@ -208,11 +236,12 @@ class ConnectionHandler:
             # 启动超时检查任务
             self.timeout_task = asyncio.create_task(self._check_timeout())
 
-            self.welcome_msg = self.config["xiaozhi"]
+            # 复制一份，hello中协商的音频参数只影响当前连接
+            self.welcome_msg = copy.deepcopy(self.config["xiaozhi"])
             self.welcome_msg["session_id"] = self.session_id
 
             # 获取差异化配置
-            self._initialize_private_config()
+            await self._initialize_private_config()
             # 异步初始化
             self.executor.submit(self._initialize_components)
 
@@ -263,8 +292,8 @@ class ConnectionHandler:
                         except Exception:
                             pass
 
-                # 启动线程保存记忆，不等待完成
-                threading.Thread(target=save_memory_task, daemon=True).start()
+                # 保存记忆需要调用LLM，提交到对话线程池，不等待完成
+                self.chat_executor.submit(save_memory_task)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"保存记忆失败: {e}")
         finally:
@@ -285,7 +314,7 @@ class ConnectionHandler:
                 return
             if self.asr is None:
                 return
-            self.asr_audio_queue.put(message)
+            self.asr_audio_queue.put_nowait(message)
 
     async def handle_restart(self, message):
         """处理服务器重启请求"""
@@ -355,6 +384,7 @@ class ConnectionHandler:
             """初始化本地组件"""
             if self.vad is None:
                 self.vad = self._vad
+                self._retain_model(self.vad)
             if self.asr is None:
                 self.asr = self._initialize_asr()
 
@@ -376,8 +406,8 @@ class ConnectionHandler:
             self._initialize_memory()
             """加载意图识别"""
             self._initialize_intent()
-            """初始化上报线程"""
-            self._init_report_threads()
+            """初始化上报任务"""
+            self.loop.call_soon_threadsafe(self._init_report_task)
             """更新系统提示词"""
             self._init_prompt_enhancement()
 
@@ -394,18 +424,22 @@ class ConnectionHandler:
             self.change_system_prompt(enhanced_prompt)
             self.logger.bind(tag=TAG).info("系统提示词已增强更新")
 
-    def _init_report_threads(self):
-        """初始化ASR和TTS上报线程"""
+    def _init_report_task(self):
+        """初始化ASR和TTS上报任务，需在事件循环线程中调用"""
         if not self.read_config_from_api or self.need_bind:
             return
         if self.chat_history_conf == 0:
             return
-        if self.report_thread is None or not self.report_thread.is_alive():
-            self.report_thread = threading.Thread(
-                target=self._report_worker, daemon=True
-            )
-            self.report_thread.start()
-            self.logger.bind(tag=TAG).info("TTS上报线程已启动")
+        if self.report_task is None or self.report_task.done():
+            self.report_task = self.create_worker_task(self._report_worker())
+            self.logger.bind(tag=TAG).info("TTS上报任务已启动")
+
+    def create_worker_task(self, coro) -> asyncio.Task:
+        """创建连接级的后台任务，连接关闭时统一取消"""
+        task = self.loop.create_task(coro)
+        self.worker_tasks.add(task)
+        task.add_done_callback(self.worker_tasks.discard)
+        return task
 
     def _initialize_tts(self):
         """初始化TTS"""
@@ -424,6 +458,7 @@ class ConnectionHandler:
             # 如果公共ASR是本地服务，则直接返回
             # 因为本地一个实例ASR，可以被多个连接共享
             asr = self._asr
+            self._retain_model(asr)
         else:
             # 如果公共ASR是远程服务，则初始化一个新实例
             # 因为远程ASR，涉及到websocket连接和接收线程，需要每个连接一个实例
@@ -443,14 +478,15 @@ class ConnectionHandler:
         except Exception as e:
             self.logger.bind(tag=TAG).warning(f"声纹识别初始化失败: {str(e)}")
 
-    def _initialize_private_config(self):
+    async def _initialize_private_config(self):
         """如果是从配置文件获取，则进行二次实例化"""
         if not self.read_config_from_api:
             return
         """从接口获取差异化的配置进行二次实例化，非全量重新实例化"""
         try:
             begin_time = time.time()
-            private_config = get_private_config_from_api(
+            # 异步获取，带缓存和并发去重，manager-api变慢时不阻塞事件循环
+            private_config = await get_agent_config_service().get(
                 self.config,
                 self.headers.get("device-id"),
                 self.headers.get("client-id", self.headers.get("device-id")),
@@ -471,6 +507,11 @@ class ConnectionHandler:
             self.logger.bind(tag=TAG).error(f"获取差异化配置失败: {e}")
             private_config = {}
 
+        # 二次实例化组件较慢，放到线程池中执行
+        await self.executor.run(self._apply_private_config, private_config)
+
+    def _apply_private_config(self, private_config):
+        """用差异化配置覆盖默认配置，并重新实例化变化的组件"""
         init_llm, init_tts, init_memory, init_intent = (
             False,
             False,
@@ -559,8 +600,10 @@ class ConnectionHandler:
             self.tts = modules["tts"]
         if modules.get("vad", None) is not None:
             self.vad = modules["vad"]
+            self._model_refs.append(self.vad)
         if modules.get("asr", None) is not None:
             self.asr = modules["asr"]
+            self._model_refs.append(self.asr)
         if modules.get("llm", None) is not None:
             self.llm = modules["llm"]
         if modules.get("intent", None) is not None:
@@ -568,6 +611,11 @@ class ConnectionHandler:
         if modules.get("memory", None) is not None:
             self.memory = modules["memory"]
 
+    def _retain_model(self, instance):
+        """使用服务器的共享模型时增加引用，避免配置更新后被卸载"""
+        if instance is not None and get_model_registry().retain(instance):
+            self._model_refs.append(instance)
+
     def _initialize_memory(self):
         if self.memory is None:
             return
@@ -886,12 +934,11 @@ class ConnectionHandler:
         else:
             pass
 
-    def _report_worker(self):
-        """聊天记录上报工作线程"""
-        while not self.stop_event.is_set():
-            try:
-                # 从队列获取数据，设置超时以便定期检查停止事件
-                item = self.report_queue.get(timeout=1)
+    async def _report_worker(self):
+        """聊天记录上报任务"""
+        try:
+            while not self.stop_event.is_set():
+                item = await self.report_queue.get_async()
                 if item is None:  # 检测毒丸对象
                     break
                 try:
@@ -901,13 +948,9 @@ class ConnectionHandler:
                     # 提交任务到线程池
                     self.executor.submit(self._process_report, *item)
                 except Exception as e:
-                    self.logger.bind(tag=TAG).error(f"聊天记录上报线程异常: {e}")
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.bind(tag=TAG).error(f"聊天记录上报工作线程异常: {e}")
-
-        self.logger.bind(tag=TAG).info("聊天记录上报线程已退出")
+                    self.logger.bind(tag=TAG).error(f"聊天记录上报任务异常: {e}")
+        finally:
+            self.logger.bind(tag=TAG).info("聊天记录上报任务已退出")
 
     def _process_report(self, type, text, audio_data, report_time):
         """处理上报任务"""
@@ -949,6 +992,12 @@ class ConnectionHandler:
             if self.stop_event:
                 self.stop_event.set()
 
+            # 取消队列消费任务（关闭可能由其中某个任务发起，不取消自身）
+            current_task = asyncio.current_task()
+            for task in list(self.worker_tasks):
+                if task is not current_task:
+                    task.cancel()
+
             # 清空任务队列
             self.clear_queues()
 
@@ -991,15 +1040,24 @@ class ConnectionHandler:
             if self.tts:
                 await self.tts.close()
 
-            # 最后关闭线程池（避免阻塞）
-            if self.executor:
+            # 释放共享模型的引用
+            registry = get_model_registry()
+            for instance in self._model_refs:
+                registry.release(instance)
+            self._model_refs.clear()
+
+            # 最后停止向共享线程池提交任务（避免阻塞）
+            for executor in (self.executor, self.chat_executor):
+                if not executor:
+                    continue
                 try:
-                    self.executor.shutdown(wait=False)
+                    executor.shutdown(wait=False)
                 except Exception as executor_error:
                     self.logger.bind(tag=TAG).error(
                         f"关闭线程池时出错: {executor_error}"
                     )
-                self.executor = None
+            self.executor = None
+            self.chat_executor = None
 
             self.logger.bind(tag=TAG).info("连接资源已释放")
         except Exception as e:
@@ -1012,6 +1070,8 @@ class ConnectionHandler:
     def clear_queues(self):
         """清空所有任务队列"""
         if self.tts:
+            # 先丢弃进行中的合成任务，避免清空后结果又进入音频队列
+            self.tts.cancel_synthesis()
             self.logger.bind(tag=TAG).debug(
                 f"开始清理: TTS队列大小={self.tts.tts_text_queue.qsize()}, 音频队列大小={self.tts.tts_audio_queue.qsize()}"
             )
@@ -1034,8 +1094,42 @@ class ConnectionHandler:
                 f"清理结束: TTS队列大小={self.tts.tts_text_queue.qsize()}, 音频队列大小={self.tts.tts_audio_queue.qsize()}"
             )
 
+    def ingest_audio(self, audio: bytes) -> bytes:
+        """解码收到的音频包并写入audio_buffer，返回本包的PCM数据"""
+        if not audio:
+            self.last_pcm_frame = b""
+        elif self.audio_format == "pcm":
+            # VAD和ASR使用16kHz，其他采样率的PCM先重采样
+            sample_rate = self.audio_params.sample_rate
+            if (
+                self.uplink_resampler is None
+                or self.uplink_resampler.src_rate != sample_rate
+            ):
+                self.uplink_resampler = PCMResampler(sample_rate, SAMPLE_RATE)
+            self.last_pcm_frame = self.uplink_resampler.process(audio)
+        else:
+            try:
+                # Opus可以按任意采样率解码，统一解码为16kHz；
+                # 缓冲区按Opus包的最大时长分配，不依赖设备实际发送的帧时长
+                self.last_pcm_frame = self.audio_decoder.decode(
+                    audio, SAMPLE_RATE * MAX_PACKET_DURATION_MS // 1000
+                )
+            except opuslib_next.OpusError as e:
+                self.logger.bind(tag=TAG).info(f"解码错误: {e}")
+                self.last_pcm_frame = b""
+        self.audio_buffer.write(self.last_pcm_frame)
+        return self.last_pcm_frame
+
+    def clear_asr_audio(self):
+        """清空已缓存的语音，新的语音从当前位置开始"""
+        self.asr_audio.clear()
+        self.asr_audio_start = self.audio_buffer.write_pos
+        # 一句话结束后缓冲区缩回默认容量，长语音扩容的内存不会一直占用
+        self.audio_buffer.clear()
+
     def reset_vad_states(self):
-        self.client_audio_buffer = bytearray()
+        # 丢弃未凑满一帧的音频
+        self.vad_read_pos = self.audio_buffer.write_pos
         self.client_have_voice = False
         self.client_voice_stop = False
         self.logger.bind(tag=TAG).debug("VAD states reset.")
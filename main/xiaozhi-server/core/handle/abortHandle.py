@@ -8,6 +8,9 @@ async def handleAbortMessage(conn):
     # 设置成打断状态，会自动打断llm、tts任务
     conn.client_abort = True
     conn.clear_queues()
+    # 设备中止播放时会清空缓冲区，流控从零开始计量
+    if conn.audio_flow_controller:
+        conn.audio_flow_controller.reset()
     # 打断客户端说话状态
     await conn.websocket.send(
         json.dumps({"type": "tts", "state": "stop", "session_id": conn.session_id})
@@ -3,7 +3,8 @@ import json
 import random
 import asyncio
 from core.utils.dialogue import Message
-from core.utils.util import audio_to_data
+from core.utils.opus_codec import negotiate_audio_params
+from core.utils.audio_assets import load_audio_asset, get_audio_assets
 from core.handle.sendAudioHandle import sendAudioMessage, send_stt_message
 from core.utils.util import remove_punctuation_and_length, opus_datas_to_wav_bytes
 from core.providers.tts.dto.dto import ContentType, SentenceType
@@ -35,7 +36,17 @@ async def handleHelloMessage(conn, msg_json):
         format = audio_params.get("format")
         conn.logger.bind(tag=TAG).info(f"客户端音频格式: {format}")
         conn.audio_format = format
-        conn.welcome_msg["audio_params"] = audio_params
+        # 采样率和帧时长按设备的要求，不支持的值回退为16kHz、60ms，并在回复中告知设备
+        conn.audio_params = negotiate_audio_params(audio_params)
+        conn.logger.bind(tag=TAG).info(
+            f"协商音频参数: 采样率{conn.audio_params.sample_rate}，"
+            f"帧时长{conn.audio_params.frame_duration}ms"
+        )
+        conn.welcome_msg["audio_params"] = dict(
+            audio_params,
+            sample_rate=conn.audio_params.sample_rate,
+            frame_duration=conn.audio_params.frame_duration,
+        )
     features = msg_json.get("features")
     if features:
         conn.logger.bind(tag=TAG).info(f"客户端特性: {features}")
@@ -83,7 +94,9 @@ async def checkWakeupWords(conn, text):
 
     # 播放唤醒词回复
     conn.client_abort = False
-    opus_packets, _ = audio_to_data(response.get("file_path"))
+    opus_packets, _ = load_audio_asset(
+        response.get("file_path"), audio_params=conn.audio_params
+    )
 
     conn.logger.bind(tag=TAG).info(f"播放唤醒词回复: {response.get('text')}")
     await sendAudioMessage(conn, SentenceType.FIRST, opus_packets, response.get("text"))
@@ -133,6 +146,8 @@ async def wakeupWordsResponse(conn):
         file_path = wakeup_words_config.generate_file_path(voice)
         with open(file_path, "wb") as f:
             f.write(wav_bytes)
+        # 直接登记已编码的音频，下次唤醒时无需再转码
+        get_audio_assets().put(file_path, tts_result, audio_params=conn.audio_params)
         # 更新配置
         wakeup_words_config.update_wakeup_response(voice, file_path, result)
     finally:
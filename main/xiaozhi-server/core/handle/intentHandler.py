@@ -154,8 +154,8 @@ async def process_intent_result(conn, intent_result, original_text):
                         if text is not None:
                             speak_txt(conn, text)
 
-            # 将函数执行放在线程池中
-            conn.executor.submit(process_function_call)
+            # 函数执行后可能再请求LLM，放在对话线程池中
+            conn.chat_executor.submit(process_function_call)
             return True
         return False
     except json.JSONDecodeError as e:
@@ -3,9 +3,15 @@ import asyncio
 import time
 from core.providers.tts.dto.dto import SentenceType
 from core.utils import textUtils
+from core.utils.audio_assets import load_audio_asset
+from core.utils.opus_packet import packet_duration_ms, OpusPacketError
+from core.utils.audio_flow_control import AudioFlowController, FlowControlConfig
 
 TAG = __name__
 
+# 等待对应音频开始播放后才发送的句子文本消息，保留引用避免任务被回收
+_delayed_messages = set()
+
 
 async def sendAudioMessage(conn, sentenceType, audios, text):
     # 发送句子开始消息
@@ -17,54 +23,112 @@ async def sendAudioMessage(conn, sentenceType, audios, text):
         conn.tts.tts_audio_first_sentence = False
         pre_buffer = True
 
-    await send_tts_message(conn, "sentence_start", text)
+    if pre_buffer or text is None:
+        # 第一句立即显示；同一句后续的音频块没有文本，不需要对齐
+        await send_tts_message(conn, "sentence_start", text)
+    else:
+        # 音频提前发给了设备，文本推迟到这一句开始播放时再发，音频发送不等待
+        await send_sentence_start_at_playback(conn, text)
 
     await sendAudio(conn, audios, pre_buffer)
 
     # 发送结束消息（如果是最后一个文本）
     if conn.llm_finish_task and sentenceType == SentenceType.LAST:
+        await wait_playback(conn)
         await send_tts_message(conn, "stop", None)
         conn.client_is_speaking = False
         if conn.close_after_chat:
             await conn.close()
 
 
+def get_flow_controller(conn) -> AudioFlowController:
+    """获取连接的下行音频流控器，协商的帧时长变化时重新创建"""
+    frame_duration = conn.audio_params.frame_duration
+    controller = conn.audio_flow_controller
+    if controller is None or controller.refill_rate != 1000 / frame_duration:
+        flow_config = conn.config.get("audio_flow_control") or {}
+        controller = FlowControlConfig.create_flow_controller(
+            frame_duration,
+            flow_config.get("max_buffer_ms"),
+            flow_config.get("min_pre_buffer_ms"),
+        )
+        conn.audio_flow_controller = controller
+    return controller
+
+
+async def send_sentence_start_at_playback(conn, text):
+    """在已发送的音频播放完、这一句开始播放时发送句子文本"""
+    controller = conn.audio_flow_controller
+    delay = controller.playback_delay() if controller else 0
+    if delay <= 0:
+        await send_tts_message(conn, "sentence_start", text)
+        return
+    generation = controller.generation
+
+    async def delayed_send():
+        await asyncio.sleep(delay)
+        # 打断或新一轮播放开始后，不再显示上一轮的文本
+        if conn.client_abort or controller.generation != generation:
+            return
+        await send_tts_message(conn, "sentence_start", text)
+
+    task = asyncio.create_task(delayed_send())
+    _delayed_messages.add(task)
+    task.add_done_callback(_delayed_messages.discard)
+
+
+async def wait_playback(conn):
+    """等待设备缓冲区降到预缓冲水位，结束消息与实际播放进度对齐"""
+    controller = conn.audio_flow_controller
+    if controller is None:
+        return
+    delay = min(controller.drain_time(), FlowControlConfig.DEFAULT_MAX_WAIT_TIME)
+    if delay > 0 and not conn.client_abort:
+        await asyncio.sleep(delay)
+
+
 # 播放音频
 async def sendAudio(conn, audios, pre_buffer=True):
+    """发送音频包，pre_buffer为True表示新一轮播放开始，设备缓冲区视为空"""
     if audios is None or len(audios) == 0:
         return
-    # 流控参数优化
-    frame_duration = 60  # 帧时长（毫秒），匹配 Opus 编码
-    start_time = time.perf_counter()
-    play_position = 0
-
-    # 仅当第一句话时执行预缓冲
+    # 帧时长（毫秒），与hello中协商的一致
+    frame_duration = conn.audio_params.frame_duration
+    is_pcm = conn.audio_format == "pcm"
+    controller = get_flow_controller(conn)
     if pre_buffer:
-        pre_buffer_frames = min(3, len(audios))
-        for i in range(pre_buffer_frames):
-            await conn.websocket.send(audios[i])
-        remaining_audios = audios[pre_buffer_frames:]
-    else:
-        remaining_audios = audios
-
-    # 播放剩余音频帧
-    for opus_packet in remaining_audios:
+        controller.reset()
+    # websocket心跳测得的往返时延，用于调整预缓冲水位
+    controller.update_rtt(getattr(conn.websocket, "latency", 0) or 0)
+
+    # 设备缓冲区未满时连续发送，满了以后等降到预缓冲水位再批量补充
+    for opus_packet in audios:
+        duration = _packet_duration(conn, opus_packet, is_pcm, frame_duration)
+        frames = duration / frame_duration
+        delay = controller.acquire(frames)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            if conn.client_abort:
+                return
+            delay = controller.acquire(frames)
         if conn.client_abort:
             break
 
         # 重置没有声音的状态
         conn.last_activity_time = time.time() * 1000
 
-        # 计算预期发送时间
-        expected_time = start_time + (play_position / 1000)
-        current_time = time.perf_counter()
-        delay = expected_time - current_time
-        if delay > 0:
-            await asyncio.sleep(delay)
-
         await conn.websocket.send(opus_packet)
+        controller.record_sent_frames(frames)
+
 
-        play_position += frame_duration
+def _packet_duration(conn, packet, is_pcm, frame_duration):
+    """音频包的实际播放时长（毫秒），直通的Opus包时长可能与协商的帧时长不同"""
+    if is_pcm:
+        return len(packet) * 1000 / (conn.audio_params.sample_rate * 2)
+    try:
+        return packet_duration_ms(packet)
+    except OpusPacketError:
+        return frame_duration
 
 
 async def send_tts_message(conn, state, text=None):
@@ -81,7 +145,9 @@ async def send_tts_message(conn, state, text=None):
             stop_tts_notify_voice = conn.config.get(
                 "stop_tts_notify_voice", "config/assets/tts_notify.mp3"
             )
-            audios, _ = conn.tts.audio_to_opus_data(stop_tts_notify_voice)
+            audios, _ = load_audio_asset(
+                stop_tts_notify_voice, audio_params=conn.audio_params
+            )
             await sendAudio(conn, audios)
         # 清除服务端讲话状态
         conn.clearSpeakStatus()
@@ -119,3 +185,20 @@ async def send_stt_message(conn, text):
     )
     conn.client_is_speaking = True
     await send_tts_message(conn, "start")
+
+
+async def send_stt_partial_message(conn, text):
+    """发送流式识别的中间结果，仅用于设备实时显示，不改变会话状态"""
+    stt_text = textUtils.get_string_no_punctuation_or_emoji(text)
+    if not stt_text:
+        return
+    await conn.websocket.send(
+        json.dumps(
+            {
+                "type": "stt",
+                "state": "partial",
+                "text": stt_text,
+                "session_id": conn.session_id,
+            }
+        )
+    )
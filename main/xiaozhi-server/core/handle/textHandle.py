@@ -44,7 +44,7 @@ async def handleTextMessage(conn, message):
                     await handleAudioMessage(conn, b"")
             elif msg_json["state"] == "detect":
                 conn.client_have_voice = False
-                conn.asr_audio.clear()
+                conn.clear_asr_audio()
                 if "text" in msg_json:
                     conn.last_activity_time = time.time() * 1000
                     original_text = msg_json["text"]  # 保留原始文本
@@ -72,6 +72,14 @@ async def handleTextMessage(conn, message):
                         enqueue_asr_report(conn, original_text, [])
                         # 否则需要LLM对文字内容进行答复
                         await startToChat(conn, original_text)
+        elif msg_json["type"] == "audio_ack":
+            # 设备上报的播放位置（本轮播放开始以来已播放的毫秒数），用于校准下行流控
+            played_ms = msg_json.get("played_ms")
+            controller = conn.audio_flow_controller
+            if controller and isinstance(played_ms, (int, float)) and played_ms >= 0:
+                controller.update_device_position(
+                    played_ms / conn.audio_params.frame_duration
+                )
         elif msg_json["type"] == "iot":
             conn.logger.bind(tag=TAG).info(f"收到iot消息：{message}")
             if "descriptors" in msg_json:
@@ -1,18 +1,11 @@
 import json
 import time
-import uuid
-import hmac
-import base64
-import hashlib
 import asyncio
-import requests
 import websockets
-import opuslib_next
 import random
 from typing import Optional, Tuple, List
-from urllib import parse
-from datetime import datetime
 from config.logger import setup_logging
+from core.utils.aliyun_token import get_aliyun_token_cache
 from core.providers.asr.base import ASRProviderBase
 from core.providers.asr.dto.dto import InterfaceType
 
@@ -20,59 +13,12 @@ TAG = __name__
 logger = setup_logging()
 
 
-class AccessToken:
-    @staticmethod
-    def _encode_text(text):
-        encoded_text = parse.quote_plus(text)
-        return encoded_text.replace("+", "%20").replace("*", "%2A").replace("%7E", "~")
-
-    @staticmethod
-    def _encode_dict(dic):
-        keys = dic.keys()
-        dic_sorted = [(key, dic[key]) for key in sorted(keys)]
-        encoded_text = parse.urlencode(dic_sorted)
-        return encoded_text.replace("+", "%20").replace("*", "%2A").replace("%7E", "~")
-
-    @staticmethod
-    def create_token(access_key_id, access_key_secret):
-        parameters = {
-            "AccessKeyId": access_key_id,
-            "Action": "CreateToken",
-            "Format": "JSON",
-            "RegionId": "cn-shanghai",
-            "SignatureMethod": "HMAC-SHA1",
-            "SignatureNonce": str(uuid.uuid1()),
-            "SignatureVersion": "1.0",
-            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-            "Version": "2019-02-28",
-        }
-        query_string = AccessToken._encode_dict(parameters)
-        string_to_sign = (
-            "GET" + "&" + AccessToken._encode_text("/") + "&" + AccessToken._encode_text(query_string)
-        )
-        secreted_string = hmac.new(
-            bytes(access_key_secret + "&", encoding="utf-8"),
-            bytes(string_to_sign, encoding="utf-8"),
-            hashlib.sha1,
-        ).digest()
-        signature = base64.b64encode(secreted_string)
-        signature = AccessToken._encode_text(signature)
-        full_url = "http://nls-meta.cn-shanghai.aliyuncs.com/?Signature=%s&%s" % (signature, query_string)
-        response = requests.get(full_url)
-        if response.ok:
-            root_obj = response.json()
-            if "Token" in root_obj:
-                return root_obj["Token"]["Id"], root_obj["Token"]["ExpireTime"]
-        return None, None
-
-
 class ASRProvider(ASRProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__()
         self.interface_type = InterfaceType.STREAM
         self.config = config
         self.text = ""
-        self.decoder = opuslib_next.Decoder(16000, 1)
         self.asr_ws = None
         self.forward_task = None
         self.is_processing = False
@@ -98,29 +44,33 @@ class ASRProvider(ASRProviderBase):
 
         # Token管理
         if self.access_key_id and self.access_key_secret:
-            self._refresh_token()
+            # Token由所有实例共享，这里只在后台预取
+            self.token = None
+            get_aliyun_token_cache().prefetch(
+                self.access_key_id, self.access_key_secret
+            )
         elif not self.token:
             raise ValueError("必须提供access_key_id+access_key_secret或者直接提供token")
 
     def _refresh_token(self):
-        """刷新Token"""
-        self.token, expire_time_str = AccessToken.create_token(self.access_key_id, self.access_key_secret)
+        """从共享缓存获取Token并记录过期时间"""
+        if self.access_key_id and self.access_key_secret:
+            self.token, self.expire_time = get_aliyun_token_cache().get(
+                self.access_key_id, self.access_key_secret
+            )
+        else:
+            self.expire_time = None
+
         if not self.token:
             raise ValueError("无法获取有效的访问Token")
-        
-        try:
-            expire_str = str(expire_time_str).strip()
-            if expire_str.isdigit():
-                expire_time = datetime.fromtimestamp(int(expire_str))
-            else:
-                expire_time = datetime.strptime(expire_str, "%Y-%m-%dT%H:%M:%SZ")
-            self.expire_time = expire_time.timestamp() - 60
-        except:
-            self.expire_time = None
 
     def _is_token_expired(self):
-        """检查Token是否过期"""
-        return self.expire_time and time.time() > self.expire_time
+        """检查Token是否尚未获取或已过期"""
+        if self.access_key_id and self.access_key_secret and not self.token:
+            return True
+        if not self.expire_time:
+            return False
+        return time.time() > self.expire_time
 
     async def open_audio_channels(self, conn):
         await super().open_audio_channels(conn)
@@ -135,7 +85,7 @@ class ASRProvider(ASRProviderBase):
             conn.asr_audio_for_voiceprint.append(audio)
         
         conn.asr_audio.append(audio)
-        conn.asr_audio = conn.asr_audio[-10:]
+        self._keep_preroll(conn)
 
         # 只在有声音且没有连接时建立连接
         if audio_have_voice and not self.is_processing:
@@ -146,10 +96,10 @@ class ASRProvider(ASRProviderBase):
                 await self._cleanup(conn)
                 return
 
-        if self.asr_ws and self.is_processing and self.server_ready:
+        if self.asr_ws and self.is_processing and self.server_ready and conn.last_pcm_frame:
             try:
-                pcm_frame = self.decoder.decode(audio, 960)
-                await self.asr_ws.send(pcm_frame)
+                # 直接使用连接接收时解码好的PCM
+                await self.asr_ws.send(conn.last_pcm_frame)
             except Exception as e:
                 logger.bind(tag=TAG).warning(f"发送音频失败: {str(e)}")
                 await self._cleanup(conn)
@@ -227,15 +177,17 @@ class ASRProvider(ASRProviderBase):
                         self.server_ready = True
                         logger.bind(tag=TAG).info("服务器已准备，开始发送缓存音频...")
                         
-                        # 发送缓存音频
-                        if conn.asr_audio:
-                            for cached_audio in conn.asr_audio[-10:]:
-                                try:
-                                    pcm_frame = self.decoder.decode(cached_audio, 960)
-                                    await self.asr_ws.send(pcm_frame)
-                                except Exception as e:
-                                    logger.bind(tag=TAG).warning(f"发送缓存音频失败: {e}")
-                                    break
+                        # 发送缓存音频：服务器就绪前收到的语音（含预录音）已在audio_buffer中
+                        cached_pcm = bytes(
+                            conn.audio_buffer.memoryview(
+                                conn.asr_audio_start, conn.audio_buffer.write_pos
+                            )
+                        )
+                        if cached_pcm:
+                            try:
+                                await self.asr_ws.send(cached_pcm)
+                            except Exception as e:
+                                logger.bind(tag=TAG).warning(f"发送缓存音频失败: {e}")
                         continue
                     
                     if message_name == "TranscriptionResultChanged":
@@ -1,15 +1,13 @@
 import os
 import wave
 import uuid
-import queue
 import asyncio
 import traceback
-import threading
 import opuslib_next
 import json
 import io
 import time
-import concurrent.futures
+import numpy as np
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from typing import Optional, Tuple, List, Dict, Any
@@ -17,34 +15,41 @@ from core.handle.receiveAudioHandle import startToChat
 from core.handle.reportHandle import enqueue_asr_report
 from core.utils.util import remove_punctuation_and_length
 from core.handle.receiveAudioHandle import handleAudioMessage
+from core.utils.audio_archive import get_audio_archive
+from core.utils.opus_codec import opus_decoder, SAMPLE_RATE, MAX_PACKET_DURATION_MS
 
 TAG = __name__
 logger = setup_logging()
 
+# 语音开始前保留的预录音时长（毫秒），默认帧时长下为10个60ms的音频包
+PREROLL_MS = 600
+PREROLL_SAMPLES = SAMPLE_RATE * PREROLL_MS // 1000
+# 短于该时长（毫秒）的语音不识别，默认帧时长下为15个音频包
+MIN_SPEECH_MS = 900
+
 
 class ASRProviderBase(ABC):
+    # 实现了内存识别接口 recognize 的ASR（本地模型）置为True，
+    # 识别直接在连接的事件循环中等待，不经过 speech_to_text 和临时文件
+    in_memory_asr = False
+
     def __init__(self):
         pass
 
     # 打开音频通道
     async def open_audio_channels(self, conn):
-        conn.asr_priority_thread = threading.Thread(
-            target=self.asr_text_priority_thread, args=(conn,), daemon=True
+        conn.asr_priority_task = conn.create_worker_task(
+            self.asr_text_priority_task(conn)
         )
-        conn.asr_priority_thread.start()
 
     # 有序处理ASR音频
-    def asr_text_priority_thread(self, conn):
+    async def asr_text_priority_task(self, conn):
         while not conn.stop_event.is_set():
             try:
-                message = conn.asr_audio_queue.get(timeout=1)
-                future = asyncio.run_coroutine_threadsafe(
-                    handleAudioMessage(conn, message),
-                    conn.loop,
-                )
-                future.result()
-            except queue.Empty:
-                continue
+                message = await conn.asr_audio_queue.get()
+                await handleAudioMessage(conn, message)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"处理ASR文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
@@ -60,30 +65,52 @@ class ASRProviderBase(ABC):
         
         conn.asr_audio.append(audio)
         if not have_voice and not conn.client_have_voice:
-            conn.asr_audio = conn.asr_audio[-10:]
+            self._keep_preroll(conn)
             return
 
         if conn.client_voice_stop:
             asr_audio_task = conn.asr_audio.copy()
-            conn.asr_audio.clear()
+            # 整句PCM从环形缓冲区中一次性取出，之后的写入不会影响这份数据
+            asr_pcm_task = bytes(
+                conn.audio_buffer.memoryview(
+                    conn.asr_audio_start, conn.audio_buffer.write_pos
+                )
+            )
+            conn.clear_asr_audio()
             conn.reset_vad_states()
 
-            if len(asr_audio_task) > 15:
-                await self.handle_voice_stop(conn, asr_audio_task)
+            if self.has_enough_speech(conn, asr_audio_task):
+                await self.handle_voice_stop(conn, asr_audio_task, asr_pcm_task)
+
+    @staticmethod
+    def has_enough_speech(conn, audio_packets: List[bytes]) -> bool:
+        """语音包的总时长是否足够识别，按协商的帧时长换算包数"""
+        return len(audio_packets) > MIN_SPEECH_MS // conn.audio_params.frame_duration
+
+    def _keep_preroll(self, conn):
+        """没有语音时只保留最近的预录音，原地裁剪避免每个包都重新分配列表"""
+        del conn.asr_audio[: -(PREROLL_MS // conn.audio_params.frame_duration)]
+        conn.asr_audio_start = max(
+            conn.audio_buffer.write_pos - PREROLL_SAMPLES,
+            conn.audio_buffer.start_pos,
+        )
+        conn.audio_buffer.keep_from = conn.asr_audio_start
 
     # 处理语音停止
-    async def handle_voice_stop(self, conn, asr_audio_task: List[bytes]):
+    async def handle_voice_stop(
+        self, conn, asr_audio_task: List[bytes], asr_pcm_task=None
+    ):
         """并行处理ASR和声纹识别"""
         try:
             total_start_time = time.monotonic()
             
-            # 准备音频数据
-            if conn.audio_format == "pcm":
-                pcm_data = asr_audio_task
+            # 准备音频数据，优先使用接收时已解码的整句PCM，ASR和声纹识别共用同一份数据
+            if asr_pcm_task:
+                combined_pcm_data = asr_pcm_task
+            elif conn.audio_format == "pcm":
+                combined_pcm_data = b"".join(asr_audio_task)
             else:
-                pcm_data = self.decode_opus(asr_audio_task)
-            
-            combined_pcm_data = b"".join(pcm_data)
+                combined_pcm_data = b"".join(self.decode_opus(asr_audio_task))
             
             # 预先准备WAV数据
             wav_data = None
@@ -92,7 +119,7 @@ class ASRProviderBase(ABC):
                 wav_data = self._pcm_to_wav(combined_pcm_data)
             
             
-            # 定义ASR任务
+            # 定义ASR任务，在共享线程池中执行
             def run_asr():
                 start_time = time.monotonic()
                 try:
@@ -100,7 +127,7 @@ class ASRProviderBase(ABC):
                     asyncio.set_event_loop(loop)
                     try:
                         result = loop.run_until_complete(
-                            self.speech_to_text(asr_audio_task, conn.session_id, conn.audio_format)
+                            self.speech_to_text([combined_pcm_data], conn.session_id, "pcm")
                         )
                         end_time = time.monotonic()
                         logger.bind(tag=TAG).info(f"ASR耗时: {end_time - start_time:.3f}s")
@@ -112,42 +139,55 @@ class ASRProviderBase(ABC):
                     logger.bind(tag=TAG).error(f"ASR失败: {e}")
                     return ("", None)
             
-            # 定义声纹识别任务
-            def run_voiceprint():
+            async def run_asr_async():
+                if not self.in_memory_asr:
+                    return await conn.executor.run(run_asr)
+                start_time = time.monotonic()
+                try:
+                    text = await self.recognize(
+                        self.pcm_to_float32(combined_pcm_data), conn.session_id
+                    )
+                    logger.bind(tag=TAG).info(
+                        f"ASR耗时: {time.monotonic() - start_time:.3f}s"
+                    )
+                    file_path = None
+                    if not getattr(self, "delete_audio_file", True):
+                        file_path = self.save_audio_to_file(
+                            [combined_pcm_data], conn.session_id
+                        )
+                    return text, file_path
+                except Exception as e:
+                    logger.bind(tag=TAG).error(f"ASR失败: {e}")
+                    return ("", None)
+
+            # 定义声纹识别任务，在连接的事件循环上发起请求，复用共享连接池
+            async def run_voiceprint():
                 if not wav_data:
                     return None
                 try:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        # 使用连接的声纹识别提供者
-                        result = loop.run_until_complete(
-                            conn.voiceprint_provider.identify_speaker(wav_data, conn.session_id)
-                        )
-                        return result
-                    finally:
-                        loop.close()
+                    # 使用连接的声纹识别提供者
+                    return await conn.voiceprint_provider.identify_speaker(
+                        wav_data, conn.session_id
+                    )
                 except Exception as e:
                     logger.bind(tag=TAG).error(f"声纹识别失败: {e}")
                     return None
             
-            # 使用线程池执行器并行运行
+            # 两个任务并行运行，等待期间不阻塞事件循环
             parallel_start_time = time.monotonic()
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as thread_executor:
-                asr_future = thread_executor.submit(run_asr)
-                
-                if conn.voiceprint_provider and wav_data:
-                    voiceprint_future = thread_executor.submit(run_voiceprint)
-                    
-                    # 等待两个线程都完成
-                    asr_result = asr_future.result(timeout=15)
-                    voiceprint_result = voiceprint_future.result(timeout=15)
-                    
-                    results = {"asr": asr_result, "voiceprint": voiceprint_result}
-                else:
-                    asr_result = asr_future.result(timeout=15)
-                    results = {"asr": asr_result, "voiceprint": None}
+            if conn.voiceprint_provider and wav_data:
+                # 等待两个任务都完成
+                asr_result, voiceprint_result = await asyncio.wait_for(
+                    asyncio.gather(
+                        run_asr_async(), run_voiceprint()
+                    ),
+                    timeout=15,
+                )
+                results = {"asr": asr_result, "voiceprint": voiceprint_result}
+            else:
+                asr_result = await asyncio.wait_for(run_asr_async(), timeout=15)
+                results = {"asr": asr_result, "voiceprint": None}
             
             
             # 处理结果
@@ -221,19 +261,35 @@ class ASRProviderBase(ABC):
     def stop_ws_connection(self):
         pass
 
+    def shutdown(self):
+        """释放模型占用的线程等资源，模型从共享注册表中卸载时调用"""
+        scheduler = getattr(self, "scheduler", None)
+        if scheduler is not None:
+            scheduler.shutdown()
+
     def save_audio_to_file(self, pcm_data: List[bytes], session_id: str) -> str:
-        """PCM数据保存为WAV文件"""
-        module_name = __name__.split(".")[-1]
+        """PCM数据归档为WAV文件
+
+        只提交给后台归档线程批量写入，立即返回目标路径，文件随后才会出现在磁盘上
+        """
+        module_name = self.__class__.__module__.split(".")[-1]
         file_name = f"asr_{module_name}_{session_id}_{uuid.uuid4()}.wav"
         file_path = os.path.join(self.output_dir, file_name)
+        get_audio_archive().submit(file_path, pcm_data)
+        return file_path
 
-        with wave.open(file_path, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)  # 2 bytes = 16-bit
-            wf.setframerate(16000)
-            wf.writeframes(b"".join(pcm_data))
+    async def recognize(self, samples: np.ndarray, session_id: str) -> str:
+        """内存识别接口：float32单声道16kHz音频进，文本出
 
-        return file_path
+        in_memory_asr 为True的ASR需要实现该方法
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def pcm_to_float32(pcm_data: bytes) -> np.ndarray:
+        """16位PCM转换为[-1, 1]的float32音频"""
+        samples = np.frombuffer(pcm_data, dtype=np.int16, count=len(pcm_data) // 2)
+        return samples.astype(np.float32) / 32768.0
 
     @abstractmethod
     async def speech_to_text(
@@ -244,26 +300,27 @@ class ASRProviderBase(ABC):
 
     @staticmethod
     def decode_opus(opus_data: List[bytes]) -> List[bytes]:
-        """将Opus音频数据解码为PCM数据"""
+        """将Opus音频数据解码为16kHz的PCM数据，设备可以协商任意帧时长"""
         try:
-            decoder = opuslib_next.Decoder(16000, 1)
             pcm_data = []
-            buffer_size = 960  # 每次处理960个采样点 (60ms at 16kHz)
-            
-            for i, opus_packet in enumerate(opus_data):
-                try:
-                    if not opus_packet or len(opus_packet) == 0:
-                        continue
-                    
-                    pcm_frame = decoder.decode(opus_packet, buffer_size)
-                    if pcm_frame and len(pcm_frame) > 0:
-                        pcm_data.append(pcm_frame)
-                        
-                except opuslib_next.OpusError as e:
-                    logger.bind(tag=TAG).warning(f"Opus解码错误，跳过数据包 {i}: {e}")
-                except Exception as e:
-                    logger.bind(tag=TAG).error(f"音频处理错误，数据包 {i}: {e}")
-            
+            # 按Opus包的最大时长分配缓冲区，20/40/60ms的包都能解码
+            buffer_size = SAMPLE_RATE * MAX_PACKET_DURATION_MS // 1000
+
+            with opus_decoder() as decoder:
+                for i, opus_packet in enumerate(opus_data):
+                    try:
+                        if not opus_packet or len(opus_packet) == 0:
+                            continue
+
+                        pcm_frame = decoder.decode(opus_packet, buffer_size)
+                        if pcm_frame and len(pcm_frame) > 0:
+                            pcm_data.append(pcm_frame)
+
+                    except opuslib_next.OpusError as e:
+                        logger.bind(tag=TAG).warning(f"Opus解码错误，跳过数据包 {i}: {e}")
+                    except Exception as e:
+                        logger.bind(tag=TAG).error(f"音频处理错误，数据包 {i}: {e}")
+
             return pcm_data
             
         except Exception as e:
@@ -3,7 +3,6 @@ import gzip
 import uuid
 import asyncio
 import websockets
-import opuslib_next
 from core.providers.asr.base import ASRProviderBase
 from config.logger import setup_logging
 from core.providers.asr.dto.dto import InterfaceType
@@ -20,7 +19,6 @@ class ASRProvider(ASRProviderBase):
         self.text = ""
         self.max_retries = 3
         self.retry_delay = 2
-        self.decoder = opuslib_next.Decoder(16000, 1)
         self.asr_ws = None
         self.forward_task = None
         self.is_processing = False  # 添加处理状态标志
@@ -55,7 +53,7 @@ class ASRProvider(ASRProviderBase):
 
     async def receive_audio(self, conn, audio, audio_have_voice):
         conn.asr_audio.append(audio)
-        conn.asr_audio = conn.asr_audio[-10:]
+        self._keep_preroll(conn)
         
         # 存储音频数据
         if not hasattr(conn, 'asr_audio_for_voiceprint'):
@@ -116,22 +114,22 @@ class ASRProvider(ASRProviderBase):
                 # 启动接收ASR结果的异步任务
                 self.forward_task = asyncio.create_task(self._forward_asr_results(conn))
 
-                # 发送缓存的音频数据
-                if conn.asr_audio and len(conn.asr_audio) > 0:
-                    for cached_audio in conn.asr_audio[-10:]:
-                        try:
-                            pcm_frame = self.decoder.decode(cached_audio, 960)
-                            payload = gzip.compress(pcm_frame)
-                            audio_request = bytearray(
-                                self.generate_audio_default_header()
-                            )
-                            audio_request.extend(len(payload).to_bytes(4, "big"))
-                            audio_request.extend(payload)
-                            await self.asr_ws.send(audio_request)
-                        except Exception as e:
-                            logger.bind(tag=TAG).info(
-                                f"发送缓存音频数据时发生错误: {e}"
-                            )
+                # 发送缓存的音频数据（预录音，不含当前包，当前包在下面单独发送）
+                cached_end = conn.audio_buffer.write_pos - len(conn.last_pcm_frame) // 2
+                cached_pcm = conn.audio_buffer.memoryview(conn.asr_audio_start, cached_end)
+                if len(cached_pcm) > 0:
+                    try:
+                        payload = gzip.compress(cached_pcm)
+                        audio_request = bytearray(
+                            self.generate_audio_default_header()
+                        )
+                        audio_request.extend(len(payload).to_bytes(4, "big"))
+                        audio_request.extend(payload)
+                        await self.asr_ws.send(audio_request)
+                    except Exception as e:
+                        logger.bind(tag=TAG).info(
+                            f"发送缓存音频数据时发生错误: {e}"
+                        )
 
             except Exception as e:
                 logger.bind(tag=TAG).error(f"建立ASR连接失败: {str(e)}")
@@ -144,10 +142,10 @@ class ASRProvider(ASRProviderBase):
                 return
 
         # 发送当前音频数据
-        if self.asr_ws and self.is_processing:
+        if self.asr_ws and self.is_processing and conn.last_pcm_frame:
             try:
-                pcm_frame = self.decoder.decode(audio, 960)
-                payload = gzip.compress(pcm_frame)
+                # 直接使用连接接收时解码好的PCM
+                payload = gzip.compress(conn.last_pcm_frame)
                 audio_request = bytearray(self.generate_audio_default_header())
                 audio_request.extend(len(payload).to_bytes(4, "big"))
                 audio_request.extend(payload)
@@ -183,7 +181,8 @@ class ASRProvider(ASRProviderBase):
                                 logger.bind(tag=TAG).error(f"识别文本：空")
                                 self.text = ""
                                 conn.reset_vad_states()
-                                if len(audio_data) > 15:  # 确保有足够音频数据
+                                # 确保有足够音频数据
+                                if self.has_enough_speech(conn, audio_data):
                                     await self.handle_voice_stop(conn, audio_data)
                                 break
 
@@ -194,7 +193,8 @@ class ASRProvider(ASRProviderBase):
                                         f"识别到文本: {self.text}"
                                     )
                                     conn.reset_vad_states()
-                                    if len(audio_data) > 15:  # 确保有足够音频数据
+                                    # 确保有足够音频数据
+                                    if self.has_enough_speech(conn, audio_data):
                                         await self.handle_voice_stop(conn, audio_data)
                                     break
                         elif "error" in payload:
@@ -3,20 +3,18 @@ import os
 import sys
 import io
 import psutil
+import numpy as np
 from config.logger import setup_logging
 from typing import Optional, Tuple, List
 from core.providers.asr.base import ASRProviderBase
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
-import shutil
 from core.providers.asr.dto.dto import InterfaceType
+from core.providers.asr.local_scheduler import LocalASRBusyError, create_scheduler
 
 TAG = __name__
 logger = setup_logging()
 
-MAX_RETRIES = 2
-RETRY_DELAY = 1  # 重试延迟（秒）
-
 
 # 捕获标准输出
 class CaptureOutput:
@@ -36,6 +34,9 @@ class CaptureOutput:
 
 
 class ASRProvider(ASRProviderBase):
+    # 识别交给推理调度器，音频只在内存中流转
+    in_memory_asr = True
+
     def __init__(self, config: dict, delete_audio_file: bool):
         super().__init__()
         
@@ -61,74 +62,51 @@ class ASRProvider(ASRProviderBase):
                 # device="cuda:0",  # 启用GPU加速
             )
 
+        # 所有连接共享模型，待识别音频统一排队并动态组批
+        self.scheduler = create_scheduler(config, self._transcribe_batch, "fun_local")
+
+    def _transcribe_batch(self, batch: List[np.ndarray]) -> List[str]:
+        """批量识别，输入为float32单声道16kHz音频"""
+        start_time = time.time()
+        results = self.model.generate(
+            input=batch,
+            cache={},
+            language="auto",
+            use_itn=True,
+            batch_size=len(batch),
+            # 与调度器组批时的时长上限一致，模型内部不再按另一个上限拆分
+            batch_size_s=self.scheduler.max_batch_seconds,
+        )
+        texts = [rich_transcription_postprocess(result["text"]) for result in results]
+        logger.bind(tag=TAG).debug(
+            f"批量语音识别耗时: {time.time() - start_time:.3f}s | 批大小: {len(batch)}"
+        )
+        return texts
+
+    async def recognize(self, samples: np.ndarray, session_id: str) -> str:
+        """内存识别：float32音频直接进入推理队列，不落盘"""
+        start_time = time.time()
+        try:
+            text = await self.scheduler.transcribe(samples)
+        except LocalASRBusyError as e:
+            logger.bind(tag=TAG).warning(f"语音识别排队已满，丢弃本句: {e}")
+            return ""
+        logger.bind(tag=TAG).debug(
+            f"语音识别耗时: {time.time() - start_time:.3f}s | 结果: {text}"
+        )
+        return text
+
     async def speech_to_text(
         self, opus_data: List[bytes], session_id: str, audio_format="opus"
     ) -> Tuple[Optional[str], Optional[str]]:
-        """语音转文本主处理逻辑"""
-        file_path = None
-        retry_count = 0
-
-        while retry_count < MAX_RETRIES:
-            try:
-                # 合并所有opus数据包
-                if audio_format == "pcm":
-                    pcm_data = opus_data
-                else:
-                    pcm_data = self.decode_opus(opus_data)
-
-                combined_pcm_data = b"".join(pcm_data)
-
-                # 检查磁盘空间
-                if not self.delete_audio_file:
-                    free_space = shutil.disk_usage(self.output_dir).free
-                    if free_space < len(combined_pcm_data) * 2:  # 预留2倍空间
-                        raise OSError("磁盘空间不足")
-
-                # 判断是否保存为WAV文件
-                if self.delete_audio_file:
-                    pass
-                else:
-                    file_path = self.save_audio_to_file(pcm_data, session_id)
-
-                # 语音识别
-                start_time = time.time()
-                result = self.model.generate(
-                    input=combined_pcm_data,
-                    cache={},
-                    language="auto",
-                    use_itn=True,
-                    batch_size_s=60,
-                )
-                text = rich_transcription_postprocess(result[0]["text"])
-                logger.bind(tag=TAG).debug(
-                    f"语音识别耗时: {time.time() - start_time:.3f}s | 结果: {text}"
-                )
-
-                return text, file_path
-
-            except OSError as e:
-                retry_count += 1
-                if retry_count >= MAX_RETRIES:
-                    logger.bind(tag=TAG).error(
-                        f"语音识别失败（已重试{retry_count}次）: {e}", exc_info=True
-                    )
-                    return "", file_path
-                logger.bind(tag=TAG).warning(
-                    f"语音识别失败，正在重试（{retry_count}/{MAX_RETRIES}）: {e}"
-                )
-                time.sleep(RETRY_DELAY)
-
-            except Exception as e:
-                logger.bind(tag=TAG).error(f"语音识别失败: {e}", exc_info=True)
-                return "", file_path
-
-            finally:
-                # 文件清理逻辑
-                if self.delete_audio_file and file_path and os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        logger.bind(tag=TAG).debug(f"已删除临时音频文件: {file_path}")
-                    except Exception as e:
-                        logger.bind(tag=TAG).error(
-                            f"文件删除失败: {file_path} | 错误: {e}"
-                        )
+        """语音转文本，解码后走内存识别"""
+        try:
+            if audio_format == "pcm":
+                pcm_data = opus_data
+            else:
+                pcm_data = self.decode_opus(opus_data)
+            samples = self.pcm_to_float32(b"".join(pcm_data))
+            return await self.recognize(samples, session_id), None
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"语音识别失败: {e}", exc_info=True)
+            return "", None
@@ -0,0 +1,254 @@
+"""
+本地ASR推理调度器
+所有连接共享一个本地模型实例，待识别的整句音频进入统一队列，
+由固定数量的推理线程按音频长度动态组批后调用模型
+"""
+
+import time
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Callable, List, Optional
+
+import numpy as np
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+SAMPLE_RATE = 16000
+# 统计延迟分位数时保留的最近样本数
+METRICS_WINDOW = 1000
+
+
+class LocalASRBusyError(RuntimeError):
+    """待识别队列已满"""
+
+
+class _Request:
+    __slots__ = ("samples", "future", "enqueue_time")
+
+    def __init__(self, samples: np.ndarray):
+        self.samples = samples
+        self.future = concurrent.futures.Future()
+        self.enqueue_time = time.monotonic()
+
+
+class LocalASRScheduler:
+    """本地ASR的推理队列与动态组批
+
+    batch_fn 接收若干条float32单声道16kHz音频，按相同顺序返回识别文本。
+    组批时以最早入队的请求为基准，优先挑选长度接近的请求，
+    保证补齐后的总时长不超过 max_batch_seconds，减少padding带来的无效计算。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[np.ndarray]], List[str]],
+        num_workers: int = 1,
+        max_batch_size: int = 8,
+        max_batch_wait_ms: float = 10,
+        max_batch_seconds: float = 60,
+        max_queue_size: int = 64,
+        metrics_log_interval: float = 60,
+        name: str = "local-asr",
+    ):
+        self._batch_fn = batch_fn
+        self.num_workers = max(int(num_workers), 1)
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_batch_wait = max(float(max_batch_wait_ms), 0) / 1000
+        self.max_batch_seconds = max(float(max_batch_seconds), 1)
+        self.max_batch_samples = int(self.max_batch_seconds * SAMPLE_RATE)
+        self.max_queue_size = max(int(max_queue_size), 1)
+        self.metrics_log_interval = metrics_log_interval
+        self.name = name
+
+        self._pending: List[_Request] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # 指标：排队耗时、推理耗时、总耗时（秒）和批大小
+        self._queue_waits = deque(maxlen=METRICS_WINDOW)
+        self._infer_times = deque(maxlen=METRICS_WINDOW)
+        self._latencies = deque(maxlen=METRICS_WINDOW)
+        self._batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self._completed = 0
+        self._rejected = 0
+        self._last_metrics_log = time.monotonic()
+
+        self._workers = []
+        for i in range(self.num_workers):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"{name}-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, samples: np.ndarray) -> concurrent.futures.Future:
+        """提交一句音频，返回结果为识别文本的 Future
+
+        队列已满时直接抛出 LocalASRBusyError，由调用方决定如何降级，
+        避免排队无限增长导致所有连接的延迟一起失控
+        """
+        request = _Request(samples)
+        with self._cond:
+            if self._closed:
+                raise LocalASRBusyError("本地ASR模型已卸载")
+            if len(self._pending) >= self.max_queue_size:
+                self._rejected += 1
+                raise LocalASRBusyError(
+                    f"本地ASR队列已满({self.max_queue_size})，请稍后再试"
+                )
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def shutdown(self):
+        """处理完已入队的请求后停止推理线程，模型被卸载时调用"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    async def transcribe(self, samples: np.ndarray) -> str:
+        """在事件循环中提交音频并等待识别结果"""
+        return await asyncio.wrap_future(self.submit(samples))
+
+    def stats(self) -> dict:
+        """返回队列和延迟指标，耗时单位为毫秒"""
+        with self._cond:
+            queue_size = len(self._pending)
+            queue_waits = list(self._queue_waits)
+            infer_times = list(self._infer_times)
+            latencies = list(self._latencies)
+            batch_sizes = list(self._batch_sizes)
+            completed = self._completed
+            rejected = self._rejected
+        return {
+            "queue_size": queue_size,
+            "completed": completed,
+            "rejected": rejected,
+            "avg_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+            "queue_wait_p50_ms": _percentile_ms(queue_waits, 50),
+            "queue_wait_p95_ms": _percentile_ms(queue_waits, 95),
+            "infer_p95_ms": _percentile_ms(infer_times, 95),
+            "latency_p50_ms": _percentile_ms(latencies, 50),
+            "latency_p95_ms": _percentile_ms(latencies, 95),
+        }
+
+    def _worker_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+            self._maybe_log_metrics()
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        """等待请求到达，再等待一个组批窗口后取出一批，已停止时返回None"""
+        with self._cond:
+            while True:
+                while not self._pending:
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+                if self.max_batch_wait > 0 and len(self._pending) < self.max_batch_size:
+                    deadline = time.monotonic() + self.max_batch_wait
+                    while len(self._pending) < self.max_batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                # 等待期间可能已被其他推理线程取走
+                if self._pending:
+                    return self._take_batch()
+
+    def _take_batch(self) -> List[_Request]:
+        """以最早的请求为基准，按长度接近程度挑选同批请求，需持有锁"""
+        anchor = self._pending[0]
+        anchor_len = len(anchor.samples)
+        candidates = sorted(
+            self._pending[1:], key=lambda r: abs(len(r.samples) - anchor_len)
+        )
+        batch = [anchor]
+        max_len = anchor_len
+        for request in candidates:
+            if len(batch) >= self.max_batch_size:
+                break
+            padded_len = max(max_len, len(request.samples))
+            if padded_len * (len(batch) + 1) > self.max_batch_samples:
+                continue
+            batch.append(request)
+            max_len = padded_len
+        taken = set(map(id, batch))
+        self._pending = [r for r in self._pending if id(r) not in taken]
+        return batch
+
+    def _run_batch(self, batch: List[_Request]):
+        start = time.monotonic()
+        try:
+            texts = self._batch_fn([request.samples for request in batch])
+            if len(texts) != len(batch):
+                raise RuntimeError(
+                    f"识别结果数量({len(texts)})与请求数量({len(batch)})不一致"
+                )
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"本地ASR批量推理失败: {e}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        end = time.monotonic()
+
+        with self._cond:
+            self._infer_times.append(end - start)
+            self._batch_sizes.append(len(batch))
+            self._completed += len(batch)
+            for request in batch:
+                self._queue_waits.append(start - request.enqueue_time)
+                self._latencies.append(end - request.enqueue_time)
+        for request, text in zip(batch, texts):
+            if not request.future.done():
+                request.future.set_result(text)
+
+    def _maybe_log_metrics(self):
+        now = time.monotonic()
+        if (
+            not self.metrics_log_interval
+            or now - self._last_metrics_log < self.metrics_log_interval
+        ):
+            return
+        self._last_metrics_log = now
+        stats = self.stats()
+        logger.bind(tag=TAG).info(
+            f"{self.name} 队列长度: {stats['queue_size']}, 已完成: {stats['completed']}, "
+            f"拒绝: {stats['rejected']}, 平均批大小: {stats['avg_batch_size']:.1f}, "
+            f"排队P95: {stats['queue_wait_p95_ms']:.0f}ms, "
+            f"总耗时P50/P95: {stats['latency_p50_ms']:.0f}/{stats['latency_p95_ms']:.0f}ms"
+        )
+
+
+def _percentile_ms(values, q) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(values, q) * 1000)
+
+
+def create_scheduler(
+    config: dict, batch_fn: Callable[[List[np.ndarray]], List[str]], name: str
+) -> LocalASRScheduler:
+    """根据ASR配置创建调度器，空字符串按默认值处理"""
+
+    def _get(key, default, cast):
+        value = config.get(key)
+        return cast(value) if value not in (None, "") else default
+
+    return LocalASRScheduler(
+        batch_fn,
+        num_workers=_get("num_workers", 1, int),
+        max_batch_size=_get("max_batch_size", 8, int),
+        max_batch_wait_ms=_get("max_batch_wait_ms", 10, float),
+        max_batch_seconds=_get("max_batch_seconds", 60, float),
+        max_queue_size=_get("max_queue_size", 64, int),
+        name=name,
+    )
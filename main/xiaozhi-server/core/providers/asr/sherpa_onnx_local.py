@@ -1,5 +1,4 @@
 import time
-import wave
 import os
 import sys
 import io
@@ -7,6 +6,7 @@ from config.logger import setup_logging
 from typing import Optional, Tuple, List
 from core.providers.asr.dto.dto import InterfaceType
 from core.providers.asr.base import ASRProviderBase
+from core.providers.asr.local_scheduler import LocalASRBusyError, create_scheduler
 
 import numpy as np
 import sherpa_onnx
@@ -32,6 +32,9 @@ class CaptureOutput:
 
 
 class ASRProvider(ASRProviderBase):
+    # Распознавание выполняет планировщик, аудио остаётся в памяти
+    in_memory_asr = True
+
     def __init__(self, config: dict, delete_audio_file: bool):
         super().__init__()
         self.interface_type = InterfaceType.LOCAL
@@ -80,135 +83,69 @@ class ASRProvider(ASRProviderBase):
 
         logger.bind(tag=TAG).info("✅ Модель ASR успешно загружена и готова к работе.")
 
-    def read_wave(self, wave_filename: str) -> tuple[np.ndarray, int]:
-        with wave.open(wave_filename) as f:
-            assert f.getnchannels() == 1, f.getnchannels()
-            assert f.getsampwidth() == 2, f.getsampwidth()
-            num_samples = f.getnframes()
-            samples = f.readframes(num_samples)
-            samples_int16 = np.frombuffer(samples, dtype=np.int16)
-            samples_float32 = samples_int16.astype(np.float32) / 32768.0
-            return samples_float32, f.getframerate()
-
-    async def speech_to_text(
-            self, opus_data: list[bytes], session_id: str, audio_format="opus"
-    ) -> tuple[str | None, str | None]:
-        file_path = None
-        try:
-            # Декодируем Opus → PCM
-            from core.utils.util import decode_opus
-            pcm_data = decode_opus(opus_data)
-
-            if not pcm_data:
-                logger.bind(tag=TAG).error("Пустые аудиоданные после декодирования")
-                return "", None
-
-            # Сохраняем временный файл
-            file_path = self.save_audio_to_file(pcm_data, session_id)
+        # Общая очередь для всех соединений с динамическим батчингом
+        self.scheduler = create_scheduler(
+            config, self._transcribe_batch, "sherpa_onnx_local"
+        )
 
-            # Распознавание
-            start_time = time.time()
+    def _transcribe_batch(self, batch: List[np.ndarray]) -> List[str]:
+        """Пакетное распознавание float32 PCM (16 кГц, моно) через decode_streams"""
+        streams = []
+        for samples in batch:
             stream = self.model.create_stream()
-            samples, sample_rate = self.read_wave(file_path)
-            stream.accept_waveform(sample_rate, samples)
-            self.model.decode_stream(stream)
-            text = stream.result.text.strip()
-            logger.bind(tag=TAG).debug(f"Распознано: '{text}' за {time.time() - start_time:.3f} с")
-            return text, file_path
-
-        except Exception as e:
-            logger.bind(tag=TAG).error(f"Ошибка ASR: {e}")
-            return "", file_path
-        finally:
-            if self.delete_audio_file and file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    logger.bind(tag=TAG).error(f"Не удалось удалить файл: {e}")
+            stream.accept_waveform(16000, samples)
+            streams.append(stream)
+        self.model.decode_streams(streams)
+        return [stream.result.text.strip() for stream in streams]
+
+    async def recognize(self, samples: np.ndarray, session_id: str) -> str:
+        """Распознавание float32 PCM в памяти через общую очередь, без файлов"""
+        start_time = time.time()
+        try:
+            text = await self.scheduler.transcribe(samples)
+        except LocalASRBusyError as e:
+            logger.bind(tag=TAG).warning(f"Очередь ASR переполнена, фраза пропущена: {e}")
+            return ""
+        logger.bind(tag=TAG).debug(
+            f"Распознавание завершено за {time.time() - start_time:.3f} с | Текст: '{text}'"
+        )
+        return text
 
     def transcribe_pcm(self, pcm_data: bytes, sample_rate: int = 16000) -> str:
         """
-        Распознавание PCM-аудио (16-бит, моно) без сохранения в файл.
+        Синхронное распознавание PCM-аудио (16-бит, моно) без очереди и без файлов.
         """
-        if not pcm_data or len(pcm_data) == 0:
+        if not pcm_data:
             return ""
 
-        # Убедимся, что длина кратна 2 (16 бит = 2 байта)
-        if len(pcm_data) % 2 != 0:
-            pcm_data = pcm_data[:-1]
+        # Проверка частоты
+        if sample_rate != 16000:
+            logger.bind(tag=TAG).warning(
+                f"Частота {sample_rate} Гц не равна 16 кГц. Распознавание может быть неточным."
+            )
 
         try:
-            # Конвертируем байты в float32 [-1.0, 1.0]
-            samples_int16 = np.frombuffer(pcm_data, dtype=np.int16)
-            samples_float32 = samples_int16.astype(np.float32) / 32768.0
-
-            # Проверка частоты
-            if sample_rate != 16000:
-                logger.bind(tag=TAG).warning(
-                    f"Частота {sample_rate} Гц не равна 16 кГц. Распознавание может быть неточным."
-                )
-
-            # Создаём поток и распознаём
-            stream = self.model.create_stream()
-            stream.accept_waveform(16000, samples_float32)
-            self.model.decode_stream(stream)
-            text = stream.result.text.strip()
-            return text
-
+            return self._transcribe_batch([self.pcm_to_float32(pcm_data)])[0]
         except Exception as e:
             logger.bind(tag=TAG).error(f"Ошибка при распознавании PCM: {e}")
             return ""
 
-    def save_audio_to_file(self, pcm_data: bytes, session_id: str) -> str:
-        """Сохраняет PCM в .wav (для отладки или если нужно)"""
-        file_path = os.path.join(self.output_dir, f"{session_id}.wav")
-        with wave.open(file_path, "wb") as f:
-            f.setnchannels(1)  # моно
-            f.setsampwidth(2)  # 16 бит = 2 байта
-            f.setframerate(16000)
-            f.writeframes(pcm_data)
-        return file_path
-
     async def speech_to_text(
         self, opus_data: List[bytes], session_id: str, audio_format="opus"
     ) -> Tuple[Optional[str], Optional[str]]:
-        """Основной метод: Opus → PCM → Распознавание"""
-        file_path = None
+        """Opus/PCM → распознавание в памяти"""
         try:
-            start_time = time.time()
-
-            # Декодируем Opus в PCM
             if audio_format == "pcm":
                 pcm_data = b"".join(opus_data)
             else:
-                from core.utils.util import decode_opus  # Убедись, что у тебя есть эта функция
-                pcm_data = decode_opus(opus_data)
+                pcm_data = b"".join(self.decode_opus(opus_data))
 
             if not pcm_data:
                 logger.bind(tag=TAG).error("Пустые аудиоданные после декодирования")
                 return "", None
 
-            # Сохраняем только если нужно (например, для отладки)
-            if self.delete_audio_file:
-                file_path = self.save_audio_to_file(pcm_data, session_id)
-
-            # Распознаём напрямую из PCM
-            text = self.transcribe_pcm(pcm_data, sample_rate=16000)
-
-            logger.bind(tag=TAG).debug(
-                f"Распознавание завершено за {time.time() - start_time:.3f} с | Текст: '{text}'"
-            )
-            return text, file_path
+            return await self.recognize(self.pcm_to_float32(pcm_data), session_id), None
 
         except Exception as e:
             logger.bind(tag=TAG).error(f"Ошибка распознавания: {e}", exc_info=True)
-            return "", file_path
-
-        finally:
-            # Удаляем временный файл
-            if self.delete_audio_file and file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    logger.bind(tag=TAG).debug(f"Временный файл удалён: {file_path}")
-                except Exception as e:
-                    logger.bind(tag=TAG).error(f"Не удалось удалить файл {file_path}: {e}")
\ No newline at end of file
+            return "", None
@@ -0,0 +1,236 @@
+import os
+import io
+import sys
+import glob
+import asyncio
+import weakref
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import sherpa_onnx
+
+from config.logger import setup_logging
+from core.providers.asr.base import ASRProviderBase
+from core.providers.asr.dto.dto import InterfaceType
+from core.handle.sendAudioHandle import send_stt_partial_message
+
+TAG = __name__
+logger = setup_logging()
+
+
+# 捕获标准输出
+class CaptureOutput:
+    def __enter__(self):
+        self._output = io.StringIO()
+        self._original_stdout = sys.stdout
+        sys.stdout = self._output
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sys.stdout = self._original_stdout
+        self.output = self._output.getvalue()
+        self._output.close()
+
+        # 将捕获到的内容通过 logger 输出
+        if self.output:
+            logger.bind(tag=TAG).info(self.output.strip())
+
+
+class StreamSession:
+    """单个连接正在识别的流及其最近一次发送的中间结果"""
+
+    __slots__ = ("stream", "partial_text")
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.partial_text = ""
+
+
+class ASRProvider(ASRProviderBase):
+    """基于 sherpa-onnx OnlineRecognizer 的流式本地识别
+
+    音频边到达边送入识别流，中间结果实时推送给设备；
+    端点检测或VAD判定说完后，最终结果几乎已经就绪，不需要再整句识别一遍。
+    所有连接共享一个模型，每个连接一个识别流，解码时把所有就绪的流合并为一批。
+    """
+
+    # 识别结果在接收音频时已经得到，直接走内存识别接口
+    in_memory_asr = True
+
+    def __init__(self, config: dict, delete_audio_file: bool):
+        super().__init__()
+        self.interface_type = InterfaceType.LOCAL
+        self.model_dir = config.get("model_dir")
+        self.output_dir = config.get("output_dir", "tmp/")
+        self.delete_audio_file = delete_audio_file
+        num_threads = config.get("num_threads")
+        self.num_threads = int(num_threads) if num_threads else 2
+        # 中间结果推送开关
+        send_partial = config.get("send_partial", True)
+        self.send_partial = str(send_partial).lower() not in ("false", "0", "")
+
+        encoder = config.get("encoder") or self._find_model_file("encoder")
+        decoder = config.get("decoder") or self._find_model_file("decoder")
+        joiner = config.get("joiner") or self._find_model_file("joiner")
+        tokens = config.get("tokens") or os.path.join(self.model_dir, "tokens.txt")
+        for path, name in [
+            (encoder, "encoder"),
+            (decoder, "decoder"),
+            (joiner, "joiner"),
+            (tokens, "tokens"),
+        ]:
+            if not path or not os.path.isfile(path):
+                raise FileNotFoundError(f"流式识别模型文件不存在: {name} {path}")
+
+        with CaptureOutput():
+            self.model = sherpa_onnx.OnlineRecognizer.from_transducer(
+                tokens=tokens,
+                encoder=encoder,
+                decoder=decoder,
+                joiner=joiner,
+                num_threads=self.num_threads,
+                sample_rate=16000,
+                feature_dim=80,
+                decoding_method=config.get("decoding_method", "greedy_search"),
+                enable_endpoint_detection=True,
+                # 已识别出文字后，尾部静音超过该时长即认为一句话结束
+                rule2_min_trailing_silence=float(
+                    config.get("rule2_min_trailing_silence") or 0.8
+                ),
+                rule1_min_trailing_silence=float(
+                    config.get("rule1_min_trailing_silence") or 2.4
+                ),
+                rule3_min_utterance_length=float(
+                    config.get("rule3_min_utterance_length") or 20
+                ),
+            )
+
+        # 每个连接一个识别流，连接释放后自动清理
+        self.sessions = weakref.WeakKeyDictionary()
+        # 已完成识别、等待 speech_to_text 取走的最终结果
+        self.final_texts = {}
+        # 解码在独立线程中批量执行
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sherpa-stream"
+        )
+        self._pending = []
+        self._wakeup = None
+        self._decode_task = None
+        logger.bind(tag=TAG).info(f"流式识别模型加载成功: {encoder}")
+
+    def _find_model_file(self, name: str) -> Optional[str]:
+        """在模型目录中查找文件，优先使用int8量化模型"""
+        candidates = sorted(glob.glob(os.path.join(self.model_dir, f"{name}*.onnx")))
+        int8 = [path for path in candidates if ".int8." in path]
+        return (int8 or candidates or [None])[0]
+
+    async def receive_audio(self, conn, audio, audio_have_voice):
+        if conn.client_listen_mode == "auto" or conn.client_listen_mode == "realtime":
+            have_voice = audio_have_voice
+        else:
+            have_voice = conn.client_have_voice
+
+        conn.asr_audio.append(audio)
+        session = self.sessions.get(conn)
+        if session is None:
+            if not have_voice and not conn.client_have_voice:
+                self._keep_preroll(conn)
+                return
+            # 开始说话：新建识别流，先送入预录音（已包含当前包）
+            session = StreamSession(self.model.create_stream())
+            self.sessions[conn] = session
+            pcm = conn.audio_buffer.view(conn.asr_audio_start, conn.audio_buffer.write_pos)
+        else:
+            pcm = np.frombuffer(conn.last_pcm_frame, dtype=np.int16)
+
+        if len(pcm) > 0:
+            session.stream.accept_waveform(16000, pcm.astype(np.float32) / 32768.0)
+        await self._decode(session.stream)
+
+        voice_stop = conn.client_voice_stop
+        if not voice_stop and self.model.is_endpoint(session.stream):
+            # 端点检测先于VAD判定说完，直接结束本句
+            voice_stop = True
+        elif self.send_partial:
+            text = self.model.get_result(session.stream).strip()
+            if text and text != session.partial_text:
+                session.partial_text = text
+                try:
+                    await send_stt_partial_message(conn, text)
+                except Exception as e:
+                    logger.bind(tag=TAG).debug(f"发送中间识别结果失败: {e}")
+
+        if voice_stop:
+            await self._finish_utterance(conn, session)
+
+    async def _finish_utterance(self, conn, session: StreamSession):
+        """结束当前识别流，取出最终结果并进入后续对话流程"""
+        self.sessions.pop(conn, None)
+        session.stream.input_finished()
+        await self._decode(session.stream)
+        self.final_texts[conn.session_id] = self.model.get_result(session.stream).strip()
+
+        asr_audio_task = conn.asr_audio.copy()
+        asr_pcm_task = bytes(
+            conn.audio_buffer.memoryview(conn.asr_audio_start, conn.audio_buffer.write_pos)
+        )
+        conn.clear_asr_audio()
+        conn.reset_vad_states()
+        if self.has_enough_speech(conn, asr_audio_task):
+            await self.handle_voice_stop(conn, asr_audio_task, asr_pcm_task)
+        self.final_texts.pop(conn.session_id, None)
+
+    async def _decode(self, stream):
+        """提交一个识别流，等待批量解码完成"""
+        loop = asyncio.get_running_loop()
+        if self._decode_task is None or self._decode_task.done():
+            self._wakeup = asyncio.Event()
+            self._decode_task = loop.create_task(self._decode_loop())
+        future = loop.create_future()
+        self._pending.append((stream, future))
+        self._wakeup.set()
+        await future
+
+    async def _decode_loop(self):
+        """把同一时刻就绪的所有连接的识别流合并为一次 decode_streams"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            if not batch:
+                continue
+            try:
+                await loop.run_in_executor(
+                    self._executor, self._decode_batch, [s for s, _ in batch]
+                )
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"流式识别解码失败: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    def _decode_batch(self, streams: List):
+        while True:
+            ready = [s for s in streams if self.model.is_ready(s)]
+            if not ready:
+                return
+            self.model.decode_streams(ready)
+
+    def shutdown(self):
+        """停止解码任务和解码线程"""
+        task = self._decode_task
+        if task is not None and not task.get_loop().is_closed():
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        self._decode_task = None
+        self._executor.shutdown(wait=False)
+
+    async def recognize(self, samples: np.ndarray, session_id: str) -> str:
+        """最终结果已在接收音频时得到，这里直接返回"""
+        return self.final_texts.pop(session_id, "")
+
+    async def speech_to_text(
+        self, opus_data: List[bytes], session_id: str, audio_format="opus"
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """最终结果已在接收音频时得到，这里直接返回"""
+        return self.final_texts.pop(session_id, ""), None
@@ -7,7 +7,7 @@ from datetime import datetime, timezone
 import os
 from typing import Optional, Tuple, List
 from core.providers.asr.dto.dto import InterfaceType
-import requests
+from core.utils.http_client import http_session
 from core.providers.asr.base import ASRProviderBase
 from config.logger import setup_logging
 
@@ -196,7 +196,7 @@ class ASRProvider(ASRProviderBase):
         }
 
         try:
-            response = requests.post(self.API_URL, headers=headers, data=request_body)
+            response = http_session(self.API_URL).post(self.API_URL, headers=headers, data=request_body)
 
             if not response.ok:
                 raise IOError(f"请求失败: {response.status_code} {response.reason}")
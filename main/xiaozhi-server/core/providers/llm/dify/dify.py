@@ -1,6 +1,6 @@
 import json
 from config.logger import setup_logging
-import requests
+from core.utils.http_client import http_session
 from core.providers.llm.base import LLMProviderBase
 from core.providers.llm.system_prompt import get_system_prompt_for_function
 from core.utils.util import check_model_key
@@ -47,7 +47,7 @@ class LLMProvider(LLMProviderBase):
                     "user": session_id,
                 }
 
-            with requests.post(
+            with http_session(self.base_url).post(
                 f"{self.base_url}/{self.mode}",
                 headers={"Authorization": f"Bearer {self.api_key}"},
                 json=request_json,
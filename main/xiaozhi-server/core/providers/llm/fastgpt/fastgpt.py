@@ -1,6 +1,6 @@
 import json
 from config.logger import setup_logging
-import requests
+from core.utils.http_client import http_session
 from core.providers.llm.base import LLMProviderBase
 from core.utils.util import check_model_key
 
@@ -24,7 +24,7 @@ class LLMProvider(LLMProviderBase):
             last_msg = next(m for m in reversed(dialogue) if m["role"] == "user")
 
             # 发起流式请求
-            with requests.post(
+            with http_session(self.base_url).post(
                 f"{self.base_url}/chat/completions",
                 headers={"Authorization": f"Bearer {self.api_key}"},
                 json={
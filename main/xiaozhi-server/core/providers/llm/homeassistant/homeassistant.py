@@ -1,4 +1,4 @@
-import requests
+from core.utils.http_client import http_session
 from requests.exceptions import RequestException
 from config.logger import setup_logging
 from core.providers.llm.base import LLMProviderBase
@@ -40,7 +40,7 @@ class LLMProvider(LLMProviderBase):
             }
 
             # 发起 POST 请求
-            response = requests.post(self.api_url, json=payload, headers=headers)
+            response = http_session(self.api_url).post(self.api_url, json=payload, headers=headers)
 
             # 检查请求是否成功
             response.raise_for_status()
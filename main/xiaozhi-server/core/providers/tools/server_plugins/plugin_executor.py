@@ -1,9 +1,16 @@
 """服务端插件工具执行器"""
 
+import asyncio
+import functools
 from typing import Dict, Any
+from config.logger import setup_logging
+from core.utils.worker_pool import get_plugin_pool
 from ..base import ToolType, ToolDefinition, ToolExecutor
 from plugins_func.register import all_function_registry, Action, ActionResponse
 
+TAG = __name__
+logger = setup_logging()
+
 
 class ServerPluginExecutor(ToolExecutor):
     """服务端插件工具执行器"""
@@ -23,23 +30,37 @@ class ServerPluginExecutor(ToolExecutor):
             )
 
         try:
-            # 根据工具类型决定如何调用
-            if hasattr(func_item, "type"):
-                func_type = func_item.type
-                if func_type.code in [4, 5]:  # SYSTEM_CTL, IOT_CTL (需要conn参数)
-                    result = func_item.func(conn, **arguments)
-                elif func_type.code == 2:  # WAIT
-                    result = func_item.func(**arguments)
-                elif func_type.code == 3:  # CHANGE_SYS_PROMPT
-                    result = func_item.func(conn, **arguments)
-                else:
-                    result = func_item.func(**arguments)
+            # 根据工具类型决定是否传递conn参数
+            args = ()
+            if hasattr(func_item, "type") and func_item.type is not None:
+                # SYSTEM_CTL, IOT_CTL, CHANGE_SYS_PROMPT 需要conn参数
+                if func_item.type.code in [3, 4, 5]:
+                    args = (conn,)
+
+            if func_item.is_async:
+                result = await asyncio.wait_for(
+                    func_item.func(*args, **arguments), func_item.timeout
+                )
+            elif func_item.blocking:
+                # 阻塞的插件（同步网络请求等）放到插件专用线程池执行，不占用事件循环。
+                # 调用方的对话任务正占着共享线程池的线程等待结果，不能再向共享线程池申请
+                call = functools.partial(func_item.func, *args, **arguments)
+                result = await asyncio.wait_for(
+                    get_plugin_pool().run(conn, call), func_item.timeout
+                )
             else:
-                # 默认不传conn参数
-                result = func_item.func(**arguments)
+                result = func_item.func(*args, **arguments)
 
             return result
 
+        except asyncio.TimeoutError:
+            logger.bind(tag=TAG).error(
+                f"插件 {tool_name} 执行超时({func_item.timeout}秒)"
+            )
+            return ActionResponse(
+                action=Action.ERROR,
+                response=f"插件 {tool_name} 执行超时",
+            )
         except Exception as e:
             return ActionResponse(
                 action=Action.ERROR,
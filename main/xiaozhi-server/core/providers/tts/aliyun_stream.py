@@ -1,87 +1,24 @@
 import uuid
 import json
-import hmac
-import hashlib
-import base64
 import time
-import queue
 import asyncio
 import traceback
 from asyncio import Task
 import websockets
 import os
-from datetime import datetime
-from urllib import parse
 from core.providers.tts.base import TTSProviderBase
 from core.providers.tts.dto.dto import SentenceType, ContentType, InterfaceType
 from core.utils.tts import MarkdownCleaner
 from core.utils import opus_encoder_utils, textUtils
+from core.utils.tts_ws_pool import get_tts_ws_pools
+from core.utils.aliyun_token import get_aliyun_token_cache
 from config.logger import setup_logging
 
 TAG = __name__
 logger = setup_logging()
 
-
-class AccessToken:
-    @staticmethod
-    def _encode_text(text):
-        encoded_text = parse.quote_plus(text)
-        return encoded_text.replace("+", "%20").replace("*", "%2A").replace("%7E", "~")
-
-    @staticmethod
-    def _encode_dict(dic):
-        keys = dic.keys()
-        dic_sorted = [(key, dic[key]) for key in sorted(keys)]
-        encoded_text = parse.urlencode(dic_sorted)
-        return encoded_text.replace("+", "%20").replace("*", "%2A").replace("%7E", "~")
-
-    @staticmethod
-    def create_token(access_key_id, access_key_secret):
-        parameters = {
-            "AccessKeyId": access_key_id,
-            "Action": "CreateToken",
-            "Format": "JSON",
-            "RegionId": "cn-shanghai",  # 使用上海地域进行Token获取
-            "SignatureMethod": "HMAC-SHA1",
-            "SignatureNonce": str(uuid.uuid1()),
-            "SignatureVersion": "1.0",
-            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-            "Version": "2019-02-28",
-        }
-
-        query_string = AccessToken._encode_dict(parameters)
-        string_to_sign = (
-            "GET"
-            + "&"
-            + AccessToken._encode_text("/")
-            + "&"
-            + AccessToken._encode_text(query_string)
-        )
-
-        secreted_string = hmac.new(
-            bytes(access_key_secret + "&", encoding="utf-8"),
-            bytes(string_to_sign, encoding="utf-8"),
-            hashlib.sha1,
-        ).digest()
-        signature = base64.b64encode(secreted_string)
-        signature = AccessToken._encode_text(signature)
-
-        full_url = "http://nls-meta.cn-shanghai.aliyuncs.com/?Signature=%s&%s" % (
-            signature,
-            query_string,
-        )
-
-        import requests
-
-        response = requests.get(full_url)
-        if response.ok:
-            root_obj = response.json()
-            key = "Token"
-            if key in root_obj:
-                token = root_obj[key]["Id"]
-                expire_time = root_obj[key]["ExpireTime"]
-                return token, expire_time
-        return None, None
+# 服务端会断开10秒内没有请求的连接，连接池中的空闲连接在此之前淘汰
+WS_MAX_IDLE_TIME = 9
 
 
 class TTSProvider(TTSProviderBase):
@@ -128,7 +65,6 @@ class TTSProvider(TTSProviderBase):
             self.ws_url = f"wss://{self.host}/ws/v1"
         self.ws = None
         self._monitor_task = None
-        self.last_active_time = None
 
         # 专属tts设置
         self.message_id = ""
@@ -140,30 +76,22 @@ class TTSProvider(TTSProviderBase):
 
         # Token管理
         if self.access_key_id and self.access_key_secret:
-            self._refresh_token()
+            # Token由所有实例共享，这里只在后台预取
+            self.token = None
+            self.expire_time = None
+            get_aliyun_token_cache().prefetch(
+                self.access_key_id, self.access_key_secret
+            )
         else:
             self.token = config.get("token")
             self.expire_time = None
 
     def _refresh_token(self):
-        """刷新Token并记录过期时间"""
+        """从共享缓存获取Token并记录过期时间"""
         if self.access_key_id and self.access_key_secret:
-            self.token, expire_time_str = AccessToken.create_token(
+            self.token, self.expire_time = get_aliyun_token_cache().get(
                 self.access_key_id, self.access_key_secret
             )
-            if not expire_time_str:
-                raise ValueError("无法获取有效的Token过期时间")
-
-            expire_str = str(expire_time_str).strip()
-
-            try:
-                if expire_str.isdigit():
-                    expire_time = datetime.fromtimestamp(int(expire_str))
-                else:
-                    expire_time = datetime.strptime(expire_str, "%Y-%m-%dT%H:%M:%SZ")
-                self.expire_time = expire_time.timestamp() - 60
-            except Exception as e:
-                raise ValueError(f"无效的过期时间格式: {expire_str}") from e
         else:
             self.expire_time = None
 
@@ -171,126 +99,134 @@ class TTSProvider(TTSProviderBase):
             raise ValueError("无法获取有效的访问Token")
 
     def _is_token_expired(self):
-        """检查Token是否过期"""
+        """检查Token是否尚未获取或已过期"""
+        if self.access_key_id and self.access_key_secret and not self.token:
+            return True
         if not self.expire_time:
             return False
         return time.time() > self.expire_time
 
+    def _ws_pool(self):
+        """同一appkey和账号的连接在所有设备之间共享，音色在每次会话开始时指定"""
+        return get_tts_ws_pools().pool(
+            ("aliyun_stream", self.ws_url, self.appkey, self.access_key_id or self.token),
+            name=f"aliyun_stream {self.host}",
+            max_idle_time=WS_MAX_IDLE_TIME,
+        )
+
+    async def _connect(self):
+        if self._is_token_expired():
+            self._refresh_token()
+        logger.bind(tag=TAG).info("开始建立新连接...")
+        ws = await websockets.connect(
+            self.ws_url,
+            additional_headers={"X-NLS-Token": self.token},
+            ping_interval=30,
+            ping_timeout=10,
+            close_timeout=10,
+        )
+        logger.bind(tag=TAG).info("WebSocket连接建立成功")
+        return ws
+
+    async def open_audio_channels(self, conn):
+        await super().open_audio_channels(conn)
+        # 设备连上后就开始预热连接，第一轮对话不用等握手
+        self._ws_pool().warm(self._connect)
+
     async def _ensure_connection(self):
-        """确保WebSocket连接可用"""
+        """从连接池租用已打开的WebSocket连接"""
         try:
-            if self._is_token_expired():
-                logger.bind(tag=TAG).warning("Token已过期，正在自动刷新...")
-                self._refresh_token()
-            current_time = time.time()
-            if self.ws and current_time - self.last_active_time < 10:
-                # 10秒内才可以复用链接进行连续对话
-                logger.bind(tag=TAG).info(f"使用已有链接...")
+            if self.ws:
                 return self.ws
-            logger.bind(tag=TAG).info("开始建立新连接...")
-
-            self.ws = await websockets.connect(
-                self.ws_url,
-                additional_headers={"X-NLS-Token": self.token},
-                ping_interval=30,
-                ping_timeout=10,
-                close_timeout=10,
-            )
-            logger.bind(tag=TAG).info("WebSocket连接建立成功")
-            self.last_active_time = time.time()
+            self.ws = await self._ws_pool().acquire(self._connect)
             return self.ws
         except Exception as e:
             logger.bind(tag=TAG).error(f"建立连接失败: {str(e)}")
             self.ws = None
-            self.last_active_time = None
             raise
 
-    def tts_text_priority_thread(self):
-        """流式文本处理线程"""
-        while not self.conn.stop_event.is_set():
-            try:
-                message = self.tts_text_queue.get(timeout=1)
-                logger.bind(tag=TAG).debug(
-                    f"收到TTS任务｜{message.sentence_type.name} ｜ {message.content_type.name} | 会话ID: {self.conn.sentence_id}"
-                )
-
-                if message.sentence_type == SentenceType.FIRST:
-                    self.conn.client_abort = False
-
-                if self.conn.client_abort:
-                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
-                    continue
+    def handle_tts_text_message(self, message):
+        """流式文本处理，每次处理队列中的一条消息"""
+        try:
+            logger.bind(tag=TAG).debug(
+                f"收到TTS任务｜{message.sentence_type.name} ｜ {message.content_type.name} | 会话ID: {self.conn.sentence_id}"
+            )
 
-                if message.sentence_type == SentenceType.FIRST:
-                    # 初始化参数
-                    try:
-                        if not getattr(self.conn, "sentence_id", None):
-                            self.conn.sentence_id = uuid.uuid4().hex
-                            logger.bind(tag=TAG).info(
-                                f"自动生成新的 会话ID: {self.conn.sentence_id}"
-                            )
+            if message.sentence_type == SentenceType.FIRST:
+                self.conn.client_abort = False
 
-                        # aliyunStream独有的参数生成
-                        self.message_id = str(uuid.uuid4().hex)
+            if self.conn.client_abort:
+                logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
+                return
 
-                        logger.bind(tag=TAG).info("开始启动TTS会话...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.start_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
+            if message.sentence_type == SentenceType.FIRST:
+                # 初始化参数
+                try:
+                    if not getattr(self.conn, "sentence_id", None):
+                        self.conn.sentence_id = uuid.uuid4().hex
+                        logger.bind(tag=TAG).info(
+                            f"自动生成新的 会话ID: {self.conn.sentence_id}"
                         )
-                        future.result()
-                        self.before_stop_play_files.clear()
-                        logger.bind(tag=TAG).info("TTS会话启动成功")
 
-                    except Exception as e:
-                        logger.bind(tag=TAG).error(f"启动TTS会话失败: {str(e)}")
-                        continue
+                    # aliyunStream独有的参数生成
+                    self.message_id = str(uuid.uuid4().hex)
 
-                elif ContentType.TEXT == message.content_type:
-                    if message.content_detail:
-                        try:
-                            logger.bind(tag=TAG).debug(
-                                f"开始发送TTS文本: {message.content_detail}"
-                            )
-                            future = asyncio.run_coroutine_threadsafe(
-                                self.text_to_speak(message.content_detail, None),
-                                loop=self.conn.loop,
-                            )
-                            future.result()
-                            logger.bind(tag=TAG).debug("TTS文本发送成功")
-                        except Exception as e:
-                            logger.bind(tag=TAG).error(f"发送TTS文本失败: {str(e)}")
-                            continue
-
-                elif ContentType.FILE == message.content_type:
-                    logger.bind(tag=TAG).info(
-                        f"添加音频文件到待播放列表: {message.content_file}"
+                    logger.bind(tag=TAG).info("开始启动TTS会话...")
+                    future = asyncio.run_coroutine_threadsafe(
+                        self.start_session(self.conn.sentence_id),
+                        loop=self.conn.loop,
                     )
-                    if message.content_file and os.path.exists(message.content_file):
-                        # 先处理文件音频数据
-                        file_audio = self._process_audio_file(message.content_file)
-                        self.before_stop_play_files.append(
-                            (file_audio, message.content_detail)
-                        )
+                    future.result()
+                    self.before_stop_play_files.clear()
+                    logger.bind(tag=TAG).info("TTS会话启动成功")
+
+                except Exception as e:
+                    logger.bind(tag=TAG).error(f"启动TTS会话失败: {str(e)}")
+                    return
 
-                if message.sentence_type == SentenceType.LAST:
+            elif ContentType.TEXT == message.content_type:
+                if message.content_detail:
                     try:
-                        logger.bind(tag=TAG).info("开始结束TTS会话...")
+                        logger.bind(tag=TAG).debug(
+                            f"开始发送TTS文本: {message.content_detail}"
+                        )
                         future = asyncio.run_coroutine_threadsafe(
-                            self.finish_session(self.conn.sentence_id),
+                            self.text_to_speak(message.content_detail, None),
                             loop=self.conn.loop,
                         )
                         future.result()
+                        logger.bind(tag=TAG).debug("TTS文本发送成功")
                     except Exception as e:
-                        logger.bind(tag=TAG).error(f"结束TTS会话失败: {str(e)}")
-                        continue
+                        logger.bind(tag=TAG).error(f"发送TTS文本失败: {str(e)}")
+                        return
 
-            except queue.Empty:
-                continue
-            except Exception as e:
-                logger.bind(tag=TAG).error(
-                    f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            elif ContentType.FILE == message.content_type:
+                logger.bind(tag=TAG).info(
+                    f"添加音频文件到待播放列表: {message.content_file}"
                 )
+                if message.content_file and os.path.exists(message.content_file):
+                    # 先处理文件音频数据
+                    file_audio = self._process_audio_file(message.content_file)
+                    self.before_stop_play_files.append(
+                        (file_audio, message.content_detail)
+                    )
+
+            if message.sentence_type == SentenceType.LAST:
+                try:
+                    logger.bind(tag=TAG).info("开始结束TTS会话...")
+                    future = asyncio.run_coroutine_threadsafe(
+                        self.finish_session(self.conn.sentence_id),
+                        loop=self.conn.loop,
+                    )
+                    future.result()
+                except Exception as e:
+                    logger.bind(tag=TAG).error(f"结束TTS会话失败: {str(e)}")
+                    return
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(
+                f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            )
 
     async def text_to_speak(self, text, _):
         try:
@@ -309,7 +245,6 @@ class TTSProvider(TTSProviderBase):
                 "payload": {"text": filtered_text},
             }
             await self.ws.send(json.dumps(run_request))
-            self.last_active_time = time.time()
             return
 
         except Exception as e:
@@ -336,9 +271,12 @@ class TTSProvider(TTSProviderBase):
                 )
                 await self.close()
 
-            # 建立新连接
+            # 租用已打开的连接
             await self._ensure_connection()
 
+            # 按服务端PCM采样率和设备协商的帧时长编码
+            self.stream_opus_encoder(self.sample_rate)
+
             # 启动监听任务
             self._monitor_task = asyncio.create_task(self._start_monitor_tts_response())
 
@@ -361,7 +299,6 @@ class TTSProvider(TTSProviderBase):
                 },
             }
             await self.ws.send(json.dumps(start_request))
-            self.last_active_time = time.time()
             logger.bind(tag=TAG).info("会话启动请求已发送")
         except Exception as e:
             logger.bind(tag=TAG).error(f"启动会话失败: {str(e)}")
@@ -384,7 +321,6 @@ class TTSProvider(TTSProviderBase):
                 }
                 await self.ws.send(json.dumps(stop_request))
                 logger.bind(tag=TAG).info("会话结束请求已发送")
-                self.last_active_time = time.time()
                 if self._monitor_task:
                     try:
                         await self._monitor_task
@@ -418,7 +354,6 @@ class TTSProvider(TTSProviderBase):
             except:
                 pass
             self.ws = None
-            self.last_active_time = None
 
     async def _start_monitor_tts_response(self):
         """监听TTS响应"""
@@ -430,7 +365,6 @@ class TTSProvider(TTSProviderBase):
             while not self.conn.stop_event.is_set():
                 try:
                     msg = await self.ws.recv()
-                    self.last_active_time = time.time()
                     # 检查客户端是否中止
                     if self.conn.client_abort:
                         logger.bind(tag=TAG).info("收到打断信息，终止监听TTS响应")
@@ -501,8 +435,11 @@ class TTSProvider(TTSProviderBase):
                         f"处理TTS响应时出错: {e}\n{traceback.format_exc()}"
                     )
                     break
-            # 仅在连接异常时才关闭
-            if not session_finished and self.ws:
+            # 会话正常结束时归还连接，连接异常或被打断时关闭
+            if session_finished and self.ws:
+                self._ws_pool().release(self.ws)
+                self.ws = None
+            elif self.ws:
                 try:
                     await self.ws.close()
                 except:
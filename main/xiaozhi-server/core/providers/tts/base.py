@@ -1,16 +1,30 @@
 import os
 import re
-import queue
 import uuid
 import asyncio
-import threading
 from core.utils import p3
 from datetime import datetime
-from core.utils import textUtils
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from core.utils.util import audio_to_data, audio_bytes_to_data
 from core.utils.tts import MarkdownCleaner
+from core.utils.sentence_segmenter import (
+    SentenceSegmenter,
+    FIRST_SENTENCE_PUNCTUATIONS,
+    PUNCTUATIONS,
+)
+from core.utils.worker_pool import AsyncQueue
+from core.utils.tts_pipeline import TTSPipeline
+from core.utils.audio_stream import create_stream_decoder, StreamFrameEncoder
+from core.utils.opus_packet import opus_container, OpusPassthroughDecoder
+from core.utils.opus_codec import (
+    SAMPLE_RATE,
+    CHANNELS,
+    DEFAULT_AUDIO_PARAMS,
+    AudioParams,
+)
+from core.utils.opus_encoder_utils import OpusEncoderUtils
+from core.utils.tts_cache import get_tts_cache, cache_params, make_cache_key
 from core.utils.output_counter import add_device_output
 from core.handle.reportHandle import enqueue_tts_report
 from core.handle.sendAudioHandle import sendAudioMessage
@@ -26,6 +40,9 @@ import traceback
 TAG = __name__
 logger = setup_logging()
 
+# 单流式合成时，首个音频块立即发送，之后每攒够这么多帧（60ms/帧）再放入播放队列
+STREAM_BATCH_FRAMES = 5
+
 
 class TTSProviderBase(ABC):
     def __init__(self, config, delete_audio_file):
@@ -35,41 +52,37 @@ class TTSProviderBase(ABC):
         self.delete_audio_file = delete_audio_file
         self.audio_file_type = "wav"
         self.output_file = config.get("output_dir", "tmp/")
-        self.tts_text_queue = queue.Queue()
-        self.tts_audio_queue = queue.Queue()
+        # 生产者可能在任意线程，消费者是事件循环中的任务
+        self.tts_text_queue = AsyncQueue()
+        self.tts_audio_queue = AsyncQueue()
         self.tts_audio_first_sentence = True
         self.before_stop_play_files = []
 
-        self.tts_text_buff = []
-        self.punctuations = (
-            "。",
-            "？",
-            "?",
-            "！",
-            "!",
-            "；",
-            ";",
-            "：",
-            "~",
-        )
-        self.first_sentence_punctuations = (
-            "，",
-            "～",
-            "~",
-            "、",
-            ",",
-            "。",
-            "？",
-            "?",
-            "！",
-            "!",
-            "；",
-            ";",
-            "：",
+        # 增量断句，可在TTS配置中调整断句标点和句子长度
+        self.segmenter = SentenceSegmenter(
+            first_sentence_punctuations=config.get("first_sentence_punctuations")
+            or FIRST_SENTENCE_PUNCTUATIONS,
+            punctuations=config.get("punctuations") or PUNCTUATIONS,
+            min_length=config.get("min_segment_length") or 0,
+            max_length=config.get("max_segment_length") or 0,
         )
         self.tts_stop_request = False
-        self.processed_chars = 0
-        self.is_first_sentence = True
+        # 常用短句的合成结果缓存，可在TTS配置中设置 cache: false 关闭。
+        # 边接收LLM输出边合成的TTS（火山双流式、阿里云流式、LinkerAI）不经过
+        # _synthesize_segment，合成前拿不到整句文本，不使用缓存
+        self.use_cache = str(config.get("cache", True)).lower() not in (
+            "false",
+            "0",
+            "",
+        )
+        self.cache_params = cache_params(config)
+        # 非流式TTS同时进行的合成请求数，大于1时下一句在上一句播放期间就开始合成，
+        # 按服务商的并发限制在TTS配置中设置 synthesis_concurrency
+        concurrency = config.get("synthesis_concurrency")
+        self.synthesis_concurrency = max(int(concurrency), 1) if concurrency else 1
+        self._pipeline = None
+        # 单流式合成返回裸PCM时的采样率，mp3/wav等格式自带采样率
+        self.stream_sample_rate = 16000
 
     def generate_filename(self, extension=".wav"):
         return os.path.join(
@@ -87,7 +100,10 @@ class TTSProviderBase(ABC):
                     audio_bytes = asyncio.run(self.text_to_speak(text, None))
                     if audio_bytes:
                         audio_datas, _ = audio_bytes_to_data(
-                            audio_bytes, file_type=self.audio_file_type, is_opus=True
+                            audio_bytes,
+                            file_type=self.audio_file_type,
+                            is_opus=True,
+                            audio_params=self.audio_params(),
                         )
                         return audio_datas
                     else:
@@ -139,13 +155,55 @@ class TTSProviderBase(ABC):
     async def text_to_speak(self, text, output_file):
         pass
 
+    def audio_params(self) -> AudioParams:
+        """设备协商的采样率和帧时长，未连接设备时为默认的16kHz、60ms"""
+        return self.conn.audio_params if self.conn is not None else DEFAULT_AUDIO_PARAMS
+
+    def stream_opus_encoder(self, sample_rate: int = SAMPLE_RATE) -> OpusEncoderUtils:
+        """双流式提供者编码服务端PCM的编码器，sample_rate为PCM的采样率，
+        帧时长与设备协商的一致，参数变化时重建
+        """
+        frame_duration = self.audio_params().frame_duration
+        encoder = getattr(self, "opus_encoder", None)
+        if (
+            encoder is None
+            or encoder.sample_rate != sample_rate
+            or encoder.frame_size_ms != frame_duration
+        ):
+            encoder = self.opus_encoder = OpusEncoderUtils(
+                sample_rate=sample_rate, channels=CHANNELS, frame_size_ms=frame_duration
+            )
+        return encoder
+
+    def opus_passthrough_container(self):
+        """服务商直接返回Opus（audio_file_type为opus/ogg_opus/webm）且设备使用Opus时，
+        返回封装格式，音频只重新组包不再解码编码；否则返回None
+        """
+        if self.conn is not None and self.conn.audio_format == "pcm":
+            return None
+        return opus_container(self.audio_file_type)
+
+    # 可选的单流式合成钩子。子类实现为异步生成器 async def text_to_audio_stream(self, text)，
+    # 逐块返回 audio_file_type 格式（mp3/wav/pcm等）的音频，并把 interface_type 设为
+    # SINGLE_STREAM 后，音频边合成边解码、编码并放入播放队列，不必等整句合成完成。
+    # 没有实现时按整句合成
+    text_to_audio_stream = None
+
+    def supports_audio_stream(self) -> bool:
+        """是否实现了单流式合成钩子"""
+        return self.text_to_audio_stream is not None
+
     def audio_to_pcm_data(self, audio_file_path):
         """音频文件转换为PCM编码"""
-        return audio_to_data(audio_file_path, is_opus=False)
+        return audio_to_data(
+            audio_file_path, is_opus=False, audio_params=self.audio_params()
+        )
 
     def audio_to_opus_data(self, audio_file_path):
         """音频文件转换为Opus编码"""
-        return audio_to_data(audio_file_path, is_opus=True)
+        return audio_to_data(
+            audio_file_path, is_opus=True, audio_params=self.audio_params()
+        )
 
     def tts_one_sentence(
         self,
@@ -178,99 +236,87 @@ class TTSProviderBase(ABC):
     async def open_audio_channels(self, conn):
         self.conn = conn
         self.tts_timeout = conn.config.get("tts_timeout", 10)
-        # tts 消化线程
-        self.tts_priority_thread = threading.Thread(
-            target=self.tts_text_priority_thread, daemon=True
+        if (
+            self.interface_type == InterfaceType.NON_STREAM
+            and self.synthesis_concurrency > 1
+        ):
+            self._pipeline = TTSPipeline(
+                submit=conn.executor.submit,
+                output=self.tts_audio_queue.put,
+                concurrency=self.synthesis_concurrency,
+            )
+        # tts 消化任务
+        self.tts_priority_task = conn.create_worker_task(
+            self.tts_text_priority_task()
         )
-        self.tts_priority_thread.start()
 
-        # 音频播放 消化线程
-        self.audio_play_priority_thread = threading.Thread(
-            target=self._audio_play_priority_thread, daemon=True
+        # 音频播放 消化任务
+        self.audio_play_priority_task = conn.create_worker_task(
+            self._audio_play_priority_task()
         )
-        self.audio_play_priority_thread.start()
 
-    # 这里默认是非流式的处理方式
-    # 流式处理方式请在子类中重写
-    def tts_text_priority_thread(self):
+    async def tts_text_priority_task(self):
+        """按顺序消费TTS文本队列，每条消息在共享线程池中处理"""
         while not self.conn.stop_event.is_set():
+            message = await self.tts_text_queue.get_async()
             try:
-                message = self.tts_text_queue.get(timeout=1)
-                if message.sentence_type == SentenceType.FIRST:
-                    self.conn.client_abort = False
-                if self.conn.client_abort:
-                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
-                    continue
-                if message.sentence_type == SentenceType.FIRST:
-                    # 初始化参数
-                    self.tts_stop_request = False
-                    self.processed_chars = 0
-                    self.tts_text_buff = []
-                    self.is_first_sentence = True
-                    self.tts_audio_first_sentence = True
-                elif ContentType.TEXT == message.content_type:
-                    self.tts_text_buff.append(message.content_detail)
-                    segment_text = self._get_segment_text()
-                    if segment_text:
-                        if self.delete_audio_file:
-                            audio_datas = self.to_tts(segment_text)
-                            if audio_datas:
-                                self.tts_audio_queue.put(
-                                    (message.sentence_type, audio_datas, segment_text)
-                                )
-                        else:
-                            tts_file = self.to_tts(segment_text)
-                            if tts_file:
-                                audio_datas = self._process_audio_file(tts_file)
-                                self.tts_audio_queue.put(
-                                    (message.sentence_type, audio_datas, segment_text)
-                                )
-                elif ContentType.FILE == message.content_type:
-                    self._process_remaining_text()
-                    tts_file = message.content_file
-                    if tts_file and os.path.exists(tts_file):
-                        audio_datas = self._process_audio_file(tts_file)
-                        self.tts_audio_queue.put(
-                            (message.sentence_type, audio_datas, message.content_detail)
-                        )
+                await self.conn.executor.run(self.handle_tts_text_message, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"提交TTS文本处理任务失败: {e}")
 
-                if message.sentence_type == SentenceType.LAST:
-                    self._process_remaining_text()
-                    self.tts_audio_queue.put(
-                        (message.sentence_type, [], message.content_detail)
+    # 这里默认是非流式的处理方式
+    # 流式处理方式请在子类中重写
+    def handle_tts_text_message(self, message):
+        try:
+            if message.sentence_type == SentenceType.FIRST:
+                self.conn.client_abort = False
+            if self.conn.client_abort:
+                logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
+                return
+            if message.sentence_type == SentenceType.FIRST:
+                # 初始化参数
+                self.tts_stop_request = False
+                self.segmenter.reset()
+                self.tts_audio_first_sentence = True
+            elif ContentType.TEXT == message.content_type:
+                for segment_text in self.segmenter.feed(message.content_detail):
+                    self._synthesize_segment(message.sentence_type, segment_text)
+            elif ContentType.FILE == message.content_type:
+                self._process_remaining_text()
+                tts_file = message.content_file
+                if tts_file and os.path.exists(tts_file):
+                    audio_datas = self._process_audio_file(tts_file)
+                    self._enqueue_audio(
+                        (message.sentence_type, audio_datas, message.content_detail)
                     )
 
-            except queue.Empty:
-                continue
-            except Exception as e:
-                logger.bind(tag=TAG).error(
-                    f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            if message.sentence_type == SentenceType.LAST:
+                self._process_remaining_text()
+                self._enqueue_audio(
+                    (message.sentence_type, [], message.content_detail)
                 )
-                continue
 
-    def _audio_play_priority_thread(self):
+        except Exception as e:
+            logger.bind(tag=TAG).error(
+                f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            )
+
+    async def _audio_play_priority_task(self):
         while not self.conn.stop_event.is_set():
             text = None
             try:
-                try:
-                    sentence_type, audio_datas, text = self.tts_audio_queue.get(
-                        timeout=1
-                    )
-                except queue.Empty:
-                    if self.conn.stop_event.is_set():
-                        break
-                    continue
-                future = asyncio.run_coroutine_threadsafe(
-                    sendAudioMessage(self.conn, sentence_type, audio_datas, text),
-                    self.conn.loop,
-                )
-                future.result()
+                sentence_type, audio_datas, text = await self.tts_audio_queue.get_async()
+                await sendAudioMessage(self.conn, sentence_type, audio_datas, text)
                 if self.conn.max_output_size > 0 and text:
                     add_device_output(self.conn.headers.get("device-id"), len(text))
                 enqueue_tts_report(self.conn, text, audio_datas)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
-                    f"audio_play_priority priority_thread: {text} {e}"
+                    f"audio_play_priority priority_task: {text} {e}"
                 )
 
     async def start_session(self, session_id):
@@ -281,47 +327,162 @@ class TTSProviderBase(ABC):
 
     async def close(self):
         """资源清理方法"""
+        self.cancel_synthesis()
         if hasattr(self, "ws") and self.ws:
             await self.ws.close()
 
-    def _get_segment_text(self):
-        # 合并当前全部文本并处理未分割部分
-        full_text = "".join(self.tts_text_buff)
-        current_text = full_text[self.processed_chars :]  # 从未处理的位置开始
-        last_punct_pos = -1
-
-        # 根据是否是第一句话选择不同的标点符号集合
-        punctuations_to_use = (
-            self.first_sentence_punctuations
-            if self.is_first_sentence
-            else self.punctuations
-        )
+    def cancel_synthesis(self):
+        """打断时丢弃流水线中尚未播放的合成任务"""
+        if self._pipeline is not None:
+            self._pipeline.cancel()
 
-        for punct in punctuations_to_use:
-            pos = current_text.rfind(punct)
-            if (pos != -1 and last_punct_pos == -1) or (
-                pos != -1 and pos < last_punct_pos
-            ):
-                last_punct_pos = pos
-
-        if last_punct_pos != -1:
-            segment_text_raw = current_text[: last_punct_pos + 1]
-            segment_text = textUtils.get_string_no_punctuation_or_emoji(
-                segment_text_raw
+    def _enqueue_audio(self, item):
+        """放入播放队列，启用流水线时排在之前提交的合成结果之后"""
+        if self._pipeline is not None:
+            self._pipeline.put(item)
+        else:
+            self.tts_audio_queue.put(item)
+
+    def _synthesize_segment(self, sentence_type, segment_text):
+        """合成一句文本并放入播放队列，缓存命中时跳过合成和编码"""
+        cache_key = self._get_cache_key(segment_text)
+        if cache_key:
+            audio_datas = get_tts_cache().get(cache_key)
+            if audio_datas:
+                logger.bind(tag=TAG).debug(f"TTS缓存命中: {segment_text}")
+                self._enqueue_audio((sentence_type, audio_datas, segment_text))
+                return
+
+        if self._pipeline is not None:
+            # 在线程池中合成，不等待结果，结果按提交顺序进入播放队列
+            self._pipeline.submit(
+                self._synthesize_audio, sentence_type, segment_text, cache_key
             )
-            self.processed_chars += len(segment_text_raw)  # 更新已处理字符位置
+            return
+        if (
+            self.interface_type == InterfaceType.SINGLE_STREAM
+            and self.supports_audio_stream()
+        ):
+            if self._stream_segment(sentence_type, segment_text, cache_key):
+                return
+            # 流式合成没有输出任何音频，退回整句合成
+        item = self._synthesize_audio(sentence_type, segment_text, cache_key)
+        if item:
+            self.tts_audio_queue.put(item)
+
+    def _synthesize_audio(self, sentence_type, segment_text, cache_key):
+        """调用TTS合成并编码，返回播放队列的一项，失败时返回None"""
+        if self.delete_audio_file:
+            audio_datas = self.to_tts(segment_text)
+        else:
+            tts_file = self.to_tts(segment_text)
+            audio_datas = self._process_audio_file(tts_file) if tts_file else None
+        if not audio_datas:
+            return None
+        if cache_key:
+            get_tts_cache().put(cache_key, audio_datas)
+        return (sentence_type, audio_datas, segment_text)
+
+    def _stream_segment(self, sentence_type, segment_text, cache_key):
+        """边合成边解码推送一句音频，返回是否已经处理（推送过音频或被打断）"""
+        text = MarkdownCleaner.clean_markdown(segment_text)
+        container = self.opus_passthrough_container()
+        audio_params = self.audio_params()
+        frame_encoder = (
+            None
+            if container
+            else StreamFrameEncoder(
+                is_opus=self.conn.audio_format != "pcm", audio_params=audio_params
+            )
+        )
+        pending = []
+        all_frames = [] if cache_key else None
+        sent = False
+
+        def emit(frames, force=False):
+            nonlocal sent
+            pending.extend(frames)
+            if not pending or self.conn.client_abort:
+                return
+            # 首个音频块尽快发出，之后攒够一批再发，减少消息数量
+            if sent and not force and len(pending) < STREAM_BATCH_FRAMES:
+                return
+            if sent:
+                self.tts_audio_queue.put((SentenceType.MIDDLE, pending[:], None))
+            else:
+                self.tts_audio_queue.put((sentence_type, pending[:], segment_text))
+                sent = True
+            pending.clear()
+
+        def on_frames(frames):
+            if all_frames is not None:
+                all_frames.extend(frames)
+            emit(frames)
 
-            # 如果是第一句话，在找到第一个逗号后，将标志设置为False
-            if self.is_first_sentence:
-                self.is_first_sentence = False
+        def on_pcm(pcm):
+            on_frames(frame_encoder.encode(pcm))
+
+        async def run():
+            async for chunk in self.text_to_audio_stream(text):
+                if self.conn.client_abort:
+                    return False
+                decoder.feed(chunk)
+            return True
 
-            return segment_text
-        elif self.tts_stop_request and current_text:
-            segment_text = current_text
-            self.is_first_sentence = True  # 重置标志
-            return segment_text
+        if container:
+            decoder = OpusPassthroughDecoder(
+                container, on_frames, audio_params.frame_duration
+            )
         else:
+            decoder = create_stream_decoder(
+                self.audio_file_type,
+                on_pcm,
+                sample_rate=self.stream_sample_rate,
+                output_rate=audio_params.sample_rate,
+            )
+        try:
+            completed = asyncio.run(run())
+            if completed:
+                decoder.close()
+        except Exception as e:
+            decoder.abort()
+            logger.bind(tag=TAG).warning(f"流式语音生成失败: {text}，错误: {e}")
+            return sent
+        if not completed:
+            decoder.abort()
+            logger.bind(tag=TAG).info(f"收到打断信息，停止流式语音生成: {text}")
+            return True
+
+        if frame_encoder is not None:
+            on_frames(frame_encoder.encode(b"", end_of_stream=True))
+        emit([], force=True)
+        if not sent:
+            return self.conn.client_abort
+        if cache_key and all_frames:
+            get_tts_cache().put(cache_key, all_frames)
+        logger.bind(tag=TAG).info(f"流式语音生成成功: {text}")
+        return True
+
+    def _get_cache_key(self, text):
+        """返回缓存键，不使用缓存时返回None"""
+        cache = get_tts_cache()
+        if (
+            not self.use_cache
+            or cache is None
+            or not cache.accepts(text)
+            # 缓存的是Opus帧，PCM连接不使用缓存
+            or self.conn.audio_format == "pcm"
+        ):
             return None
+        params = dict(self.cache_params, voice=getattr(self, "voice", None))
+        audio_params = self.audio_params()
+        if not audio_params.is_default:
+            # 缓存的Opus帧与采样率和帧时长相关，默认参数不加入键，已有缓存保持有效
+            params["audio_params"] = [
+                audio_params.sample_rate,
+                audio_params.frame_duration,
+            ]
+        return make_cache_key(self.__class__.__module__, params, text)
 
     def _process_audio_file(self, tts_file):
         """处理音频文件并转换为指定格式
@@ -333,19 +494,19 @@ class TTSProviderBase(ABC):
         Returns:
             tuple: (sentence_type, audio_datas, content_detail)
         """
-        if tts_file.endswith(".p3"):
-            audio_datas, _ = p3.decode_opus_from_file(tts_file)
+        is_temp_file = self.delete_audio_file and tts_file.startswith(self.output_file)
+        if tts_file.endswith(".p3") and self.audio_params().is_default:
+            if is_temp_file:
+                audio_datas, _ = p3.decode_opus_from_file(tts_file)
+            else:
+                # 音乐等长期保存的p3文件按需读取，不必整首载入内存
+                audio_datas = p3.open_opus_frames(tts_file)
         elif self.conn.audio_format == "pcm":
             audio_datas, _ = self.audio_to_pcm_data(tts_file)
         else:
             audio_datas, _ = self.audio_to_opus_data(tts_file)
 
-        if (
-            self.delete_audio_file
-            and tts_file is not None
-            and os.path.exists(tts_file)
-            and tts_file.startswith(self.output_file)
-        ):
+        if is_temp_file and os.path.exists(tts_file):
             os.remove(tts_file)
         return audio_datas
 
@@ -361,23 +522,8 @@ class TTSProviderBase(ABC):
         Returns:
             bool: 是否成功处理了文本
         """
-        full_text = "".join(self.tts_text_buff)
-        remaining_text = full_text[self.processed_chars :]
-        if remaining_text:
-            segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
-            if segment_text:
-                if self.delete_audio_file:
-                    audio_datas = self.to_tts(segment_text)
-                    if audio_datas:
-                        self.tts_audio_queue.put(
-                            (SentenceType.MIDDLE, audio_datas, segment_text)
-                        )
-                else:
-                    tts_file = self.to_tts(segment_text)
-                    audio_datas = self._process_audio_file(tts_file)
-                    self.tts_audio_queue.put(
-                        (SentenceType.MIDDLE, audio_datas, segment_text)
-                    )
-                self.processed_chars += len(full_text)
-                return True
+        segment_text = self.segmenter.flush()
+        if segment_text:
+            self._synthesize_segment(SentenceType.MIDDLE, segment_text)
+            return True
         return False
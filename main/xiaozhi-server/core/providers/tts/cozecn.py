@@ -1,4 +1,4 @@
-import requests
+from core.utils.http_client import http_session
 from core.providers.tts.base import TTSProviderBase
 
 
@@ -29,7 +29,7 @@ class TTSProvider(TTSProviderBase):
         }
 
         try:
-            response = requests.request(
+            response = http_session(self.api_url).request(
                 "POST", self.api_url, json=request_json, headers=headers
             )
             data = response.content
@@ -1,14 +1,15 @@
 import os
 import uuid
 import json
-import queue
 import asyncio
 import traceback
 import websockets
 from core.utils.tts import MarkdownCleaner
 from config.logger import setup_logging
 from core.utils import opus_encoder_utils
+from core.utils.opus_packet import OpusPassthrough
 from core.utils.util import check_model_key
+from core.utils.tts_ws_pool import get_tts_ws_pools
 from core.providers.tts.base import TTSProviderBase
 from core.providers.tts.dto.dto import SentenceType, ContentType, InterfaceType
 from asyncio import Task
@@ -160,6 +161,9 @@ class TTSProvider(TTSProviderBase):
         self.opus_encoder = opus_encoder_utils.OpusEncoderUtils(
             sample_rate=16000, channels=1, frame_size_ms=60
         )
+        # 配置为ogg_opus且设备使用Opus时直接转发Opus，否则请求pcm再编码
+        self.audio_file_type = config.get("format", "pcm")
+        self._opus_passthrough = None
         model_key_msg = check_model_key("TTS", self.access_token)
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
@@ -171,119 +175,133 @@ class TTSProvider(TTSProviderBase):
             logger.bind(tag=TAG).error(f"Failed to open audio channels: {str(e)}")
             self.ws = None
             raise
+        # 设备连上后就开始预热连接，第一轮对话不用等握手
+        self._ws_pool().warm(self._connect)
+
+    def _ws_pool(self):
+        """同一应用和资源的连接在所有设备之间共享，音色在每次会话开始时指定"""
+        return get_tts_ws_pools().pool(
+            (
+                "huoshan_double_stream",
+                self.ws_url,
+                self.appId,
+                self.access_token,
+                self.resource_id,
+            ),
+            name=f"huoshan_double_stream {self.resource_id}",
+        )
+
+    async def _connect(self):
+        logger.bind(tag=TAG).info("开始建立新连接...")
+        ws_header = {
+            "X-Api-App-Key": self.appId,
+            "X-Api-Access-Key": self.access_token,
+            "X-Api-Resource-Id": self.resource_id,
+            "X-Api-Connect-Id": uuid.uuid4(),
+        }
+        ws = await websockets.connect(
+            self.ws_url, additional_headers=ws_header, max_size=1000000000
+        )
+        logger.bind(tag=TAG).info("WebSocket连接建立成功")
+        return ws
 
     async def _ensure_connection(self):
-        """建立新的WebSocket连接"""
+        """从连接池租用已打开的WebSocket连接"""
         try:
             if self.ws:
                 logger.bind(tag=TAG).info(f"使用已有链接...")
                 return self.ws
-            logger.bind(tag=TAG).info("开始建立新连接...")
-            ws_header = {
-                "X-Api-App-Key": self.appId,
-                "X-Api-Access-Key": self.access_token,
-                "X-Api-Resource-Id": self.resource_id,
-                "X-Api-Connect-Id": uuid.uuid4(),
-            }
-            self.ws = await websockets.connect(
-                self.ws_url, additional_headers=ws_header, max_size=1000000000
-            )
-            logger.bind(tag=TAG).info("WebSocket连接建立成功")
+            self.ws = await self._ws_pool().acquire(self._connect)
             return self.ws
         except Exception as e:
             logger.bind(tag=TAG).error(f"建立连接失败: {str(e)}")
             self.ws = None
             raise
 
-    def tts_text_priority_thread(self):
-        """火山引擎双流式TTS的文本处理线程"""
-        while not self.conn.stop_event.is_set():
-            try:
-                message = self.tts_text_queue.get(timeout=1)
-                logger.bind(tag=TAG).debug(
-                    f"收到TTS任务｜{message.sentence_type.name} ｜ {message.content_type.name} | 会话ID: {self.conn.sentence_id}"
-                )
+    def handle_tts_text_message(self, message):
+        """火山引擎双流式TTS的文本处理，每次处理队列中的一条消息"""
+        try:
+            logger.bind(tag=TAG).debug(
+                f"收到TTS任务｜{message.sentence_type.name} ｜ {message.content_type.name} | 会话ID: {self.conn.sentence_id}"
+            )
 
-                if message.sentence_type == SentenceType.FIRST:
-                    self.conn.client_abort = False
+            if message.sentence_type == SentenceType.FIRST:
+                self.conn.client_abort = False
 
-                if self.conn.client_abort:
-                    try:
-                        logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
-                        asyncio.run_coroutine_threadsafe(
-                            self.cancel_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        continue
-                    except Exception as e:
-                        logger.bind(tag=TAG).error(f"取消TTS会话失败: {str(e)}")
-                        continue
-
-                if message.sentence_type == SentenceType.FIRST:
-                    # 初始化参数
-                    try:
-                        if not getattr(self.conn, "sentence_id", None): 
-                            self.conn.sentence_id = uuid.uuid4().hex
-                            logger.bind(tag=TAG).info(f"自动生成新的 会话ID: {self.conn.sentence_id}")
+            if self.conn.client_abort:
+                try:
+                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
+                    asyncio.run_coroutine_threadsafe(
+                        self.cancel_session(self.conn.sentence_id),
+                        loop=self.conn.loop,
+                    )
+                    return
+                except Exception as e:
+                    logger.bind(tag=TAG).error(f"取消TTS会话失败: {str(e)}")
+                    return
 
-                        logger.bind(tag=TAG).info("开始启动TTS会话...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.start_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        future.result()
-                        self.before_stop_play_files.clear()
-                        logger.bind(tag=TAG).info("TTS会话启动成功")
-                    except Exception as e:
-                        logger.bind(tag=TAG).error(f"启动TTS会话失败: {str(e)}")
-                        continue
-
-                elif ContentType.TEXT == message.content_type:
-                    if message.content_detail:
-                        try:
-                            logger.bind(tag=TAG).debug(
-                                f"开始发送TTS文本: {message.content_detail}"
-                            )
-                            future = asyncio.run_coroutine_threadsafe(
-                                self.text_to_speak(message.content_detail, None),
-                                loop=self.conn.loop,
-                            )
-                            future.result()
-                            logger.bind(tag=TAG).debug("TTS文本发送成功")
-                        except Exception as e:
-                            logger.bind(tag=TAG).error(f"发送TTS文本失败: {str(e)}")
-                            continue
-
-                elif ContentType.FILE == message.content_type:
-                    logger.bind(tag=TAG).info(
-                        f"添加音频文件到待播放列表: {message.content_file}"
+            if message.sentence_type == SentenceType.FIRST:
+                # 初始化参数
+                try:
+                    if not getattr(self.conn, "sentence_id", None): 
+                        self.conn.sentence_id = uuid.uuid4().hex
+                        logger.bind(tag=TAG).info(f"自动生成新的 会话ID: {self.conn.sentence_id}")
+
+                    logger.bind(tag=TAG).info("开始启动TTS会话...")
+                    future = asyncio.run_coroutine_threadsafe(
+                        self.start_session(self.conn.sentence_id),
+                        loop=self.conn.loop,
                     )
-                    if message.content_file and os.path.exists(message.content_file):
-                        # 先处理文件音频数据
-                        file_audio = self._process_audio_file(message.content_file)
-                        self.before_stop_play_files.append(
-                            (file_audio, message.content_detail)
-                        )
+                    future.result()
+                    self.before_stop_play_files.clear()
+                    logger.bind(tag=TAG).info("TTS会话启动成功")
+                except Exception as e:
+                    logger.bind(tag=TAG).error(f"启动TTS会话失败: {str(e)}")
+                    return
 
-                if message.sentence_type == SentenceType.LAST:
+            elif ContentType.TEXT == message.content_type:
+                if message.content_detail:
                     try:
-                        logger.bind(tag=TAG).info("开始结束TTS会话...")
+                        logger.bind(tag=TAG).debug(
+                            f"开始发送TTS文本: {message.content_detail}"
+                        )
                         future = asyncio.run_coroutine_threadsafe(
-                            self.finish_session(self.conn.sentence_id),
+                            self.text_to_speak(message.content_detail, None),
                             loop=self.conn.loop,
                         )
                         future.result()
+                        logger.bind(tag=TAG).debug("TTS文本发送成功")
                     except Exception as e:
-                        logger.bind(tag=TAG).error(f"结束TTS会话失败: {str(e)}")
-                        continue
+                        logger.bind(tag=TAG).error(f"发送TTS文本失败: {str(e)}")
+                        return
 
-            except queue.Empty:
-                continue
-            except Exception as e:
-                logger.bind(tag=TAG).error(
-                    f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            elif ContentType.FILE == message.content_type:
+                logger.bind(tag=TAG).info(
+                    f"添加音频文件到待播放列表: {message.content_file}"
                 )
-                continue
+                if message.content_file and os.path.exists(message.content_file):
+                    # 先处理文件音频数据
+                    file_audio = self._process_audio_file(message.content_file)
+                    self.before_stop_play_files.append(
+                        (file_audio, message.content_detail)
+                    )
+
+            if message.sentence_type == SentenceType.LAST:
+                try:
+                    logger.bind(tag=TAG).info("开始结束TTS会话...")
+                    future = asyncio.run_coroutine_threadsafe(
+                        self.finish_session(self.conn.sentence_id),
+                        loop=self.conn.loop,
+                    )
+                    future.result()
+                except Exception as e:
+                    logger.bind(tag=TAG).error(f"结束TTS会话失败: {str(e)}")
+                    return
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(
+                f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            )
 
     async def text_to_speak(self, text, _):
         """发送文本到TTS服务"""
@@ -321,7 +339,7 @@ class TTSProvider(TTSProviderBase):
                 logger.bind(tag=TAG).info("检测到未完成的上个会话，关闭监听任务和连接...")
                 await self.close()
 
-            # 建立新连接
+            # 租用已打开的连接
             await self._ensure_connection()
 
             # 启动监听任务
@@ -335,8 +353,19 @@ class TTSProvider(TTSProviderBase):
             optional = Optional(
                 event=EVENT_StartSession, sessionId=session_id
             ).as_bytes()
+            container = self.opus_passthrough_container()
+            if container:
+                self._opus_passthrough = OpusPassthrough(
+                    container, self.audio_params().frame_duration
+                )
+            else:
+                self._opus_passthrough = None
+                # 按设备协商的帧时长编码
+                self.stream_opus_encoder()
             payload = self.get_payload_bytes(
-                event=EVENT_StartSession, speaker=self.voice
+                event=EVENT_StartSession,
+                speaker=self.voice,
+                audio_format=self.audio_file_type if container else "pcm",
             )
             await self.send_event(self.ws, header, optional, payload)
             logger.bind(tag=TAG).info("会话启动请求已发送")
@@ -452,7 +481,7 @@ class TTSProvider(TTSProviderBase):
                         and res.header.message_type == AUDIO_ONLY_RESPONSE
                     ):
                         logger.bind(tag=TAG).debug(f"推送数据到队列里面～～")
-                        opus_datas = self.wav_to_opus_data_audio_raw(res.payload)
+                        opus_datas = self._payload_to_opus(res.payload)
                         logger.bind(tag=TAG).debug(
                             f"推送数据到队列里面帧数～～{len(opus_datas)}"
                         )
@@ -469,6 +498,15 @@ class TTSProvider(TTSProviderBase):
                             opus_datas_cache.extend(opus_datas)
                     elif res.optional.event == EVENT_TTSSentenceEnd:
                         logger.bind(tag=TAG).info(f"句子语音生成成功：{self.tts_text}")
+                        # 直通Opus时输出句尾不足一帧的数据
+                        tail = self._flush_opus()
+                        if tail:
+                            if not is_first_sentence or first_sentence_segment_count > 10:
+                                opus_datas_cache.extend(tail)
+                            else:
+                                self.tts_audio_queue.put(
+                                    (SentenceType.MIDDLE, tail, None)
+                                )
                         if not is_first_sentence or first_sentence_segment_count > 10:
                             # 发送缓存的数据
                             self.tts_audio_queue.put(
@@ -490,8 +528,11 @@ class TTSProvider(TTSProviderBase):
                     )
                     traceback.print_exc()
                     break
-            # 仅在连接异常时才关闭
-            if not session_finished and self.ws:
+            # 会话正常结束时归还连接，连接异常时关闭
+            if session_finished and self.ws:
+                self._ws_pool().release(self.ws)
+                self.ws = None
+            elif self.ws:
                 try:
                     await self.ws.close()
                 except:
@@ -646,6 +687,16 @@ class TTSProvider(TTSProviderBase):
         opus_datas = self.opus_encoder.encode_pcm_to_opus(raw_data_var, is_end)
         return opus_datas
 
+    def _payload_to_opus(self, payload):
+        if self._opus_passthrough is not None:
+            return self._opus_passthrough.feed(payload)
+        return self.wav_to_opus_data_audio_raw(payload)
+
+    def _flush_opus(self):
+        if self._opus_passthrough is not None:
+            return self._opus_passthrough.flush()
+        return []
+
     def to_tts(self, text: str) -> list:
         """非流式生成音频数据，用于生成音频及测试场景
 
@@ -1,5 +1,4 @@
 import os
-import queue
 import asyncio
 import traceback
 import aiohttp
@@ -8,7 +7,7 @@ import time
 from config.logger import setup_logging
 from core.utils.tts import MarkdownCleaner
 from core.providers.tts.base import TTSProviderBase
-from core.utils import opus_encoder_utils, textUtils
+from core.utils import opus_encoder_utils
 from core.providers.tts.dto.dto import SentenceType, ContentType, InterfaceType
 
 TAG = __name__
@@ -41,45 +40,38 @@ class TTSProvider(TTSProviderBase):
     # linkerai单流式TTS重写父类的方法--开始
     ###################################################################################
 
-    def tts_text_priority_thread(self):
-        """流式文本处理线程"""
-        while not self.conn.stop_event.is_set():
-            try:
-                message = self.tts_text_queue.get(timeout=1)
-                if message.sentence_type == SentenceType.FIRST:
-                    # 初始化参数
-                    self.tts_stop_request = False
-                    self.processed_chars = 0
-                    self.tts_text_buff = []
-                    self.segment_count = 0
-                    self.before_stop_play_files.clear()
-                elif ContentType.TEXT == message.content_type:
-                    self.tts_text_buff.append(message.content_detail)
-                    segment_text = self._get_segment_text()
-                    if segment_text:
-                        self.to_tts_single_stream(segment_text)
-
-                elif ContentType.FILE == message.content_type:
-                    logger.bind(tag=TAG).info(
-                        f"添加音频文件到待播放列表: {message.content_file}"
+    def handle_tts_text_message(self, message):
+        """流式文本处理，每次处理队列中的一条消息"""
+        try:
+            if message.sentence_type == SentenceType.FIRST:
+                # 初始化参数
+                self.tts_stop_request = False
+                self.segmenter.reset()
+                self.segment_count = 0
+                self.before_stop_play_files.clear()
+            elif ContentType.TEXT == message.content_type:
+                for segment_text in self.segmenter.feed(message.content_detail):
+                    self.to_tts_single_stream(segment_text)
+
+            elif ContentType.FILE == message.content_type:
+                logger.bind(tag=TAG).info(
+                    f"添加音频文件到待播放列表: {message.content_file}"
+                )
+                if message.content_file and os.path.exists(message.content_file):
+                    # 先处理文件音频数据
+                    file_audio = self._process_audio_file(message.content_file)
+                    self.before_stop_play_files.append(
+                        (file_audio, message.content_detail)
                     )
-                    if message.content_file and os.path.exists(message.content_file):
-                        # 先处理文件音频数据
-                        file_audio = self._process_audio_file(message.content_file)
-                        self.before_stop_play_files.append(
-                            (file_audio, message.content_detail)
-                        )
 
-                if message.sentence_type == SentenceType.LAST:
-                    # 处理剩余的文本
-                    self._process_remaining_text(True)
+            if message.sentence_type == SentenceType.LAST:
+                # 处理剩余的文本
+                self._process_remaining_text(True)
 
-            except queue.Empty:
-                continue
-            except Exception as e:
-                logger.bind(tag=TAG).error(
-                    f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
-                )
+        except Exception as e:
+            logger.bind(tag=TAG).error(
+                f"处理TTS文本失败: {str(e)}, 类型: {type(e).__name__}, 堆栈: {traceback.format_exc()}"
+            )
 
     def _process_remaining_text(self, is_last=False):
         """处理剩余的文本并生成语音
@@ -87,15 +79,9 @@ class TTSProvider(TTSProviderBase):
         Returns:
             bool: 是否成功处理了文本
         """
-        full_text = "".join(self.tts_text_buff)
-        remaining_text = full_text[self.processed_chars :]
-        if remaining_text:
-            segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
-            if segment_text:
-                self.to_tts_single_stream(segment_text, is_last)
-                self.processed_chars += len(full_text)
-            else:
-                self._process_before_stop_play_files()
+        segment_text = self.segmenter.flush()
+        if segment_text:
+            self.to_tts_single_stream(segment_text, is_last)
         else:
             self._process_before_stop_play_files()
 
@@ -139,10 +125,12 @@ class TTSProvider(TTSProviderBase):
             self.opus_encoder.close()
 
     async def _tts_request(self, text: str, is_last: bool) -> None:
+        # 按设备协商的帧时长编码
+        self.stream_opus_encoder()
         params = {
             "tts_text": text,
             "spk_id": self.voice,
-            "frame_durition": 60,
+            "frame_durition": self.opus_encoder.frame_size_ms,
             "stream": "true",
             "target_sr": 16000,
             "audio_format": "pcm",
@@ -153,7 +141,7 @@ class TTSProvider(TTSProviderBase):
             "Content-Type": "application/json",
         }
 
-        # 一帧 PCM 所需字节数：60 ms &times; 16 kHz &times; 1 ch &times; 2 B = 1 920
+        # 一帧 PCM 所需字节数：帧时长 &times; 16 kHz &times; 1 ch &times; 2 B（60 ms 为 1 920）
         frame_bytes = int(
             self.opus_encoder.sample_rate
             * self.opus_encoder.channels  # 1
@@ -248,11 +236,12 @@ class TTSProvider(TTSProviderBase):
         """
         start_time = time.time()
         text = MarkdownCleaner.clean_markdown(text)
+        self.stream_opus_encoder()
 
         params = {
             "tts_text": text,
             "spk_id": self.voice,
-            "frame_duration": 60,
+            "frame_duration": self.opus_encoder.frame_size_ms,
             "stream": False,
             "target_sr": 16000,
             "audio_format": self.audio_format,
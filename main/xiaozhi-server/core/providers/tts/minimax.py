@@ -1,7 +1,7 @@
 import os
 import uuid
 import json
-import requests
+from core.utils.http_client import http_session
 from datetime import datetime
 from core.providers.tts.base import TTSProviderBase
 from core.utils.util import parse_string_to_list
@@ -75,7 +75,7 @@ class TTSProvider(TTSProviderBase):
             request_json["voice_setting"]["voice_id"] = ""
 
         try:
-            resp = requests.post(
+            resp = http_session(self.api_url).post(
                 self.api_url, json.dumps(request_json), headers=self.header
             )
             # 检查返回请求数据的status_code是否为0
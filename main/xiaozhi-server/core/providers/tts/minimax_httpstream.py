@@ -1,16 +1,19 @@
 import os
 import uuid
 import json
-import requests
+from core.utils.http_client import http_session
 from datetime import datetime
 from typing import Iterator, Optional, Union
 from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.dto.dto import InterfaceType
 from core.utils.util import parse_string_to_list
 
 
 class TTSProvider(TTSProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__(config, delete_audio_file)
+        # 边合成边播放
+        self.interface_type = InterfaceType.SINGLE_STREAM
         self.group_id = config.get("group_id")
         self.api_key = config.get("api_key")
         self.model = config.get("model")
@@ -53,7 +56,8 @@ class TTSProvider(TTSProviderBase):
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}",
         }
-        self.audio_file_type = defult_audio_setting.get("format", "mp3")
+        self.audio_file_type = self.audio_setting.get("format", "mp3")
+        self.stream_sample_rate = int(self.audio_setting.get("sample_rate", 32000))
 
     def generate_filename(self, extension=".mp3"):
         return os.path.join(
@@ -77,7 +81,7 @@ class TTSProvider(TTSProviderBase):
             request_json["voice_setting"]["voice_id"] = ""
 
         try:
-            resp = requests.post(
+            resp = http_session(self.api_url).post(
                 self.api_url, json.dumps(request_json), headers=self.header
             )
             if resp.json()["base_resp"]["status_code"] == 0:
@@ -95,6 +99,10 @@ class TTSProvider(TTSProviderBase):
         except Exception as e:
             raise Exception(f"{__name__} error: {e}")
 
+    async def text_to_audio_stream(self, text):
+        for audio_chunk in self.text_to_speak_stream(text):
+            yield audio_chunk
+
     def text_to_speak_stream(
         self, 
         text: str, 
@@ -120,7 +128,7 @@ class TTSProvider(TTSProviderBase):
             request_json["voice_setting"]["voice_id"] = ""
 
         try:
-            with requests.post(
+            with http_session(self.api_url).post(
                 self.api_url,
                 data=json.dumps(request_json),
                 headers=self.header,
@@ -1,6 +1,7 @@
-import requests
+from core.utils.http_client import http_session
 from core.utils.util import check_model_key
 from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.dto.dto import InterfaceType
 from config.logger import setup_logging
 
 TAG = __name__
@@ -10,6 +11,8 @@ logger = setup_logging()
 class TTSProvider(TTSProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__(config, delete_audio_file)
+        # 边合成边播放
+        self.interface_type = InterfaceType.SINGLE_STREAM
         self.api_key = config.get("api_key")
         self.api_url = config.get("api_url", "https://api.openai.com/v1/audio/speech")
         self.model = config.get("model", "tts-1")
@@ -38,10 +41,10 @@ class TTSProvider(TTSProviderBase):
             "model": self.model,
             "input": text,
             "voice": self.voice,
-            "response_format": "wav",
+            "response_format": self.response_format,
             "speed": self.speed,
         }
-        response = requests.post(self.api_url, json=data, headers=headers)
+        response = http_session(self.api_url).post(self.api_url, json=data, headers=headers)
         if response.status_code == 200:
             if output_file:
                 with open(output_file, "wb") as audio_file:
@@ -52,3 +55,26 @@ class TTSProvider(TTSProviderBase):
             raise Exception(
                 f"OpenAI TTS请求失败: {response.status_code} - {response.text}"
             )
+
+    async def text_to_audio_stream(self, text):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        data = {
+            "model": self.model,
+            "input": text,
+            "voice": self.voice,
+            "response_format": self.response_format,
+            "speed": self.speed,
+        }
+        with http_session(self.api_url).post(
+            self.api_url, json=data, headers=headers, stream=True, timeout=30
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(
+                    f"OpenAI TTS请求失败: {response.status_code} - {response.text}"
+                )
+            for chunk in response.iter_content(chunk_size=4096):
+                if chunk:
+                    yield chunk
@@ -4,7 +4,7 @@ import time
 import uuid
 import json
 import base64
-import requests
+from core.utils.http_client import http_session
 from datetime import datetime, timezone
 from core.providers.tts.base import TTSProviderBase
 
@@ -134,7 +134,7 @@ class TTSProvider(TTSProviderBase):
             headers = self._get_auth_headers(request_json)
 
             # 发送请求
-            resp = requests.post(
+            resp = http_session(self.api_url).post(
                 self.api_url, json.dumps(request_json), headers=headers
             )
 
@@ -1,7 +1,7 @@
 import os
 import uuid
 import json
-import requests
+from core.utils.http_client import http_session
 import shutil
 from datetime import datetime
 from core.providers.tts.base import TTSProviderBase
@@ -57,7 +57,7 @@ class TTSProvider(TTSProviderBase):
             }
         )
 
-        resp = requests.request("POST", url, data=payload)
+        resp = http_session(url).request("POST", url, data=payload)
         if resp.status_code != 200:
             logger.bind(tag=TAG).error(f"TTSON 请求失败: {resp.text}")
             raise Exception(f"{__name__}: TTS请求失败")
@@ -73,7 +73,7 @@ class TTSProvider(TTSProviderBase):
                 + resp_json["voice_path"]
             )
 
-            audio_content = requests.get(result)
+            audio_content = http_session(result).get(result)
             if output_file:
                 with open(output_file, "wb") as f:
                     f.write(audio_content.content)
@@ -4,6 +4,10 @@ from typing import Optional
 
 class VADProviderBase(ABC):
     @abstractmethod
-    def is_vad(self, conn, data) -> bool:
+    async def is_vad(self, conn, data) -> bool:
         """检测音频数据中的语音活动"""
         pass
+
+    def shutdown(self):
+        """释放模型占用的线程等资源，模型从共享注册表中卸载时调用"""
+        pass
@@ -0,0 +1,244 @@
+"""
+VAD批量推理引擎
+汇总所有连接待处理的32ms音频块，定期合并为一次批量前向推理
+"""
+
+import time
+import asyncio
+import weakref
+import numpy as np
+from abc import abstractmethod
+from typing import Callable, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from config.logger import setup_logging
+from core.providers.vad.base import VADProviderBase
+
+TAG = __name__
+logger = setup_logging()
+
+# Silero模型在16kHz下的输入参数
+CHUNK_SAMPLES = 512
+CONTEXT_SAMPLES = 64
+STATE_SHAPE = (2, 1, 128)
+
+
+class VADSession:
+    """单个连接的VAD推理状态（RNN状态和上下文）"""
+
+    __slots__ = ("state", "context")
+
+    def __init__(self):
+        self.state = np.zeros(STATE_SHAPE, dtype=np.float32)
+        self.context = np.zeros(CONTEXT_SAMPLES, dtype=np.float32)
+
+    def reset(self):
+        """重置模型状态"""
+        self.state.fill(0)
+        self.context.fill(0)
+
+
+class VADBatchEngine:
+    """跨连接的VAD批量推理引擎
+
+    forward 接收 [B, CONTEXT_SAMPLES + CHUNK_SAMPLES] 的音频和 [2, B, 128] 的状态，
+    返回 ([B] 的语音概率, 新状态)。推理在独立线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        forward: Callable[[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]],
+        batch_interval_ms: float = 5,
+        max_batch_size: int = 128,
+    ):
+        self._forward = forward
+        self.batch_interval = max(batch_interval_ms, 0) / 1000
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self._pending = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="vad-batch"
+        )
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    async def infer(self, session: VADSession, chunks: np.ndarray) -> np.ndarray:
+        """提交一个连接的若干音频块，等待批量推理返回每块的语音概率
+
+        Args:
+            session: 连接的VAD状态
+            chunks: [N, CHUNK_SAMPLES] 的float32音频块，按时间顺序排列
+
+        Returns:
+            np.ndarray: [N] 的语音概率
+        """
+        loop = asyncio.get_running_loop()
+        self._ensure_started(loop)
+        future = loop.create_future()
+        self._pending.append((session, chunks, future))
+        self._wakeup.set()
+        return await future
+
+    def shutdown(self):
+        """停止调度任务和推理线程，模型被卸载时调用"""
+        if self._task is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        self._task = None
+        self._executor.shutdown(wait=False)
+
+    def _ensure_started(self, loop):
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        """批量调度循环：有请求到达后等待一个批处理窗口，再统一推理"""
+        while True:
+            await self._wakeup.wait()
+            if self.batch_interval > 0:
+                await asyncio.sleep(self.batch_interval)
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            if not batch:
+                continue
+            try:
+                results = await self._loop.run_in_executor(
+                    self._executor, self._infer_batch, batch
+                )
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"VAD批量推理失败: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), probs in zip(batch, results):
+                if not future.done():
+                    future.set_result(probs)
+
+    def _infer_batch(self, batch) -> List[np.ndarray]:
+        """按时间步推理：同一连接的音频块必须串行，不同连接的同一时间步合并为一批"""
+        results = [np.empty(len(chunks), dtype=np.float32) for _, chunks, _ in batch]
+        max_steps = max(len(chunks) for _, chunks, _ in batch)
+        for step in range(max_steps):
+            rows = [i for i, (_, chunks, _) in enumerate(batch) if len(chunks) > step]
+            for start in range(0, len(rows), self.max_batch_size):
+                sub_rows = rows[start : start + self.max_batch_size]
+                sessions = [batch[i][0] for i in sub_rows]
+                x = np.empty(
+                    (len(sub_rows), CONTEXT_SAMPLES + CHUNK_SAMPLES), dtype=np.float32
+                )
+                for j, i in enumerate(sub_rows):
+                    x[j, :CONTEXT_SAMPLES] = sessions[j].context
+                    x[j, CONTEXT_SAMPLES:] = batch[i][1][step]
+                state = np.concatenate([s.state for s in sessions], axis=1)
+
+                probs, new_state = self._forward(x, state)
+
+                for j, i in enumerate(sub_rows):
+                    sessions[j].state = np.ascontiguousarray(new_state[:, j : j + 1, :])
+                    sessions[j].context = x[j, -CONTEXT_SAMPLES:].copy()
+                    results[i][step] = probs[j]
+        return results
+
+
+class BatchVADProviderBase(VADProviderBase):
+    """基于批量推理引擎的Silero VAD基类，子类只需实现 _forward"""
+
+    def __init__(self, config):
+        # 处理空字符串的情况
+        threshold = config.get("threshold", "0.5")
+        threshold_low = config.get("threshold_low", "0.2")
+        min_silence_duration_ms = config.get("min_silence_duration_ms", "1000")
+        batch_interval_ms = config.get("batch_interval_ms", "5")
+        max_batch_size = config.get("max_batch_size", "128")
+
+        self.vad_threshold = float(threshold) if threshold else 0.5
+        self.vad_threshold_low = float(threshold_low) if threshold_low else 0.2
+
+        self.silence_threshold_ms = (
+            int(min_silence_duration_ms) if min_silence_duration_ms else 1000
+        )
+
+        # 至少要多少帧才算有语音
+        self.frame_window_threshold = 3
+
+        # 所有连接共享一个批量推理引擎，每个连接单独保存RNN状态
+        self.engine = VADBatchEngine(
+            self._forward,
+            batch_interval_ms=float(batch_interval_ms) if batch_interval_ms else 5,
+            max_batch_size=int(max_batch_size) if max_batch_size else 128,
+        )
+        self.sessions = weakref.WeakKeyDictionary()
+
+    @abstractmethod
+    def _forward(
+        self, x: np.ndarray, state: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """批量前向推理，x已包含上下文，状态显式传入传出"""
+        pass
+
+    def shutdown(self):
+        self.engine.shutdown()
+
+    def _get_session(self, conn) -> VADSession:
+        session = self.sessions.get(conn)
+        if session is None:
+            session = VADSession()
+            self.sessions[conn] = session
+        return session
+
+    async def is_vad(self, conn, opus_packet):
+        # 音频已由连接在接收时解码并写入audio_buffer，这里只读取新增的PCM
+        try:
+            session = self._get_session(conn)
+            # 一次取出缓冲区中所有完整帧（每帧512采样点），整体提交给批量引擎
+            client_have_voice = False
+            start = max(conn.vad_read_pos, conn.audio_buffer.start_pos)
+            chunk_count = (conn.audio_buffer.write_pos - start) // CHUNK_SAMPLES
+            if chunk_count == 0:
+                return client_have_voice
+            end = start + chunk_count * CHUNK_SAMPLES
+            conn.vad_read_pos = end
+            audio_int16 = conn.audio_buffer.view(start, end)
+            chunks = (audio_int16.astype(np.float32) / 32768.0).reshape(
+                chunk_count, CHUNK_SAMPLES
+            )
+
+            speech_probs = await self.engine.infer(session, chunks)
+
+            for speech_prob in speech_probs:
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+
+            return client_have_voice
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
+
+    def _update_voice_state(self, conn, speech_prob) -> bool:
+        """根据单帧语音概率更新连接的语音状态，返回当前是否有语音"""
+        # 双阈值判断
+        if speech_prob >= self.vad_threshold:
+            is_voice = True
+        elif speech_prob <= self.vad_threshold_low:
+            is_voice = False
+        else:
+            is_voice = conn.last_is_voice
+
+        # 声音没低于最低值则延续前一个状态，判断为有声音
+        conn.last_is_voice = is_voice
+
+        # 更新滑动窗口
+        conn.client_voice_window.append(is_voice)
+        client_have_voice = (
+            conn.client_voice_window.count(True) >= self.frame_window_threshold
+        )
+
+        # 如果之前有声音，但本次没有声音，且与上次有声音的时间差已经超过了静默阈值，则认为已经说完一句话
+        if conn.client_have_voice and not client_have_voice:
+            stop_duration = time.time() * 1000 - conn.last_activity_time
+            if stop_duration >= self.silence_threshold_ms:
+                conn.client_voice_stop = True
+        if client_have_voice:
+            conn.client_have_voice = True
+            conn.last_activity_time = time.time() * 1000
+        return client_have_voice
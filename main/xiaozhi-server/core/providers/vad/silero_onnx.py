@@ -0,0 +1,43 @@
+import os
+import numpy as np
+import onnxruntime
+from config.logger import setup_logging
+from core.providers.vad.batch_engine import BatchVADProviderBase
+
+TAG = __name__
+logger = setup_logging()
+
+
+class VADProvider(BatchVADProviderBase):
+    """使用onnxruntime在CPU上运行Silero VAD，不依赖torch"""
+
+    def __init__(self, config):
+        logger.bind(tag=TAG).info("SileroOnnxVAD", config)
+        model_path = config.get("model_path")
+        if not model_path:
+            model_path = os.path.join(
+                config.get("model_dir", "models/snakers4_silero-vad"),
+                "src",
+                "silero_vad",
+                "data",
+                "silero_vad.onnx",
+            )
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"Silero ONNX模型文件不存在: {model_path}")
+
+        num_threads = config.get("num_threads", "1")
+        opts = onnxruntime.SessionOptions()
+        opts.inter_op_num_threads = 1
+        opts.intra_op_num_threads = int(num_threads) if num_threads else 1
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self.sample_rate = np.array(16000, dtype=np.int64)
+        super().__init__(config)
+
+    def _forward(self, x, state):
+        """批量前向推理，h/c状态以 [2, B, 128] 张量显式传入传出"""
+        out, new_state = self.session.run(
+            None, {"input": x, "state": state, "sr": self.sample_rate}
+        )
+        return out.reshape(-1), new_state
@@ -0,0 +1,250 @@
+"""
+阿里云智能语音Token缓存
+阿里云ASR/TTS使用AccessKey换取的临时Token鉴权。Token由进程内所有提供者实例共享，
+按AccessKey缓存，到期前在后台刷新，新建提供者（每个设备连接一次）时不再请求nls-meta服务
+"""
+
+import time
+import uuid
+import hmac
+import base64
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from urllib import parse
+
+from config.logger import setup_logging
+from core.utils.http_client import http_session
+
+TAG = __name__
+logger = setup_logging()
+
+META_URL = "http://nls-meta.cn-shanghai.aliyuncs.com/"
+# 过期前多久开始后台刷新（秒）
+REFRESH_AHEAD = 600
+# 后台刷新失败后的重试间隔（秒）
+RETRY_INTERVAL = 30
+# 超过该时长（秒）没有提供者使用的Token不再刷新
+IDLE_TTL = 86400
+# Token过期前预留的安全时间（秒），与提供者原有的判断保持一致
+EXPIRE_MARGIN = 60
+
+
+class AccessToken:
+    @staticmethod
+    def _encode_text(text):
+        encoded_text = parse.quote_plus(text)
+        return encoded_text.replace("+", "%20").replace("*", "%2A").replace("%7E", "~")
+
+    @staticmethod
+    def _encode_dict(dic):
+        keys = dic.keys()
+        dic_sorted = [(key, dic[key]) for key in sorted(keys)]
+        encoded_text = parse.urlencode(dic_sorted)
+        return encoded_text.replace("+", "%20").replace("*", "%2A").replace("%7E", "~")
+
+    @staticmethod
+    def create_token(access_key_id, access_key_secret):
+        parameters = {
+            "AccessKeyId": access_key_id,
+            "Action": "CreateToken",
+            "Format": "JSON",
+            "RegionId": "cn-shanghai",
+            "SignatureMethod": "HMAC-SHA1",
+            "SignatureNonce": str(uuid.uuid1()),
+            "SignatureVersion": "1.0",
+            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "Version": "2019-02-28",
+        }
+        # 构造规范化的请求字符串
+        query_string = AccessToken._encode_dict(parameters)
+        # 构造待签名字符串
+        string_to_sign = (
+            "GET"
+            + "&"
+            + AccessToken._encode_text("/")
+            + "&"
+            + AccessToken._encode_text(query_string)
+        )
+        # 计算签名
+        secreted_string = hmac.new(
+            bytes(access_key_secret + "&", encoding="utf-8"),
+            bytes(string_to_sign, encoding="utf-8"),
+            hashlib.sha1,
+        ).digest()
+        signature = base64.b64encode(secreted_string)
+        # 进行URL编码
+        signature = AccessToken._encode_text(signature)
+        full_url = "%s?Signature=%s&%s" % (META_URL, signature, query_string)
+        # 提交HTTP GET请求
+        response = http_session(META_URL).get(full_url, timeout=10)
+        if response.ok:
+            root_obj = response.json()
+            key = "Token"
+            if key in root_obj:
+                token = root_obj[key]["Id"]
+                expire_time = root_obj[key]["ExpireTime"]
+                return token, expire_time
+        return None, None
+
+
+def parse_expire_time(expire_time_str) -> float:
+    """把接口返回的ExpireTime（时间戳或ISO格式）转换为时间戳"""
+    expire_str = str(expire_time_str).strip()
+    try:
+        if expire_str.isdigit():
+            return float(int(expire_str))
+        return datetime.strptime(expire_str, "%Y-%m-%dT%H:%M:%SZ").timestamp()
+    except Exception as e:
+        raise ValueError(f"无效的过期时间格式: {expire_str}") from e
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.token = None
+        self.expire_at = 0.0
+        self.last_used = time.monotonic()
+        self.timer: Optional[threading.Timer] = None
+
+
+class AliyunTokenCache:
+    """按AccessKey缓存Token，线程安全"""
+
+    def __init__(
+        self,
+        refresh_ahead: float = REFRESH_AHEAD,
+        retry_interval: float = RETRY_INTERVAL,
+        idle_ttl: float = IDLE_TTL,
+    ):
+        self.refresh_ahead = refresh_ahead
+        self.retry_interval = retry_interval
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self.fetches = 0
+
+    def get(self, access_key_id: str, access_key_secret: str) -> Tuple[str, float]:
+        """返回 (Token, 过期时间戳)，过期时间已扣除安全时间
+
+        缓存有效时不访问网络；缓存缺失时同一AccessKey只请求一次，其余调用等待结果
+        """
+        entry = self._entry(access_key_id, access_key_secret)
+        entry.last_used = time.monotonic()
+        if self._valid(entry):
+            return entry.token, entry.expire_at
+        with entry.lock:
+            if not self._valid(entry):
+                self._fetch(access_key_id, access_key_secret, entry)
+            return entry.token, entry.expire_at
+
+    def prefetch(self, access_key_id: str, access_key_secret: str):
+        """在后台线程获取Token，不阻塞调用方，用于提供者初始化时提前准备"""
+        entry = self._entry(access_key_id, access_key_secret)
+        entry.last_used = time.monotonic()
+        if self._valid(entry):
+            return
+
+        def fetch():
+            try:
+                self.get(access_key_id, access_key_secret)
+            except Exception as e:
+                logger.bind(tag=TAG).warning(f"预取阿里云Token失败: {e}")
+
+        threading.Thread(target=fetch, daemon=True).start()
+
+    def invalidate(self, access_key_id: str, access_key_secret: str, token: str = None):
+        """服务端拒绝Token（例如401）时作废缓存，指定token时只在缓存的仍是该Token时作废"""
+        with self._lock:
+            entry = self._entries.get((access_key_id, access_key_secret))
+        if entry is None:
+            return
+        with entry.lock:
+            if token is None or entry.token == token:
+                entry.token = None
+                entry.expire_at = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._entries)
+        return {"cached": cached, "fetches": self.fetches}
+
+    def _entry(self, access_key_id: str, access_key_secret: str) -> _Entry:
+        key = (access_key_id, access_key_secret)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    @staticmethod
+    def _valid(entry: _Entry) -> bool:
+        return entry.token is not None and time.time() < entry.expire_at
+
+    def _fetch(self, access_key_id: str, access_key_secret: str, entry: _Entry):
+        """需持有entry.lock"""
+        token, expire_time_str = AccessToken.create_token(
+            access_key_id, access_key_secret
+        )
+        self.fetches += 1
+        if not token:
+            raise ValueError("无法获取有效的访问Token")
+        if not expire_time_str:
+            raise ValueError("无法获取有效的Token过期时间")
+        entry.token = token
+        entry.expire_at = parse_expire_time(expire_time_str) - EXPIRE_MARGIN
+        logger.bind(tag=TAG).debug(
+            f"阿里云Token已更新，过期时间: {datetime.fromtimestamp(entry.expire_at)}"
+        )
+        self._schedule(
+            access_key_id,
+            access_key_secret,
+            entry,
+            entry.expire_at - time.time() - self.refresh_ahead,
+        )
+
+    def _schedule(
+        self, access_key_id: str, access_key_secret: str, entry: _Entry, delay: float
+    ):
+        if entry.timer is not None:
+            entry.timer.cancel()
+        entry.timer = threading.Timer(
+            max(delay, self.retry_interval),
+            self._refresh,
+            args=(access_key_id, access_key_secret, entry),
+        )
+        entry.timer.daemon = True
+        entry.timer.start()
+
+    def _refresh(self, access_key_id: str, access_key_secret: str, entry: _Entry):
+        """到期前的后台刷新，长时间无人使用的Token直接丢弃"""
+        key = (access_key_id, access_key_secret)
+        if time.monotonic() - entry.last_used > self.idle_ttl:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._entries.pop(key)
+            return
+        with entry.lock:
+            try:
+                self._fetch(access_key_id, access_key_secret, entry)
+            except Exception as e:
+                logger.bind(tag=TAG).warning(
+                    f"后台刷新阿里云Token失败，{self.retry_interval}秒后重试: {e}"
+                )
+                self._schedule(
+                    access_key_id, access_key_secret, entry, self.retry_interval
+                )
+
+
+_aliyun_token_cache = None
+_aliyun_token_cache_lock = threading.Lock()
+
+
+def get_aliyun_token_cache() -> AliyunTokenCache:
+    """获取全局阿里云Token缓存"""
+    global _aliyun_token_cache
+    with _aliyun_token_cache_lock:
+        if _aliyun_token_cache is None:
+            _aliyun_token_cache = AliyunTokenCache()
+        return _aliyun_token_cache
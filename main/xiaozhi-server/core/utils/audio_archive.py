@@ -0,0 +1,92 @@
+"""
+音频归档
+识别用的音频只在内存中流转，需要留存时交给后台线程批量写入WAV文件，不阻塞识别
+"""
+
+import os
+import queue
+import wave
+import threading
+from typing import List, Union
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+
+class AudioArchiveSink:
+    """后台批量写入WAV文件
+
+    submit 只把数据放入队列立即返回；写入线程每次取出一批统一落盘。
+    队列满时丢弃新数据并记录日志，归档不能反过来拖慢识别。
+    """
+
+    def __init__(
+        self, max_batch: int = 32, flush_interval: float = 1.0, max_queue: int = 1000
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._dropped = 0
+        self._thread = threading.Thread(
+            target=self._writer_loop, name="audio-archive", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        file_path: str,
+        pcm_data: Union[bytes, List[bytes]],
+        sample_rate: int = 16000,
+    ) -> bool:
+        """提交一段16位单声道PCM，返回是否成功入队"""
+        if isinstance(pcm_data, (list, tuple)):
+            pcm_data = b"".join(pcm_data)
+        try:
+            self._queue.put_nowait((file_path, bytes(pcm_data), sample_rate))
+            return True
+        except queue.Full:
+            self._dropped += 1
+            logger.bind(tag=TAG).warning(
+                f"音频归档队列已满，丢弃: {file_path}，累计丢弃{self._dropped}个"
+            )
+            return False
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        created_dirs = set()
+        for file_path, pcm_data, sample_rate in batch:
+            try:
+                directory = os.path.dirname(file_path)
+                if directory and directory not in created_dirs:
+                    os.makedirs(directory, exist_ok=True)
+                    created_dirs.add(directory)
+                with wave.open(file_path, "wb") as wf:
+                    wf.setnchannels(1)
+                    wf.setsampwidth(2)  # 2 bytes = 16-bit
+                    wf.setframerate(sample_rate)
+                    wf.writeframes(pcm_data)
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"音频归档写入失败: {file_path}, {e}")
+
+
+_audio_archive = None
+_audio_archive_lock = threading.Lock()
+
+
+def get_audio_archive() -> AudioArchiveSink:
+    """获取全局音频归档器，首次使用时创建"""
+    global _audio_archive
+    with _audio_archive_lock:
+        if _audio_archive is None:
+            _audio_archive = AudioArchiveSink()
+        return _audio_archive
@@ -0,0 +1,134 @@
+"""
+静态音频资源缓存
+提示音、绑定码数字、唤醒词回复等固定音频只转码一次，之后直接从内存取出Opus帧，
+不再每次播放都启动ffmpeg。文件修改时间或大小变化时自动重新转码
+"""
+
+import os
+import threading
+from typing import List, Tuple
+from config.logger import setup_logging
+from core.utils import p3
+from core.utils.util import audio_to_data
+from core.utils.opus_codec import DEFAULT_AUDIO_PARAMS, AudioParams
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_ASSETS_DIR = "config/assets"
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".p3", ".opus", ".ogg", ".m4a", ".flac")
+
+
+class AudioAssetRegistry:
+    """按文件路径缓存转码后的音频帧，键为 (绝对路径, 是否Opus, 音频参数)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (mtime_ns, size, frames, duration)
+        self._entries = {}
+
+    def get(
+        self,
+        file_path: str,
+        is_opus: bool = True,
+        audio_params: AudioParams = DEFAULT_AUDIO_PARAMS,
+    ) -> Tuple[List[bytes], float]:
+        """返回音频帧和时长，未缓存或文件已变化时重新转码"""
+        key = (os.path.abspath(file_path), is_opus, audio_params)
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            raise
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return list(entry[2]), entry[3]
+
+        if file_path.endswith(".p3") and is_opus and audio_params.is_default:
+            frames, duration = p3.decode_opus_from_file(file_path)
+        else:
+            frames, duration = audio_to_data(
+                file_path, is_opus=is_opus, audio_params=audio_params
+            )
+        with self._lock:
+            self._entries[key] = (stat.st_mtime_ns, stat.st_size, frames, duration)
+        return list(frames), duration
+
+    def put(
+        self,
+        file_path: str,
+        frames: List[bytes],
+        duration: float = None,
+        is_opus: bool = True,
+        audio_params: AudioParams = DEFAULT_AUDIO_PARAMS,
+    ):
+        """登记刚写入文件的音频帧，例如生成的唤醒词回复，首次播放也无需转码"""
+        stat = os.stat(file_path)
+        if duration is None:
+            duration = len(frames) * audio_params.frame_duration / 1000
+        with self._lock:
+            self._entries[(os.path.abspath(file_path), is_opus, audio_params)] = (
+                stat.st_mtime_ns,
+                stat.st_size,
+                list(frames),
+                duration,
+            )
+
+    def preload(self, directory: str = DEFAULT_ASSETS_DIR) -> int:
+        """转码目录下的全部音频文件，返回成功的数量"""
+        count = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if not name.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                try:
+                    self.get(os.path.join(root, name))
+                    count += 1
+                except Exception as e:
+                    logger.bind(tag=TAG).warning(f"预加载音频失败: {name}, {e}")
+        return count
+
+
+_audio_assets = AudioAssetRegistry()
+
+
+def get_audio_assets() -> AudioAssetRegistry:
+    """获取全局静态音频缓存"""
+    return _audio_assets
+
+
+def load_audio_asset(
+    file_path: str,
+    is_opus: bool = True,
+    audio_params: AudioParams = DEFAULT_AUDIO_PARAMS,
+) -> Tuple[List[bytes], float]:
+    """读取静态音频，接口与 audio_to_data 一致"""
+    return _audio_assets.get(file_path, is_opus=is_opus, audio_params=audio_params)
+
+
+def preload_audio_assets(config: dict = None):
+    """在后台线程中预加载静态音频，不阻塞服务启动"""
+    extra_files = []
+    if config and config.get("enable_stop_tts_notify", False):
+        extra_files.append(
+            config.get("stop_tts_notify_voice", "config/assets/tts_notify.mp3")
+        )
+
+    assets_dir = os.path.abspath(DEFAULT_ASSETS_DIR)
+
+    def _preload():
+        count = _audio_assets.preload(DEFAULT_ASSETS_DIR)
+        for file_path in extra_files:
+            if os.path.abspath(file_path).startswith(assets_dir):
+                continue
+            try:
+                _audio_assets.get(file_path)
+                count += 1
+            except Exception as e:
+                logger.bind(tag=TAG).warning(f"预加载音频失败: {file_path}, {e}")
+        logger.bind(tag=TAG).info(f"静态音频预加载完成，共{count}个文件")
+
+    threading.Thread(target=_preload, name="audio-assets-preload", daemon=True).start()
@@ -0,0 +1,345 @@
+"""
+音频解码层
+TTS每句话的音频都要转成16kHz单声道16位PCM再编码。wav和pcm在进程内用numpy解析和重采样，
+mp3等压缩格式交给预先启动的ffmpeg进程解码，启动进程的开销不再落在每句话的关键路径上
+"""
+
+import io
+import time
+import wave
+import atexit
+import threading
+import subprocess
+from collections import deque
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.logger import setup_logging
+from core.utils.opus_codec import SAMPLE_RATE, CHANNELS
+
+TAG = __name__
+logger = setup_logging()
+
+# 每种ffmpeg命令保持的预启动进程数
+DEFAULT_POOL_SIZE = 2
+# 超过该时长（秒）没有使用的命令不再保持预启动进程
+DEFAULT_IDLE_TTL = 300
+# 单次解码的超时时间（秒）
+DECODE_TIMEOUT = 60
+# 重采样低通滤波器的半长度（采样点）
+RESAMPLE_HALF_TAPS = 32
+# 服务商的音频格式参数与ffmpeg输入格式名称不一致的映射
+FFMPEG_INPUT_FORMATS = {"opus": "ogg", "ogg_opus": "ogg", "webm": "matroska"}
+
+
+def sniff_audio_format(data: bytes, hint: Optional[str] = None) -> Optional[str]:
+    """根据文件头判断音频格式，识别不出时返回hint"""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if head[:3] == b"ID3":
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # ADTS的layer位为0，MPEG音频的layer位不为0
+        return "aac" if head[1] & 0x06 == 0 else "mp3"
+    return hint
+
+
+def ffmpeg_input_format(audio_format: str) -> str:
+    """音频格式对应的ffmpeg输入格式名称"""
+    return FFMPEG_INPUT_FORMATS.get(audio_format, audio_format)
+
+
+def _lowpass_taps(src_rate: int, dst_rate: int) -> np.ndarray:
+    """降采样用的加窗sinc低通，截止频率略低于目标奈奎斯特频率"""
+    cutoff = 0.5 * dst_rate / src_rate * 0.9
+    n = np.arange(-RESAMPLE_HALF_TAPS, RESAMPLE_HALF_TAPS + 1)
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(len(n))
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def resample_pcm16(samples: np.ndarray, src_rate: int, dst_rate: int = SAMPLE_RATE):
+    """16位单声道采样重采样，降采样前先做低通滤波避免混叠"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples.astype("<i2", copy=False)
+    x = samples.astype(np.float32)
+    if src_rate > dst_rate:
+        x = np.convolve(x, _lowpass_taps(src_rate, dst_rate), mode="same")
+    out_len = int(round(len(x) * dst_rate / src_rate))
+    positions = np.arange(out_len, dtype=np.float64) * (src_rate / dst_rate)
+    y = np.interp(positions, np.arange(len(x)), x)
+    return np.clip(np.round(y), -32768, 32767).astype("<i2")
+
+
+def pcm16_to_target(
+    pcm,
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    target_rate: int = SAMPLE_RATE,
+) -> bytes:
+    """16位小端PCM转为目标采样率的单声道，格式已经匹配时不复制"""
+    if sample_rate == target_rate and channels == CHANNELS:
+        return pcm if isinstance(pcm, bytes) else bytes(pcm)
+    usable = len(pcm) - len(pcm) % (2 * channels)
+    samples = np.frombuffer(pcm, dtype="<i2", count=usable // 2)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return resample_pcm16(samples, sample_rate, target_rate).tobytes()
+
+
+class PCMResampler:
+    """16位单声道PCM的流式重采样，按包输入时保持和整段重采样一致的结果
+
+    逐包调用 resample_pcm16 时每个包两端都按零填充滤波，插值位置也从包头重新开始，
+    包边界处会产生毛刺和相位跳变。这里保留滤波器需要的历史采样和下一个输出点的位置，
+    输出相对输入延迟 RESAMPLE_HALF_TAPS 个采样点
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int = SAMPLE_RATE):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self._taps = _lowpass_taps(src_rate, dst_rate) if src_rate > dst_rate else None
+        half_taps = RESAMPLE_HALF_TAPS if self._taps is not None else 0
+        # 滤波输出第0点对应输入第0点，开头补半个滤波器长度的零
+        self._history = np.zeros(half_taps, dtype=np.float32)
+        # 已经得到的滤波后采样数和最后一个滤波后采样，插值跨包时使用
+        self._filtered = 0
+        self._last = None
+        # 已经输出的采样数，第m个输出点位于滤波后序列的 m * src_rate / dst_rate 处
+        self._emitted = 0
+
+    def process(self, pcm) -> bytes:
+        """输入一段16位小端PCM，返回目前可以确定的重采样结果"""
+        if self.src_rate == self.dst_rate:
+            return pcm if isinstance(pcm, bytes) else bytes(pcm)
+        samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+        x = samples.astype(np.float32)
+        if self._taps is not None:
+            x = np.concatenate((self._history, x))
+            keep = len(self._taps) - 1
+            if len(x) <= keep:
+                self._history = x
+                return b""
+            self._history = x[-keep:]
+            x = np.convolve(x, self._taps, mode="valid")
+        if len(x) == 0:
+            return b""
+
+        # 把上一包最后一个采样接在前面，跨包的输出点也能插值
+        start = self._filtered
+        if self._last is not None:
+            x = np.concatenate(([self._last], x))
+            start -= 1
+        self._filtered += len(x) - (self._last is not None)
+        self._last = x[-1]
+
+        # 落在已有采样范围内的输出点
+        end = (self._filtered - 1) * self.dst_rate // self.src_rate + 1
+        if end <= self._emitted:
+            return b""
+        indices = np.arange(self._emitted, end, dtype=np.float64)
+        self._emitted = end
+        positions = indices * self.src_rate / self.dst_rate - start
+        y = np.interp(positions, np.arange(len(x)), x)
+        return np.clip(np.round(y), -32768, 32767).astype("<i2").tobytes()
+
+
+def _decode_wav(data: bytes, target_rate: int = SAMPLE_RATE) -> Optional[bytes]:
+    """进程内解析16位PCM的wav，其他编码返回None交给ffmpeg"""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            if wav.getsampwidth() != 2:
+                return None
+            channels = wav.getnchannels()
+            sample_rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        # 非PCM编码（如浮点、A-law）或头部不完整
+        return None
+    return pcm16_to_target(frames, sample_rate, channels, target_rate)
+
+
+class FFmpegProcessPool:
+    """按命令缓存预先启动的ffmpeg进程
+
+    空闲进程阻塞在读取stdin上，不占用CPU。取用后在后台补充新的进程，
+    取用方负责写入数据、读取输出并等待进程结束
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.size = max(int(size), 0)
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, ...], deque] = {}
+        self._last_used: Dict[Tuple[str, ...], float] = {}
+        self._closed = False
+        self.spawned = 0
+        self.warm_hits = 0
+
+    def acquire(self, command: Sequence[str]) -> subprocess.Popen:
+        """取出一个已启动的进程，没有时当场启动"""
+        key = tuple(command)
+        now = time.monotonic()
+        process = None
+        with self._lock:
+            self._last_used[key] = now
+            idle = self._idle.get(key)
+            while idle:
+                candidate = idle.popleft()
+                if candidate.poll() is None:
+                    process = candidate
+                    self.warm_hits += 1
+                    break
+        if process is None:
+            process = self._spawn(key)
+        self._reap(now)
+        if self.size:
+            threading.Thread(target=self._refill, args=(key,), daemon=True).start()
+        return process
+
+    def decode(self, data: bytes, command: Sequence[str]) -> bytes:
+        """把完整的音频数据交给ffmpeg，返回stdout的全部输出"""
+        process = self.acquire(command)
+        try:
+            stdout, stderr = process.communicate(data, timeout=DECODE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise RuntimeError("ffmpeg解码超时")
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"ffmpeg解码失败: {stderr.decode('utf-8', 'ignore').strip()}"
+            )
+        return stdout
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = sum(len(processes) for processes in self._idle.values())
+        return {"idle": idle, "spawned": self.spawned, "warm_hits": self.warm_hits}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            processes = [p for idle in self._idle.values() for p in idle]
+            self._idle.clear()
+        for process in processes:
+            self._kill(process)
+
+    def _spawn(self, key: Tuple[str, ...]) -> subprocess.Popen:
+        process = subprocess.Popen(
+            list(key),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        with self._lock:
+            self.spawned += 1
+        return process
+
+    def _refill(self, key: Tuple[str, ...]):
+        while True:
+            with self._lock:
+                idle = self._idle.setdefault(key, deque())
+                if self._closed or len(idle) >= self.size:
+                    return
+            try:
+                process = self._spawn(key)
+            except Exception as e:
+                logger.bind(tag=TAG).warning(f"预启动ffmpeg失败: {e}")
+                return
+            with self._lock:
+                if self._closed:
+                    extra = process
+                else:
+                    idle.append(process)
+                    extra = None
+            if extra is not None:
+                self._kill(extra)
+                return
+
+    def _reap(self, now: float):
+        """结束长时间没有使用的命令的空闲进程"""
+        expired = []
+        with self._lock:
+            for key, last_used in list(self._last_used.items()):
+                if now - last_used >= self.idle_ttl:
+                    self._last_used.pop(key)
+                    expired.extend(self._idle.pop(key, ()))
+        for process in expired:
+            self._kill(process)
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        try:
+            process.kill()
+            process.communicate()
+        except Exception:
+            pass
+
+
+def ffmpeg_decode_command(
+    input_args: Sequence[str] = (),
+    output_args: Sequence[str] = (),
+    sample_rate: int = SAMPLE_RATE,
+) -> list:
+    """把标准输入的音频解码为指定采样率（默认16kHz）的单声道16位PCM输出到标准输出"""
+    return (
+        ["ffmpeg", "-nostdin", "-loglevel", "error"]
+        + list(input_args)
+        + ["-i", "pipe:0", "-f", "s16le", "-ar", str(sample_rate)]
+        + ["-ac", str(CHANNELS)]
+        + list(output_args)
+        + ["pipe:1"]
+    )
+
+
+def decode_audio(
+    data: bytes, file_type: Optional[str] = None, sample_rate: int = SAMPLE_RATE
+) -> bytes:
+    """任意格式的音频数据解码为指定采样率（默认16kHz）的单声道16位PCM
+
+    wav和pcm（视为16kHz单声道）在进程内处理，其余格式由预启动的ffmpeg进程解码
+    """
+    audio_format = sniff_audio_format(data, (file_type or "").lower() or None)
+    if audio_format == "pcm":
+        return pcm16_to_target(data, target_rate=sample_rate)
+    if audio_format == "wav":
+        pcm = _decode_wav(data, sample_rate)
+        if pcm is not None:
+            return pcm
+    input_args = ["-f", ffmpeg_input_format(audio_format)] if audio_format else []
+    return get_ffmpeg_pool().decode(
+        data, ffmpeg_decode_command(input_args, sample_rate=sample_rate)
+    )
+
+
+_ffmpeg_pool = None
+_ffmpeg_pool_lock = threading.Lock()
+
+
+def init_ffmpeg_pool(config: dict = None) -> FFmpegProcessPool:
+    """根据配置创建全局ffmpeg进程池，已创建时直接返回"""
+    global _ffmpeg_pool
+    with _ffmpeg_pool_lock:
+        if _ffmpeg_pool is None:
+            pool_config = (config or {}).get("audio_decoder", {}) or {}
+            size = pool_config.get("ffmpeg_pool_size")
+            idle_ttl = pool_config.get("idle_ttl")
+            _ffmpeg_pool = FFmpegProcessPool(
+                size=DEFAULT_POOL_SIZE if size in (None, "") else size,
+                idle_ttl=DEFAULT_IDLE_TTL if idle_ttl in (None, "") else float(idle_ttl),
+            )
+            atexit.register(_ffmpeg_pool.close)
+        return _ffmpeg_pool
+
+
+def get_ffmpeg_pool() -> FFmpegProcessPool:
+    """获取全局ffmpeg进程池"""
+    return _ffmpeg_pool or init_ffmpeg_pool()
@@ -53,6 +53,14 @@ class TokenBucket:
             self._refill_tokens()
             return int(self.tokens)
 
+    def time_until_available(self, requested_tokens: float = 1) -> float:
+        """距离桶中令牌足够还需等待的秒数，足够时返回0"""
+        with self.lock:
+            self._refill_tokens()
+            if self.tokens >= requested_tokens or self.refill_rate <= 0:
+                return 0.0
+            return (requested_tokens - self.tokens) / self.refill_rate
+
     def _refill_tokens(self):
         """内部方法：补充令牌"""
         current_time = time.time()
@@ -64,28 +72,42 @@ class TokenBucket:
 
 
 class AudioFlowController:
-    """音频流控制器，基于令牌桶算法控制音频数据发送"""
+    """音频流控制器，基于令牌桶算法控制音频数据发送
 
-    def __init__(self, max_device_buffer: int = 3000, refill_rate: float = 20):
+    设备缓冲区未满时连续发送，满了以后等缓冲区降到预缓冲水位再批量补充，
+    每次补充只唤醒一次事件循环。设备端消费量按播放时间估算，收到设备上报的播放位置时
+    以上报为准重新校准播放时钟，之后继续按时间推算。
+    帧数可以是小数，时长与协商帧时长不同的包按比例折算
+    """
+
+    def __init__(self, max_device_buffer: float = 3000, refill_rate: float = 20, min_pre_buffer: float = 3):
         """
         初始化音频流控制器
 
         Args:
             max_device_buffer: 设备端最大缓冲区大小（Opus帧数）
-            refill_rate: 令牌补充速率（每秒允许发送的帧数）
+            refill_rate: 令牌补充速率（每秒允许发送的帧数，即设备播放速度）
+            min_pre_buffer: 预缓冲帧数下限，实际水位随测得的RTT调整
         """
         self.max_device_buffer = max_device_buffer
+        self.refill_rate = refill_rate
+        self.min_pre_buffer = min(min_pre_buffer, max_device_buffer)
+        self.pre_buffer_frames = self.min_pre_buffer
+        self.rtt = 0.0  # 平滑后的往返时延（秒）
         self.token_bucket = TokenBucket(
             capacity=max_device_buffer,
             refill_rate=refill_rate,
-            initial_tokens=max_device_buffer // 2  # 初始令牌为容量的一半
+            initial_tokens=max_device_buffer  # 开始播放时允许一次发满设备缓冲区
         )
         self.sent_frames_count = 0  # 已发送帧数计数
         self.device_consumed_frames = 0  # 设备端已消费帧数
         self.pending_queue = deque()  # 等待发送的数据队列
+        self._playback_end = 0.0  # 预计设备播放完已发送音频的时刻
+        self._acked_frames = 0  # 设备最近一次上报的播放位置（帧）
+        self.generation = 0  # 每次重置加一，用于丢弃上一轮播放遗留的延迟消息
         self._lock = threading.Lock()
 
-    def can_send_frames(self, frame_count: int) -> bool:
+    def can_send_frames(self, frame_count: float) -> bool:
         """
         检查是否可以发送指定数量的帧
 
@@ -96,6 +118,7 @@ class AudioFlowController:
             bool: 是否可以发送
         """
         with self._lock:
+            self._update_consumption()
             # 检查设备端缓冲区是否会溢出
             estimated_device_buffer = self.sent_frames_count - self.device_consumed_frames
             if estimated_device_buffer + frame_count > self.max_device_buffer:
@@ -104,17 +127,91 @@ class AudioFlowController:
             # 检查令牌桶是否有足够令牌
             return self.token_bucket.get_tokens(frame_count)
 
-    def update_device_consumption(self, consumed_frames: int):
+    def acquire(self, frame_count: float) -> float:
+        """
+        尝试取得发送指定帧数的许可
+
+        Args:
+            frame_count: 要发送的帧数
+
+        Returns:
+            float: 0表示可以立即发送（已扣除令牌），否则为建议等待的秒数
+        """
+        with self._lock:
+            self._update_consumption()
+            buffered = self.sent_frames_count - self.device_consumed_frames
+            # 缓冲区为空时总是允许发送，单个包超过缓冲区上限也不会卡住
+            if buffered > 0 and buffered + frame_count > self.max_device_buffer:
+                # 缓冲区满了，等降到预缓冲水位再补充，避免每帧唤醒一次
+                low_water = min(self.pre_buffer_frames, self.max_device_buffer - frame_count)
+                return max(buffered - max(low_water, 0), 1) / self.refill_rate
+            wait = self.token_bucket.time_until_available(frame_count)
+            if wait > 0:
+                return wait
+            self.token_bucket.get_tokens(frame_count)
+            return 0.0
+
+    def playback_delay(self) -> float:
+        """已发送的音频全部播放完还需要的秒数，即下一段音频开始播放的时间"""
+        with self._lock:
+            return max(self._playback_end - time.monotonic(), 0)
+
+    def drain_time(self) -> float:
+        """设备缓冲区降到预缓冲水位还需要的秒数，用于让文本和状态消息与播放进度对齐"""
+        with self._lock:
+            self._update_consumption()
+            buffered = self.sent_frames_count - self.device_consumed_frames
+            return max(buffered - self.pre_buffer_frames, 0) / self.refill_rate
+
+    def update_rtt(self, rtt: float):
         """
-        更新设备端消费的帧数
+        根据测得的往返时延调整预缓冲水位
+
+        Args:
+            rtt: 往返时延（秒），0或负数表示尚未测得
+        """
+        if not rtt or rtt <= 0:
+            return
+        with self._lock:
+            # 与TCP的SRTT一样按1/8平滑，避免单次抖动导致水位大幅变化
+            self.rtt = rtt if self.rtt == 0 else self.rtt * 0.875 + rtt * 0.125
+            # 水位至少覆盖两个RTT，重传或网络抖动时设备不至于断音
+            wanted = self.rtt * 2 * self.refill_rate
+            self.pre_buffer_frames = min(
+                max(self.min_pre_buffer, wanted), self.max_device_buffer / 2
+            )
+
+    def update_device_consumption(self, consumed_frames: float):
+        """
+        更新设备端消费的帧数，在设备最近一次上报的播放位置上累加
 
         Args:
             consumed_frames: 设备端消费的帧数
         """
         with self._lock:
-            self.device_consumed_frames += consumed_frames
+            position = self._acked_frames + consumed_frames
+        self.update_device_position(position)
+
+    def update_device_position(self, played_frames: float):
+        """
+        按设备上报的播放位置校准播放时钟
+
+        上报的位置是权威值，直接替换按时间估算的消费量，估算超前或落后于设备时都能纠正，
+        不能叠加在估算值上，否则同一段播放会被计算两次
 
-    def record_sent_frames(self, frame_count: int):
+        Args:
+            played_frames: 本轮播放开始以来设备已播放的帧数
+        """
+        with self._lock:
+            self._acked_frames = played_frames
+            # 上报消息在路上约半个RTT，这段时间设备仍在播放
+            consumed = played_frames + self.rtt / 2 * self.refill_rate
+            consumed = min(max(consumed, 0), self.sent_frames_count)
+            self.device_consumed_frames = consumed
+            buffered = self.sent_frames_count - consumed
+            self._playback_end = time.monotonic() + buffered / self.refill_rate
+
+    def record_sent_frames(self, frame_count: float):
         """
         记录已发送的帧数
 
@@ -122,11 +219,22 @@ class AudioFlowController:
             frame_count: 发送的帧数
         """
         with self._lock:
+            now = time.monotonic()
+            # 设备缓冲区为空时，新数据约半个RTT后才开始播放
+            start = max(self._playback_end, now + self.rtt / 2)
+            self._playback_end = start + frame_count / self.refill_rate
             self.sent_frames_count += frame_count
 
+    def _update_consumption(self):
+        """内部方法：按播放时钟估算设备端消费量，播放时钟可能已按设备上报的位置校准"""
+        remaining = max(self._playback_end - time.monotonic(), 0)
+        buffered = min(remaining * self.refill_rate, self.sent_frames_count)
+        self.device_consumed_frames = self.sent_frames_count - buffered
+
     def get_status(self) -> Dict[str, Any]:
         """获取流控状态信息"""
         with self._lock:
+            self._update_consumption()
             estimated_buffer = self.sent_frames_count - self.device_consumed_frames
             return {
                 "sent_frames": self.sent_frames_count,
@@ -134,20 +242,25 @@ class AudioFlowController:
                 "estimated_device_buffer": estimated_buffer,
                 "available_tokens": self.token_bucket.get_available_tokens(),
                 "pending_queue_size": len(self.pending_queue),
-                "buffer_usage_percent": (estimated_buffer / self.max_device_buffer) * 100
+                "buffer_usage_percent": (estimated_buffer / self.max_device_buffer) * 100,
+                "pre_buffer_frames": self.pre_buffer_frames,
+                "rtt_ms": self.rtt * 1000,
             }
 
     def reset(self):
-        """重置流控状态"""
+        """重置流控状态，新一轮播放开始或设备中止播放后调用，保留测得的RTT"""
         with self._lock:
             self.sent_frames_count = 0
             self.device_consumed_frames = 0
             self.pending_queue.clear()
+            self._playback_end = 0.0
+            self._acked_frames = 0
+            self.generation += 1
             # 重新初始化令牌桶
             self.token_bucket = TokenBucket(
                 capacity=self.max_device_buffer,
                 refill_rate=self.token_bucket.refill_rate,
-                initial_tokens=self.max_device_buffer // 2
+                initial_tokens=self.max_device_buffer
             )
 
 
@@ -155,32 +268,35 @@ class AudioFlowController:
 class FlowControlConfig:
     """流控配置常量"""
     # Opus 编码参数
-    OPUS_FRAME_DURATION_MS = 60  # Opus帧时长（毫秒）
-    OPUS_FRAMES_PER_SECOND = 1000 / OPUS_FRAME_DURATION_MS  # 每秒帧数
+    OPUS_FRAME_DURATION_MS = 60  # Opus帧时长（毫秒），实际以hello中协商的为准
 
     # 默认流控参数
-    DEFAULT_MAX_DEVICE_BUFFER = 40  # 设备端最大缓冲帧数
-    DEFAULT_REFILL_RATE = OPUS_FRAMES_PER_SECOND  # 默认令牌补充速率（帧/秒）
+    # 设备端最多缓冲的音频时长（毫秒），固件解码队列上限为2400ms，留出估算误差的余量
+    DEFAULT_MAX_BUFFER_MS = 1200
+    # 预缓冲时长下限（毫秒），RTT较大时自动提高
+    DEFAULT_MIN_PRE_BUFFER_MS = 180
     DEFAULT_MAX_WAIT_TIME = 5.0  # 流控最大等待时间（秒）
-    DEFAULT_RETRY_INTERVAL = 0.06  # 流控重试间隔（秒）
-
-    # 预缓冲参数
-    PRE_BUFFER_FRAMES = 3  # 预缓冲帧数
 
     @classmethod
-    def create_flow_controller(cls, max_buffer: Optional[int] = None,
-                               refill_rate: Optional[float] = None) -> AudioFlowController:
+    def create_flow_controller(cls, frame_duration_ms: Optional[int] = None,
+                               max_buffer_ms: Optional[int] = None,
+                               min_pre_buffer_ms: Optional[int] = None) -> AudioFlowController:
         """
         创建流控制器的工厂方法
 
         Args:
-            max_buffer: 最大缓冲区大小，使用默认值如果为None
-            refill_rate: 令牌补充速率，使用默认值如果为None
+            frame_duration_ms: 帧时长（毫秒），使用默认值如果为None
+            max_buffer_ms: 设备端最多缓冲的音频时长（毫秒），使用默认值如果为None
+            min_pre_buffer_ms: 预缓冲时长下限（毫秒），使用默认值如果为None
 
         Returns:
             AudioFlowController: 配置好的流控制器实例
         """
+        frame_duration_ms = frame_duration_ms or cls.OPUS_FRAME_DURATION_MS
+        max_buffer_ms = max_buffer_ms or cls.DEFAULT_MAX_BUFFER_MS
+        min_pre_buffer_ms = min_pre_buffer_ms or cls.DEFAULT_MIN_PRE_BUFFER_MS
         return AudioFlowController(
-            max_device_buffer=max_buffer or cls.DEFAULT_MAX_DEVICE_BUFFER,
-            refill_rate=refill_rate or cls.DEFAULT_REFILL_RATE
-        )
\ No newline at end of file
+            max_device_buffer=max_buffer_ms / frame_duration_ms,
+            refill_rate=1000 / frame_duration_ms,
+            min_pre_buffer=min_pre_buffer_ms / frame_duration_ms
+        )
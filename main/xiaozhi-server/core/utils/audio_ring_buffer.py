@@ -0,0 +1,119 @@
+"""
+连接音频环形缓冲区
+预分配的int16 PCM缓冲区，供VAD按窗口读取、ASR按整句读取，避免频繁的切片和拼接
+"""
+
+import numpy as np
+
+# 默认容量2秒，够VAD窗口和预录音使用，一句话超过时按需翻倍扩容，
+# 最多保留120秒（16kHz），clear时缩回默认容量
+DEFAULT_CAPACITY = 16000 * 2
+DEFAULT_MAX_CAPACITY = 16000 * 120
+
+
+class AudioRingBuffer:
+    """预分配的int16环形缓冲区
+
+    采样按绝对位置寻址（从0开始累计写入的采样数）。底层数组长度为容量的两倍，
+    每个采样同时写入 i 和 i+capacity 两处，因此任意不超过容量的区间在内存中都是连续的，
+    读取时直接返回视图，不需要拼接。底层数组在第一次写入时才分配，空闲的连接不占内存。
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        max_capacity: int = DEFAULT_MAX_CAPACITY,
+    ):
+        self.capacity = capacity
+        self.initial_capacity = capacity
+        self.max_capacity = max(max_capacity, capacity)
+        self._buffer = np.zeros(0, dtype=np.int16)
+        self.write_pos = 0
+        # 扩容时只迁移需要保留的数据，更早的数据不再可读
+        self._valid_from = 0
+        # 该位置之后的数据需要保留，写入空间不足时优先扩容而不是覆盖
+        self.keep_from = 0
+
+    @property
+    def start_pos(self) -> int:
+        """当前仍可读取的最早位置"""
+        return max(self._valid_from, self.write_pos - self.capacity)
+
+    def write(self, pcm) -> None:
+        """写入16位单声道PCM数据（bytes或int16数组）"""
+        if isinstance(pcm, np.ndarray):
+            samples = pcm.astype(np.int16, copy=False).reshape(-1)
+        else:
+            samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        n = len(samples)
+        if n == 0:
+            return
+        if len(self._buffer) == 0:
+            self._buffer = np.zeros(self.capacity * 2, dtype=np.int16)
+
+        needed = self.write_pos + n - max(min(self.keep_from, self.write_pos), self.start_pos)
+        if needed > self.capacity and self.capacity < self.max_capacity:
+            self._grow(needed)
+
+        if n > self.capacity:
+            # 单次写入超过容量，只保留末尾部分
+            self.write_pos += n - self.capacity
+            samples = samples[-self.capacity :]
+            n = self.capacity
+        self._store(self.write_pos, samples)
+        self.write_pos += n
+
+    def view(self, start: int, end: int) -> np.ndarray:
+        """返回 [start, end) 区间的连续只读视图，数据在被覆盖前有效"""
+        start = max(start, self.start_pos)
+        end = min(end, self.write_pos)
+        if end <= start:
+            return self._buffer[:0]
+        index = start % self.capacity
+        window = self._buffer[index : index + (end - start)]
+        window.flags.writeable = False
+        return window
+
+    def memoryview(self, start: int, end: int) -> memoryview:
+        """以memoryview形式返回 [start, end) 区间的PCM字节"""
+        return memoryview(self.view(start, end)).cast("B")
+
+    def clear(self) -> None:
+        """不再需要保留之前的语音，扩容过的缓冲区缩回默认容量
+
+        绝对位置继续累计，最近不超过默认容量的数据仍可读取，VAD和预录音不受影响
+        """
+        self.keep_from = self.write_pos
+        if self.capacity <= self.initial_capacity:
+            return
+        retained_from = max(self.write_pos - self.initial_capacity, self.start_pos)
+        retained = self.view(retained_from, self.write_pos).copy()
+        self.capacity = self.initial_capacity
+        self._buffer = np.zeros(self.capacity * 2, dtype=np.int16)
+        self._store(retained_from, retained)
+        self._valid_from = retained_from
+
+    def _store(self, pos: int, samples: np.ndarray) -> None:
+        """在绝对位置pos写入采样，同时写入镜像区域"""
+        n = len(samples)
+        index = pos % self.capacity
+        first = min(n, self.capacity - index)
+        for base in (0, self.capacity):
+            self._buffer[base + index : base + index + first] = samples[:first]
+            if first < n:
+                self._buffer[base : base + n - first] = samples[first:]
+
+    def _grow(self, needed: int) -> None:
+        """扩容并迁移需要保留的数据"""
+        new_capacity = self.capacity
+        while new_capacity < needed and new_capacity < self.max_capacity:
+            new_capacity *= 2
+        new_capacity = min(new_capacity, self.max_capacity)
+
+        retained_from = max(min(self.keep_from, self.write_pos), self.start_pos)
+        retained = self.view(retained_from, self.write_pos).copy()
+
+        self.capacity = new_capacity
+        self._buffer = np.zeros(new_capacity * 2, dtype=np.int16)
+        self._store(retained_from, retained)
+        self._valid_from = retained_from
@@ -0,0 +1,256 @@
+"""
+TTS音频流式解码
+流式TTS接口边合成边返回音频块。这里把mp3/wav/pcm音频块增量转换为设备采样率的单声道16位PCM，
+再按设备的帧时长分帧编码，不必等整句音频下载完再整体转码，首帧音频在合成开始后很快就能发出
+"""
+
+import struct
+import threading
+from typing import Callable, List, Optional
+
+from config.logger import setup_logging
+from core.utils.audio_decode import (
+    ffmpeg_decode_command,
+    ffmpeg_input_format,
+    get_ffmpeg_pool,
+)
+from core.utils.opus_codec import (
+    SAMPLE_RATE,
+    CHANNELS,
+    DEFAULT_AUDIO_PARAMS,
+    AudioParams,
+)
+from core.utils.opus_encoder_utils import OpusEncoderUtils
+
+TAG = __name__
+logger = setup_logging()
+
+# ffmpeg每次从管道读取的字节数
+READ_SIZE = 4096
+# 解析wav头时最多缓存的字节数，超过仍未找到data块则交给ffmpeg处理
+MAX_WAV_HEADER = 64 * 1024
+
+
+class _PassthroughDecoder:
+    """输入已经是16kHz单声道16位PCM，直接输出"""
+
+    def __init__(self, on_pcm: Callable[[bytes], None]):
+        self.on_pcm = on_pcm
+
+    def feed(self, chunk: bytes):
+        if chunk:
+            self.on_pcm(chunk)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class _FFmpegDecoder:
+    """常驻的ffmpeg进程，从stdin写入编码后的音频，读取线程把stdout的PCM交给回调"""
+
+    def __init__(
+        self,
+        on_pcm: Callable[[bytes], None],
+        input_args: List[str],
+        output_rate: int = SAMPLE_RATE,
+    ):
+        self.on_pcm = on_pcm
+        self.error = None
+        # 进程从进程池取出，同样参数的下一个进程已在后台预先启动
+        self._process = get_ffmpeg_pool().acquire(
+            ffmpeg_decode_command(
+                # 不探测输入，收到数据就开始解码
+                ["-probesize", "32", "-analyzeduration", "0", "-fflags", "nobuffer"]
+                + input_args,
+                ["-flush_packets", "1"],
+                sample_rate=output_rate,
+            )
+        )
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        stdout = self._process.stdout
+        try:
+            while True:
+                data = stdout.read1(READ_SIZE)
+                if not data:
+                    break
+                self.on_pcm(data)
+        except Exception as e:
+            self.error = e
+
+    def feed(self, chunk: bytes):
+        if chunk:
+            self._process.stdin.write(chunk)
+            self._process.stdin.flush()
+
+    def close(self):
+        """结束输入并等待剩余的PCM全部输出"""
+        try:
+            self._process.stdin.close()
+        except Exception:
+            pass
+        self._reader.join()
+        self._process.wait()
+        if self._process.returncode != 0 and self.error is None:
+            stderr = self._process.stderr.read().decode("utf-8", "ignore").strip()
+            self.error = RuntimeError(f"ffmpeg解码失败: {stderr}")
+        self._process.stderr.close()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        self._process.kill()
+        try:
+            self._process.stdin.close()
+        except Exception:
+            pass
+        self._reader.join()
+        self._process.wait()
+        self._process.stderr.close()
+
+
+class _WavDecoder:
+    """先解析wav头，已是目标采样率的单声道16位时直接输出PCM，否则交给ffmpeg"""
+
+    def __init__(self, on_pcm: Callable[[bytes], None], output_rate: int = SAMPLE_RATE):
+        self.on_pcm = on_pcm
+        self.output_rate = output_rate
+        self._header = bytearray()
+        self._inner = None
+
+    def feed(self, chunk: bytes):
+        if self._inner is not None:
+            self._inner.feed(chunk)
+            return
+        self._header.extend(chunk)
+        data_offset = self._parse_header()
+        if data_offset is None:
+            if len(self._header) > MAX_WAV_HEADER:
+                self._inner = _FFmpegDecoder(
+                    self.on_pcm, ["-f", "wav"], self.output_rate
+                )
+                self._inner.feed(bytes(self._header))
+            return
+        if data_offset < 0:
+            self._inner = _FFmpegDecoder(self.on_pcm, ["-f", "wav"], self.output_rate)
+            self._inner.feed(bytes(self._header))
+        else:
+            self._inner = _PassthroughDecoder(self.on_pcm)
+            self._inner.feed(bytes(self._header[data_offset:]))
+        self._header = None
+
+    def _parse_header(self) -> Optional[int]:
+        """返回PCM数据的起始位置，格式需要转换时返回-1，头部还不完整时返回None"""
+        header = self._header
+        if len(header) < 12:
+            return None
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return -1
+        offset = 12
+        fmt = None
+        while offset + 8 <= len(header):
+            chunk_id = bytes(header[offset : offset + 4])
+            chunk_size = struct.unpack_from("<I", header, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b"data":
+                if fmt is None:
+                    return -1
+                audio_format, channels, sample_rate, bits = fmt
+                if (
+                    audio_format == 1
+                    and channels == CHANNELS
+                    and sample_rate == self.output_rate
+                    and bits == 16
+                ):
+                    return body
+                return -1
+            if body + chunk_size > len(header):
+                return None
+            if chunk_id == b"fmt ":
+                audio_format, channels, sample_rate = struct.unpack_from(
+                    "<HHI", header, body
+                )
+                bits = struct.unpack_from("<H", header, body + 14)[0]
+                fmt = (audio_format, channels, sample_rate, bits)
+            # 块按偶数字节对齐
+            offset = body + chunk_size + (chunk_size & 1)
+        return None
+
+    def close(self):
+        if self._inner is None and self._header:
+            # 头部没解析完就结束了，交给ffmpeg尽量解码
+            self._inner = _FFmpegDecoder(self.on_pcm, ["-f", "wav"], self.output_rate)
+            self._inner.feed(bytes(self._header))
+        if self._inner is not None:
+            self._inner.close()
+
+    def abort(self):
+        if self._inner is not None:
+            self._inner.abort()
+
+
+def create_stream_decoder(
+    audio_format: str,
+    on_pcm: Callable[[bytes], None],
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    output_rate: int = SAMPLE_RATE,
+):
+    """创建增量解码器，feed(chunk)写入音频块，close()等待全部解码完成，abort()放弃
+
+    sample_rate和channels描述裸PCM输入，输出为output_rate采样率的单声道PCM；
+    on_pcm在写入线程或解码线程中被调用，同一解码器的回调不会并发
+    """
+    audio_format = (audio_format or "mp3").lower()
+    if audio_format == "pcm":
+        if int(sample_rate) == output_rate and int(channels) == CHANNELS:
+            return _PassthroughDecoder(on_pcm)
+        return _FFmpegDecoder(
+            on_pcm,
+            ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels)],
+            output_rate,
+        )
+    if audio_format == "wav":
+        return _WavDecoder(on_pcm, output_rate)
+    return _FFmpegDecoder(
+        on_pcm, ["-f", ffmpeg_input_format(audio_format)], output_rate
+    )
+
+
+class StreamFrameEncoder:
+    """把任意长度的PCM块按协商的帧时长（默认60ms）分帧，输出Opus帧或PCM帧"""
+
+    def __init__(self, is_opus: bool = True, audio_params: AudioParams = None):
+        audio_params = audio_params or DEFAULT_AUDIO_PARAMS
+        self.is_opus = is_opus
+        self.frame_bytes = audio_params.frame_bytes
+        if is_opus:
+            self._encoder = OpusEncoderUtils(
+                sample_rate=audio_params.sample_rate,
+                channels=CHANNELS,
+                frame_size_ms=audio_params.frame_duration,
+            )
+        else:
+            self._residual = bytearray()
+
+    def encode(self, pcm: bytes, end_of_stream: bool = False) -> List[bytes]:
+        if self.is_opus:
+            return self._encoder.encode_pcm_to_opus(pcm, end_of_stream)
+        self._residual.extend(pcm)
+        full_end = len(self._residual) - len(self._residual) % self.frame_bytes
+        frames = [
+            bytes(self._residual[offset : offset + self.frame_bytes])
+            for offset in range(0, full_end, self.frame_bytes)
+        ]
+        del self._residual[:full_end]
+        if end_of_stream and self._residual:
+            # 最后一帧用0填充
+            self._residual.extend(bytes(self.frame_bytes - len(self._residual)))
+            frames.append(bytes(self._residual))
+            self._residual.clear()
+        return frames
@@ -0,0 +1,238 @@
+"""
+进程级HTTP客户端注册表
+按基础URL（协议+主机+端口）共享keep-alive连接池，TTS/LLM/ASR每句话的请求复用已建立的TCP+TLS连接，
+不再每次都重新握手。同步请求使用requests.Session，异步请求使用aiohttp.ClientSession（带DNS缓存）
+"""
+
+import asyncio
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 每个主机最多保持的空闲连接数
+DEFAULT_POOL_MAXSIZE = 32
+# 异步请求每个主机的并发连接上限
+DEFAULT_LIMIT_PER_HOST = 16
+# 异步请求DNS缓存时间（秒）
+DEFAULT_DNS_CACHE_TTL = 300
+# 空闲连接保持时间（秒）
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+# 不指定URL时使用的共享异步会话
+DEFAULT_KEY = "default"
+
+
+def base_url(url: Optional[str]) -> str:
+    """取出URL的协议和主机部分作为连接池的键"""
+    if not url:
+        return DEFAULT_KEY
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return DEFAULT_KEY
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class _AsyncStats:
+    """通过aiohttp的TraceConfig统计新建连接与复用连接"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.dns_cache_hits = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.requests += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        return trace
+
+
+class HttpClientRegistry:
+    """按基础URL分配共享的HTTP客户端
+
+    会话被所有连接和租户共用，不保存也不发送服务端设置的Cookie，避免一个用户的Cookie
+    随其他用户的请求发出
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+        dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+    ):
+        self.pool_maxsize = int(pool_maxsize)
+        self.limit_per_host = int(limit_per_host)
+        self.dns_cache_ttl = int(dns_cache_ttl)
+        self.keepalive_timeout = float(keepalive_timeout)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        # (基础URL, 事件循环, 默认超时) -> (aiohttp会话, 统计)
+        self._async_sessions = {}
+
+    def session(self, url: str) -> requests.Session:
+        """获取同步会话，可在多个线程中并发使用"""
+        key = base_url(url)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                # allowed_domains为空即拒绝所有Cookie
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=0,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def async_session(
+        self, url: str = None, timeout: aiohttp.ClientTimeout = None
+    ) -> aiohttp.ClientSession:
+        """获取当前事件循环上的异步会话，需在事件循环中调用
+
+        aiohttp会话不能跨事件循环使用，只适合长期运行的事件循环，
+        每次请求都新建事件循环（asyncio.run）的场景应使用同步会话。
+        timeout为会话的默认超时，不同超时的调用方使用不同的会话
+        """
+        key = base_url(url)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # 清理已关闭的事件循环上遗留的会话
+            for stale in [k for k in self._async_sessions if k[1].is_closed()]:
+                self._async_sessions.pop(stale)
+            entry = self._async_sessions.get((key, loop, timeout))
+            if entry is None or entry[0].closed:
+                stats = _AsyncStats()
+                connector = aiohttp.TCPConnector(
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                    keepalive_timeout=self.keepalive_timeout,
+                )
+                session = aiohttp.ClientSession(
+                    connector=connector,
+                    cookie_jar=aiohttp.DummyCookieJar(),
+                    trace_configs=[stats.trace_config()],
+                    **({"timeout": timeout} if timeout else {}),
+                )
+                entry = self._async_sessions[(key, loop, timeout)] = (session, stats)
+            return entry[0]
+
+    def stats(self) -> dict:
+        """每个主机的请求数、新建连接数和复用次数，新建连接数即握手次数"""
+        result = {}
+        with self._lock:
+            sessions = list(self._sessions.values())
+            async_entries = list(self._async_sessions.items())
+        for session in sessions:
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                    item = result.setdefault(
+                        host, {"requests": 0, "connections": 0, "reused": 0}
+                    )
+                    item["requests"] += pool.num_requests
+                    item["connections"] += pool.num_connections
+        for (key, *_), (_, async_stats) in async_entries:
+            item = result.setdefault(
+                key, {"requests": 0, "connections": 0, "reused": 0}
+            )
+            item["requests"] += async_stats.requests
+            item["connections"] += async_stats.connections
+            item["dns_cache_hits"] = (
+                item.get("dns_cache_hits", 0) + async_stats.dns_cache_hits
+            )
+        for item in result.values():
+            item["reused"] = max(item["requests"] - item["connections"], 0)
+        return result
+
+    def log_stats(self):
+        for host, item in self.stats().items():
+            logger.bind(tag=TAG).info(
+                f"HTTP连接池 {host}: 请求{item['requests']}次, "
+                f"新建连接{item['connections']}个, 复用{item['reused']}次"
+            )
+
+    async def close_async(self):
+        """关闭当前事件循环上的异步会话"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [k for k in self._async_sessions if k[1] is loop]
+            entries = [self._async_sessions.pop(k) for k in keys]
+        for session, _ in entries:
+            if not session.closed:
+                await session.close()
+
+    def close(self):
+        """关闭同步会话"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_http_clients = None
+_http_clients_lock = threading.Lock()
+
+
+def init_http_clients(config: dict = None) -> HttpClientRegistry:
+    """根据配置创建全局HTTP客户端注册表，已创建时直接返回"""
+    global _http_clients
+    with _http_clients_lock:
+        if _http_clients is None:
+            client_config = (config or {}).get("http_client", {}) or {}
+            _http_clients = HttpClientRegistry(
+                pool_maxsize=client_config.get("pool_maxsize")
+                or DEFAULT_POOL_MAXSIZE,
+                limit_per_host=client_config.get("limit_per_host")
+                or DEFAULT_LIMIT_PER_HOST,
+                dns_cache_ttl=client_config.get("dns_cache_ttl")
+                or DEFAULT_DNS_CACHE_TTL,
+                keepalive_timeout=client_config.get("keepalive_timeout")
+                or DEFAULT_KEEPALIVE_TIMEOUT,
+            )
+        return _http_clients
+
+
+def get_http_clients() -> HttpClientRegistry:
+    """获取全局HTTP客户端注册表"""
+    return _http_clients or init_http_clients()
+
+
+def http_session(url: str) -> requests.Session:
+    """获取url所在主机的共享同步会话，用法与requests模块相同: http_session(url).post(url, ...)"""
+    return get_http_clients().session(url)
+
+
+def async_http_session(
+    url: str = None, timeout: aiohttp.ClientTimeout = None
+) -> aiohttp.ClientSession:
+    """获取url所在主机的共享异步会话，不要关闭它，也不要用 async with 包裹会话本身"""
+    return get_http_clients().async_session(url, timeout)
@@ -0,0 +1,205 @@
+"""
+本地模型共享注册表
+VAD和本地ASR模型加载耗时数秒、占用数百MB内存。按 (模块, 类型, 配置) 的规范化哈希共享实例，
+差异化配置相同的设备、以及配置更新前后未变化的模块都复用同一个实例。
+实例按引用计数管理，无人使用超过 idle_ttl 秒后卸载
+"""
+
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 无人引用的模型保留时间（秒）
+DEFAULT_IDLE_TTL = 300
+
+
+def model_key(kind: str, provider_type: str, config: Any) -> str:
+    """模块、类型和配置的规范化哈希"""
+    raw = json.dumps(
+        [kind, provider_type, config], sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    def __init__(self, kind: str, provider_type: str):
+        self.kind = kind
+        self.provider_type = provider_type
+        self.instance = None
+        self.error = None
+        self.ready = threading.Event()
+        self.refs = 0
+        self.idle_since = None
+
+
+class ModelRegistry:
+    """进程级共享模型实例，线程安全"""
+
+    def __init__(self, idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        # id(实例) -> 键，用于按实例释放
+        self._keys_by_instance: Dict[int, str] = {}
+        # 创建后发现不能共享的键，例如每个连接一个实例的远程ASR
+        self._unshared_keys = set()
+
+    def acquire(
+        self,
+        kind: str,
+        provider_type: str,
+        config: Any,
+        factory: Callable[[], Any],
+        shareable: Callable[[Any], bool] = None,
+    ):
+        """获取模型实例并增加引用，配置相同时复用已加载的实例
+
+        shareable 用于在实例创建后判断能否共享，不能共享时每次调用都新建实例且不计引用
+        """
+        key = model_key(kind, provider_type, config)
+        with self._lock:
+            if key in self._unshared_keys:
+                entry = None
+            else:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = _Entry(kind, provider_type)
+                    loader = True
+                else:
+                    loader = False
+                entry.refs += 1
+                entry.idle_since = None
+        if entry is None:
+            return factory()
+
+        if loader:
+            # 同一配置同时只加载一次，其余调用等待加载完成
+            try:
+                instance = factory()
+            except Exception as e:
+                entry.error = e
+                with self._lock:
+                    self._entries.pop(key, None)
+                entry.ready.set()
+                raise
+            if shareable is not None and not shareable(instance):
+                with self._lock:
+                    self._unshared_keys.add(key)
+                    self._entries.pop(key, None)
+                entry.ready.set()
+                return instance
+            entry.instance = instance
+            with self._lock:
+                self._keys_by_instance[id(instance)] = key
+            entry.ready.set()
+            logger.bind(tag=TAG).info(f"共享模型已加载: {kind} {provider_type}")
+        else:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+            if entry.instance is None:
+                # 加载后发现不能共享，自己新建一个
+                return factory()
+            logger.bind(tag=TAG).debug(f"复用共享模型: {kind} {provider_type}")
+
+        self._evict_idle()
+        return entry.instance
+
+    def retain(self, instance) -> bool:
+        """为已在注册表中的实例增加引用，不在注册表中时返回False"""
+        with self._lock:
+            entry = self._entry_of(instance)
+            if entry is None:
+                return False
+            entry.refs += 1
+            entry.idle_since = None
+            return True
+
+    def release(self, instance):
+        """释放一次引用，不在注册表中的实例忽略"""
+        with self._lock:
+            entry = self._entry_of(instance)
+            if entry is None:
+                return
+            entry.refs = max(entry.refs - 1, 0)
+            if entry.refs == 0:
+                entry.idle_since = time.monotonic()
+                # 到期后再检查一次，期间没有新的引用就卸载
+                timer = threading.Timer(self.idle_ttl, self._evict_idle)
+                timer.daemon = True
+                timer.start()
+        self._evict_idle()
+
+    def stats(self) -> list:
+        with self._lock:
+            return [
+                {
+                    "kind": entry.kind,
+                    "type": entry.provider_type,
+                    "refs": entry.refs,
+                    "loaded": entry.instance is not None,
+                }
+                for entry in self._entries.values()
+            ]
+
+    def _entry_of(self, instance):
+        """需持有锁"""
+        key = self._keys_by_instance.get(id(instance))
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry.instance is not instance:
+            return None
+        return entry
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if (
+                    entry.refs == 0
+                    and entry.idle_since is not None
+                    and now - entry.idle_since >= self.idle_ttl
+                ):
+                    self._entries.pop(key)
+                    self._keys_by_instance.pop(id(entry.instance), None)
+                    evicted.append(entry)
+        for entry in evicted:
+            try:
+                shutdown = getattr(entry.instance, "shutdown", None)
+                if shutdown is not None:
+                    shutdown()
+            except Exception as e:
+                logger.bind(tag=TAG).warning(f"卸载模型时出错: {e}")
+            logger.bind(tag=TAG).info(
+                f"共享模型空闲超过{self.idle_ttl}秒，已卸载: {entry.kind} {entry.provider_type}"
+            )
+
+
+_model_registry = None
+_model_registry_lock = threading.Lock()
+
+
+def init_model_registry(config: dict = None) -> ModelRegistry:
+    """根据配置创建全局模型注册表，已创建时直接返回"""
+    global _model_registry
+    with _model_registry_lock:
+        if _model_registry is None:
+            registry_config = (config or {}).get("model_registry", {}) or {}
+            idle_ttl = registry_config.get("idle_ttl")
+            _model_registry = ModelRegistry(
+                idle_ttl=DEFAULT_IDLE_TTL if idle_ttl in (None, "") else float(idle_ttl)
+            )
+        return _model_registry
+
+
+def get_model_registry() -> ModelRegistry:
+    """获取全局模型注册表"""
+    return _model_registry or init_model_registry()
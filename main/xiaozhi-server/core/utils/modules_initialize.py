@@ -1,6 +1,8 @@
 from typing import Dict, Any
 from config.logger import setup_logging
 from core.utils import tts, llm, intent, memory, vad, asr
+from core.utils.model_registry import get_model_registry
+from core.providers.asr.dto.dto import InterfaceType
 
 TAG = __name__
 logger = setup_logging()
@@ -84,9 +86,13 @@ def initialize_modules(
             if "type" not in config["VAD"][select_vad_module]
             else config["VAD"][select_vad_module]["type"]
         )
-        modules["vad"] = vad.create_instance(
+        vad_config = config["VAD"][select_vad_module]
+        # 配置相同的VAD模型全进程共享
+        modules["vad"] = get_model_registry().acquire(
+            "vad",
             vad_type,
-            config["VAD"][select_vad_module],
+            vad_config,
+            lambda: vad.create_instance(vad_type, vad_config),
         )
         logger.bind(tag=TAG).info(f"初始化组件: vad成功 {select_vad_module}")
 
@@ -120,10 +126,17 @@ def initialize_asr(config):
         if "type" not in config["ASR"][select_asr_module]
         else config["ASR"][select_asr_module]["type"]
     )
-    new_asr = asr.create_instance(
+    asr_config = config["ASR"][select_asr_module]
+    delete_audio = str(config.get("delete_audio", True)).lower() in ("true", "1", "yes")
+    # 本地ASR模型按配置全进程共享，远程ASR每个连接一个实例
+    new_asr = get_model_registry().acquire(
+        "asr",
         asr_type,
-        config["ASR"][select_asr_module],
-        str(config.get("delete_audio", True)).lower() in ("true", "1", "yes"),
+        [asr_config, delete_audio],
+        lambda: asr.create_instance(asr_type, asr_config, delete_audio),
+        shareable=lambda instance: (
+            getattr(instance, "interface_type", None) == InterfaceType.LOCAL
+        ),
     )
     logger.bind(tag=TAG).info("ASR模块初始化完成")
     return new_asr
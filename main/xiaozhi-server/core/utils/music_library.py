@@ -0,0 +1,114 @@
+"""
+音乐库预转码
+后台线程把音乐目录中的mp3/wav等文件转码为p3格式并生成偏移索引，只转码一次；
+播放时以内存映射方式按需读取Opus帧，首包立即发出，内存占用与歌曲长度无关
+"""
+
+import os
+import queue
+import threading
+from typing import Iterable, Optional
+from config.logger import setup_logging
+from core.utils import p3
+from core.utils.util import audio_to_data
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_CACHE_DIR = "data/music_p3"
+
+
+class MusicLibrary:
+    """音乐目录与其p3转码缓存的对应关系"""
+
+    def __init__(self, music_dir: str, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.music_dir = os.path.abspath(music_dir)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self._queue = queue.Queue()
+        self._scheduled = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._worker_loop, name="music-indexer", daemon=True
+        )
+        self._thread.start()
+
+    def cached_path(self, music_path: str) -> str:
+        """音乐文件对应的p3缓存路径，保持与音乐目录相同的子目录结构"""
+        rel_path = os.path.relpath(os.path.abspath(music_path), self.music_dir)
+        return os.path.join(self.cache_dir, rel_path + ".p3")
+
+    def get_p3_path(self, music_path: str) -> Optional[str]:
+        """返回可直接播放的p3文件，尚未转码时安排后台转码并返回None"""
+        if music_path.lower().endswith(".p3"):
+            return music_path
+        cached_path = self.cached_path(music_path)
+        if self._is_fresh(music_path, cached_path):
+            return cached_path
+        self.schedule(music_path)
+        return None
+
+    def sync(self, music_files: Iterable[str]):
+        """安排转码所有尚未转码或已变化的音乐文件，music_files为相对音乐目录的路径"""
+        for music_file in music_files:
+            music_path = os.path.join(self.music_dir, music_file)
+            if music_path.lower().endswith(".p3"):
+                continue
+            if not self._is_fresh(music_path, self.cached_path(music_path)):
+                self.schedule(music_path)
+
+    def schedule(self, music_path: str):
+        with self._lock:
+            if music_path in self._scheduled:
+                return
+            self._scheduled.add(music_path)
+        self._queue.put(music_path)
+
+    @staticmethod
+    def _is_fresh(music_path: str, cached_path: str) -> bool:
+        try:
+            return os.path.getmtime(cached_path) >= os.path.getmtime(music_path)
+        except OSError:
+            return False
+
+    def _worker_loop(self):
+        while True:
+            music_path = self._queue.get()
+            try:
+                if not self._is_fresh(music_path, self.cached_path(music_path)):
+                    self._transcode(music_path)
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"音乐转码失败: {music_path}, {e}")
+            finally:
+                with self._lock:
+                    self._scheduled.discard(music_path)
+
+    def _transcode(self, music_path: str):
+        cached_path = self.cached_path(music_path)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        opus_datas, duration = audio_to_data(music_path, is_opus=True)
+        data = p3.encode_opus_to_bytes(opus_datas)
+        # 先写临时文件再替换，播放时不会读到不完整的文件
+        tmp_path = f"{cached_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cached_path)
+        p3.write_frame_index(cached_path)
+        logger.bind(tag=TAG).info(
+            f"音乐转码完成: {os.path.basename(music_path)}, 时长{duration:.0f}秒"
+        )
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+def get_music_library(
+    music_dir: str, cache_dir: str = DEFAULT_CACHE_DIR
+) -> MusicLibrary:
+    """每个音乐目录共用一个转码线程"""
+    key = (os.path.abspath(music_dir), os.path.abspath(cache_dir))
+    with _libraries_lock:
+        library = _libraries.get(key)
+        if library is None:
+            library = _libraries[key] = MusicLibrary(music_dir, cache_dir)
+        return library
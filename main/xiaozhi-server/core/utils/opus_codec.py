@@ -0,0 +1,176 @@
+"""
+共享的Opus编解码器池与PCM分帧工具
+创建编解码器需要分配libopus状态，音频转码、上报、识别等一次性任务从池中借用，
+借出时重置状态，用完归还，不再每次调用都新建
+"""
+
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import opuslib_next
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+FRAME_DURATION_MS = 60
+# 设备可以协商的采样率和帧时长
+SUPPORTED_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+SUPPORTED_FRAME_DURATIONS = (20, 40, 60)
+# Opus单个包的最大时长，解码时按此分配输出缓冲区即可接收任意帧时长
+MAX_PACKET_DURATION_MS = 120
+# 每种参数组合最多保留的空闲编解码器数量
+MAX_IDLE_PER_KEY = 16
+
+
+@dataclass(frozen=True)
+class AudioParams:
+    """设备下行音频的采样率和帧时长，可哈希，用作缓存键的一部分"""
+
+    sample_rate: int = SAMPLE_RATE
+    frame_duration: int = FRAME_DURATION_MS
+
+    @property
+    def frame_size(self) -> int:
+        """每帧采样点数"""
+        return self.sample_rate * self.frame_duration // 1000
+
+    @property
+    def frame_bytes(self) -> int:
+        """16位单声道PCM每帧字节数"""
+        return self.frame_size * CHANNELS * 2
+
+    @property
+    def is_default(self) -> bool:
+        return self == DEFAULT_AUDIO_PARAMS
+
+
+DEFAULT_AUDIO_PARAMS = AudioParams()
+
+
+def negotiate_audio_params(audio_params: Optional[dict]) -> AudioParams:
+    """从hello消息的audio_params中取出支持的采样率和帧时长，不支持的值使用默认值"""
+    audio_params = audio_params or {}
+    try:
+        sample_rate = int(audio_params.get("sample_rate") or SAMPLE_RATE)
+    except (TypeError, ValueError):
+        sample_rate = SAMPLE_RATE
+    try:
+        frame_duration = int(audio_params.get("frame_duration") or FRAME_DURATION_MS)
+    except (TypeError, ValueError):
+        frame_duration = FRAME_DURATION_MS
+    if sample_rate not in SUPPORTED_SAMPLE_RATES:
+        sample_rate = SAMPLE_RATE
+    if frame_duration not in SUPPORTED_FRAME_DURATIONS:
+        frame_duration = FRAME_DURATION_MS
+    return AudioParams(sample_rate, frame_duration)
+
+
+class OpusCodecPool:
+    """按 (采样率, 通道数[, 应用类型]) 分组缓存空闲的编码器和解码器"""
+
+    def __init__(self, max_idle_per_key: int = MAX_IDLE_PER_KEY):
+        self.max_idle_per_key = max_idle_per_key
+        self._lock = threading.Lock()
+        self._encoders = {}
+        self._decoders = {}
+
+    @contextmanager
+    def encoder(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        channels: int = CHANNELS,
+        application=opuslib_next.APPLICATION_AUDIO,
+    ):
+        key = (sample_rate, channels, application)
+        encoder = self._checkout(self._encoders, key)
+        if encoder is None:
+            encoder = opuslib_next.Encoder(sample_rate, channels, application)
+        else:
+            encoder.reset_state()
+        try:
+            yield encoder
+        finally:
+            self._checkin(self._encoders, key, encoder)
+
+    @contextmanager
+    def decoder(self, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS):
+        key = (sample_rate, channels)
+        decoder = self._checkout(self._decoders, key)
+        if decoder is None:
+            decoder = opuslib_next.Decoder(sample_rate, channels)
+        else:
+            decoder.reset_state()
+        try:
+            yield decoder
+        finally:
+            self._checkin(self._decoders, key, decoder)
+
+    def _checkout(self, pool: dict, key):
+        with self._lock:
+            idle = pool.get(key)
+            return idle.pop() if idle else None
+
+    def _checkin(self, pool: dict, key, codec):
+        with self._lock:
+            idle = pool.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(codec)
+
+
+_codec_pool = OpusCodecPool()
+
+
+def opus_encoder(
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    application=opuslib_next.APPLICATION_AUDIO,
+):
+    """从全局池借用编码器，用法: with opus_encoder() as encoder: ..."""
+    return _codec_pool.encoder(sample_rate, channels, application)
+
+
+def opus_decoder(sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS):
+    """从全局池借用解码器，用法: with opus_decoder() as decoder: ..."""
+    return _codec_pool.decoder(sample_rate, channels)
+
+
+def iter_pcm_frames(pcm_data, frame_bytes: int):
+    """按帧切分PCM，完整帧是原数据的memoryview切片，不足一帧的尾部补零"""
+    view = memoryview(pcm_data).cast("B")
+    full_end = len(view) - len(view) % frame_bytes
+    for offset in range(0, full_end, frame_bytes):
+        yield view[offset : offset + frame_bytes]
+    if full_end < len(view):
+        last_frame = bytearray(frame_bytes)
+        last_frame[: len(view) - full_end] = view[full_end:]
+        yield memoryview(last_frame)
+
+
+def encode_pcm_frames(
+    pcm_data,
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    frame_duration_ms: int = FRAME_DURATION_MS,
+) -> List[bytes]:
+    """16位PCM编码为Opus帧列表，最后一帧不足时补零"""
+    frame_size = sample_rate * frame_duration_ms // 1000
+    frame_bytes = frame_size * channels * 2
+    with opus_encoder(sample_rate, channels) as encoder:
+        # opuslib 只接受bytes，每帧在这里复制一次
+        return [
+            encoder.encode(frame.tobytes(), frame_size)
+            for frame in iter_pcm_frames(pcm_data, frame_bytes)
+        ]
+
+
+def decode_opus_frames(
+    opus_datas: Iterable[bytes],
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    frame_duration_ms: int = FRAME_DURATION_MS,
+) -> List[bytes]:
+    """Opus帧列表解码为PCM帧列表，损坏的包由调用方通过异常处理"""
+    frame_size = sample_rate * frame_duration_ms // 1000
+    with opus_decoder(sample_rate, channels) as decoder:
+        return [decoder.decode(opus_data, frame_size) for opus_data in opus_datas]
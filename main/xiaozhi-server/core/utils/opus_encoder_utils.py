@@ -6,7 +6,6 @@ Opus编码工具类
 import logging
 import traceback
 
-import numpy as np
 from typing import List, Optional
 from opuslib_next import Encoder
 from opuslib_next import constants
@@ -36,8 +35,10 @@ class OpusEncoderUtils:
         self.bitrate = 24000  # bps
         self.complexity = 10  # 最高质量
 
-        # 缓冲区初始化为空
-        self.buffer = np.array([], dtype=np.int16)
+        # 不足一帧的剩余数据存放在预分配的缓冲区中，避免每次追加都复制整个缓冲区
+        self.frame_bytes = self.total_frame_size * 2
+        self.residual = bytearray(self.frame_bytes)
+        self.residual_len = 0
 
         try:
             # 创建Opus编码器
@@ -54,7 +55,7 @@ class OpusEncoderUtils:
     def reset_state(self):
         """重置编码器状态"""
         self.encoder.reset_state()
-        self.buffer = np.array([], dtype=np.int16)
+        self.residual_len = 0
 
     def encode_pcm_to_opus(self, pcm_data: bytes, end_of_stream: bool) -> List[bytes]:
         """
@@ -67,47 +68,52 @@ class OpusEncoderUtils:
         Returns:
             Opus数据包列表
         """
-        # 将字节数据转换为short数组
-        new_samples = self._convert_bytes_to_shorts(pcm_data)
-
-        # 校验PCM数据
-        self._validate_pcm_data(new_samples)
-
-        # 将新数据追加到缓冲区
-        self.buffer = np.append(self.buffer, new_samples)
-
+        # 按字节处理，数据块在采样点中间断开时，多出的字节留在剩余缓冲区
+        data = memoryview(pcm_data).cast("B")
         opus_packets = []
         offset = 0
 
-        # 处理所有完整帧
-        while offset <= len(self.buffer) - self.total_frame_size:
-            frame = self.buffer[offset : offset + self.total_frame_size]
-            output = self._encode(frame)
-            if output:
-                opus_packets.append(output)
-            offset += self.total_frame_size
+        # 先补齐上次剩余的不完整帧
+        if self.residual_len:
+            take = min(self.frame_bytes - self.residual_len, len(data))
+            self.residual[self.residual_len : self.residual_len + take] = data[:take]
+            self.residual_len += take
+            offset = take
+            if self.residual_len == self.frame_bytes:
+                self._append(opus_packets, self._encode(bytes(self.residual)))
+                self.residual_len = 0
+
+        # 处理所有完整帧，直接从输入数据切片
+        while offset + self.frame_bytes <= len(data):
+            frame = data[offset : offset + self.frame_bytes]
+            self._append(opus_packets, self._encode(frame.tobytes()))
+            offset += self.frame_bytes
 
         # 保留未处理的样本
-        self.buffer = self.buffer[offset:]
+        remaining = len(data) - offset
+        if remaining:
+            self.residual[:remaining] = data[offset:]
+            self.residual_len = remaining
 
         # 流结束时处理剩余数据
-        if end_of_stream and len(self.buffer) > 0:
-            # 创建最后一帧并用0填充
-            last_frame = np.zeros(self.total_frame_size, dtype=np.int16)
-            last_frame[: len(self.buffer)] = self.buffer
-
-            output = self._encode(last_frame)
-            if output:
-                opus_packets.append(output)
-            self.buffer = np.array([], dtype=np.int16)
+        if end_of_stream and self.residual_len > 0:
+            # 最后一帧用0填充
+            self.residual[self.residual_len :] = bytes(
+                self.frame_bytes - self.residual_len
+            )
+            self._append(opus_packets, self._encode(bytes(self.residual)))
+            self.residual_len = 0
 
         return opus_packets
 
-    def _encode(self, frame: np.ndarray) -> Optional[bytes]:
+    @staticmethod
+    def _append(opus_packets: List[bytes], output: Optional[bytes]):
+        if output:
+            opus_packets.append(output)
+
+    def _encode(self, frame_bytes: bytes) -> Optional[bytes]:
         """编码一帧音频数据"""
         try:
-            # 将numpy数组转换为bytes
-            frame_bytes = frame.tobytes()
             # opuslib要求输入字节数必须是channels*2的倍数
             encoded = self.encoder.encode(frame_bytes, self.frame_size)
             return encoded
@@ -116,20 +122,6 @@ class OpusEncoderUtils:
             traceback.print_exc()
             return None
 
-    def _convert_bytes_to_shorts(self, bytes_data: bytes) -> np.ndarray:
-        """将字节数组转换为short数组 (16位PCM)"""
-        # 假设输入是小端字节序的16位PCM
-        return np.frombuffer(bytes_data, dtype=np.int16)
-
-    def _validate_pcm_data(self, pcm_shorts: np.ndarray) -> None:
-        """验证PCM数据是否有效"""
-        # 16位PCM数据范围是 -32768 到 32767
-        if np.any((pcm_shorts < -32768) | (pcm_shorts > 32767)):
-            invalid_samples = pcm_shorts[(pcm_shorts < -32768) | (pcm_shorts > 32767)]
-            logging.warning(f"发现无效PCM样本: {invalid_samples[:5]}...")
-            # 在实际应用中可以选择裁剪而不是抛出异常
-            # np.clip(pcm_shorts, -32768, 32767, out=pcm_shorts)
-
     def close(self):
         """关闭编码器并释放资源"""
         # opuslib没有明确的关闭方法，Python的垃圾回收会处理
@@ -0,0 +1,425 @@
+"""
+Opus直通
+TTS服务直接返回Ogg/WebM封装的Opus时，从封装中取出Opus包，按设备的帧时长重新组包后直接下发，
+不再解码成PCM再重新编码。组包只改变包结构（RFC 6716 第3章），不改动编码数据
+"""
+
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.utils.opus_codec import FRAME_DURATION_MS
+
+# 服务商的音频格式参数 -> 封装格式
+OPUS_CONTAINERS = {"opus": "ogg", "ogg_opus": "ogg", "webm": "webm"}
+# 单帧最大字节数
+MAX_FRAME_BYTES = 1275
+# 一个包最多的帧数
+MAX_PACKET_FRAMES = 48
+# 帧时长按48kHz采样点计算，2.5ms为120
+SAMPLES_PER_MS = 48
+
+
+class OpusPacketError(ValueError):
+    """数据不是可直通的Opus，调用方应退回解码再编码"""
+
+
+def opus_container(audio_format: Optional[str]) -> Optional[str]:
+    """返回音频格式对应的Opus封装格式，不是Opus时返回None"""
+    return OPUS_CONTAINERS.get((audio_format or "").lower())
+
+
+def frame_samples(toc: int) -> int:
+    """TOC字节对应的单帧时长（48kHz采样点）"""
+    config = toc >> 3
+    if config < 12:
+        # SILK: 10/20/40/60ms
+        return (480, 960, 1920, 2880)[config & 3]
+    if config < 16:
+        # Hybrid: 10/20ms
+        return (480, 960)[config & 1]
+    # CELT: 2.5/5/10/20ms
+    return (120, 240, 480, 960)[config & 3]
+
+
+def _read_length(packet: bytes, offset: int) -> Tuple[int, int]:
+    if offset >= len(packet):
+        raise OpusPacketError("Opus包长度字段不完整")
+    first = packet[offset]
+    if first < 252:
+        return first, offset + 1
+    if offset + 1 >= len(packet):
+        raise OpusPacketError("Opus包长度字段不完整")
+    return first + 4 * packet[offset + 1], offset + 2
+
+
+def _write_length(length: int) -> bytes:
+    if length < 252:
+        return bytes([length])
+    first = 252 + ((length - 252) & 3)
+    return bytes([first, (length - first) >> 2])
+
+
+def parse_packet(packet: bytes) -> Tuple[int, List[bytes]]:
+    """拆分Opus包，返回 (去掉帧数编码的TOC, 帧列表)"""
+    if not packet:
+        raise OpusPacketError("空的Opus包")
+    toc = packet[0]
+    code = toc & 3
+    body = packet[1:]
+    if code == 0:
+        frames = [body]
+    elif code == 1:
+        if len(body) % 2:
+            raise OpusPacketError("CBR双帧Opus包长度不是偶数")
+        half = len(body) // 2
+        frames = [body[:half], body[half:]]
+    elif code == 2:
+        length, offset = _read_length(packet, 1)
+        if offset + length > len(packet):
+            raise OpusPacketError("Opus包帧长度越界")
+        frames = [packet[offset : offset + length], packet[offset + length :]]
+    else:
+        if len(packet) < 2:
+            raise OpusPacketError("Opus包缺少帧数字段")
+        vbr = packet[1] & 0x80
+        count = packet[1] & 0x3F
+        if count == 0:
+            raise OpusPacketError("Opus包帧数为0")
+        offset = 2
+        end = len(packet)
+        if packet[1] & 0x40:
+            # 填充长度：255表示254字节并继续读取下一个字节
+            while True:
+                if offset >= len(packet):
+                    raise OpusPacketError("Opus包填充字段不完整")
+                value = packet[offset]
+                offset += 1
+                end -= 254 if value == 255 else value
+                if value != 255:
+                    break
+        if vbr:
+            lengths = []
+            for _ in range(count - 1):
+                length, offset = _read_length(packet, offset)
+                lengths.append(length)
+            lengths.append(end - offset - sum(lengths))
+        else:
+            if (end - offset) % count:
+                raise OpusPacketError("CBR多帧Opus包长度不能整除")
+            lengths = [(end - offset) // count] * count
+        if end < offset or min(lengths) < 0:
+            raise OpusPacketError("Opus包帧长度越界")
+        frames = []
+        for length in lengths:
+            frames.append(packet[offset : offset + length])
+            offset += length
+    if any(len(frame) > MAX_FRAME_BYTES for frame in frames):
+        raise OpusPacketError("Opus帧超过最大长度")
+    return toc & 0xFC, frames
+
+
+def build_packet(toc: int, frames: List[bytes]) -> bytes:
+    """用相同TOC的若干帧组成一个Opus包"""
+    if len(frames) == 1:
+        return bytes([toc]) + frames[0]
+    lengths = [len(frame) for frame in frames]
+    if len(frames) == 2 and lengths[0] == lengths[1]:
+        return bytes([toc | 1]) + frames[0] + frames[1]
+    vbr = len(set(lengths)) > 1
+    header = bytearray([toc | 3, len(frames) | (0x80 if vbr else 0)])
+    if vbr:
+        for length in lengths[:-1]:
+            header += _write_length(length)
+    return bytes(header) + b"".join(frames)
+
+
+def packet_samples(packet: bytes) -> int:
+    """Opus包的时长（48kHz采样点）"""
+    toc, frames = parse_packet(packet)
+    return frame_samples(toc) * len(frames)
+
+
+def packet_duration_ms(packet: bytes) -> float:
+    """只读取TOC和帧数字段计算Opus包的时长（毫秒），不拆分帧"""
+    if not packet:
+        raise OpusPacketError("空的Opus包")
+    toc = packet[0]
+    code = toc & 3
+    if code == 0:
+        count = 1
+    elif code < 3:
+        count = 2
+    elif len(packet) > 1:
+        count = packet[1] & 0x3F
+    else:
+        raise OpusPacketError("Opus包缺少帧数字段")
+    return frame_samples(toc) * count / SAMPLES_PER_MS
+
+
+class OpusRepacketizer:
+    """把任意时长的Opus包重新组成设备帧时长的包
+
+    相同TOC的连续帧合并为一个包，时长凑够一帧或TOC变化时输出；
+    比设备帧还长的单帧无法不解码拆分，抛出OpusPacketError
+    """
+
+    def __init__(self, frame_duration_ms: int = FRAME_DURATION_MS):
+        self.target_samples = int(frame_duration_ms * SAMPLES_PER_MS)
+        self._toc = None
+        self._frames: List[bytes] = []
+        self._samples = 0
+
+    def push(self, packet: bytes) -> List[bytes]:
+        toc, frames = parse_packet(packet)
+        duration = frame_samples(toc)
+        if duration > self.target_samples:
+            raise OpusPacketError(
+                f"Opus帧时长{duration / SAMPLES_PER_MS}ms超过设备帧时长"
+            )
+        output = []
+        for frame in frames:
+            if self._frames and (
+                toc != self._toc
+                or self._samples + duration > self.target_samples
+                or len(self._frames) >= MAX_PACKET_FRAMES
+            ):
+                output.append(self._take())
+            self._toc = toc
+            self._frames.append(frame)
+            self._samples += duration
+            if self._samples == self.target_samples:
+                output.append(self._take())
+        return output
+
+    def flush(self) -> List[bytes]:
+        """输出剩余不足一帧的数据"""
+        return [self._take()] if self._frames else []
+
+    def _take(self) -> bytes:
+        packet = build_packet(self._toc, self._frames)
+        self._frames = []
+        self._samples = 0
+        return packet
+
+
+class OggOpusDemuxer:
+    """增量解析Ogg封装，输出Opus音频包，跳过每个逻辑流开头的OpusHead和OpusTags"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # 逻辑流序号 -> 已读取的包数
+        self._packet_counts: Dict[int, int] = {}
+        self._partial = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer.extend(data)
+        packets = []
+        while True:
+            buffer = self._buffer
+            if len(buffer) < 27:
+                break
+            if buffer[:4] != b"OggS":
+                raise OpusPacketError("不是Ogg封装的数据")
+            segment_count = buffer[26]
+            header_size = 27 + segment_count
+            if len(buffer) < header_size:
+                break
+            lacing = buffer[27:header_size]
+            page_size = header_size + sum(lacing)
+            if len(buffer) < page_size:
+                break
+            continued = buffer[5] & 0x01
+            serial = struct.unpack_from("<I", buffer, 14)[0]
+            if not continued:
+                self._partial.clear()
+            offset = header_size
+            for value in lacing:
+                self._partial += buffer[offset : offset + value]
+                offset += value
+                if value < 255:
+                    self._emit(serial, bytes(self._partial), packets)
+                    self._partial.clear()
+            del self._buffer[:page_size]
+        return packets
+
+    def _emit(self, serial: int, packet: bytes, packets: List[bytes]):
+        index = self._packet_counts.get(serial, 0)
+        self._packet_counts[serial] = index + 1
+        if index == 0:
+            if not packet.startswith(b"OpusHead"):
+                raise OpusPacketError("Ogg中不是Opus音频")
+            return
+        if index == 1 and packet.startswith(b"OpusTags"):
+            return
+        if packet:
+            packets.append(packet)
+
+
+# WebM/Matroska元素ID
+_EBML_MASTERS = {
+    0x18538067,  # Segment
+    0x1F43B675,  # Cluster
+    0x1654AE6B,  # Tracks
+    0xAE,  # TrackEntry
+    0xA0,  # BlockGroup
+}
+_EBML_TRACK_ENTRY = 0xAE
+_EBML_TRACK_NUMBER = 0xD7
+_EBML_CODEC_ID = 0x86
+_EBML_SIMPLE_BLOCK = 0xA3
+_EBML_BLOCK = 0xA1
+_EBML_LEAVES = {_EBML_TRACK_NUMBER, _EBML_CODEC_ID, _EBML_SIMPLE_BLOCK, _EBML_BLOCK}
+
+
+def _read_vint(data, offset: int, keep_marker: bool = False):
+    """读取EBML变长整数，数据不完整时返回None"""
+    if offset >= len(data):
+        return None
+    first = data[offset]
+    if first == 0:
+        raise OpusPacketError("无效的EBML变长整数")
+    length = 1
+    while not first & (0x80 >> (length - 1)):
+        length += 1
+    if offset + length > len(data):
+        return None
+    value = first if keep_marker else first & (0xFF >> length)
+    unknown = value == (0xFF >> length) and not keep_marker
+    for byte in data[offset + 1 : offset + length]:
+        value = (value << 8) | byte
+        unknown = unknown and byte == 0xFF
+    return value, offset + length, unknown
+
+
+class WebMOpusDemuxer:
+    """增量解析WebM封装，输出Opus音轨的音频包"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._skip = 0
+        self._track = None
+        self._entry_number = None
+        self._entry_codec = None
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer.extend(data)
+        packets = []
+        while True:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer))
+                del self._buffer[:skipped]
+                self._skip -= skipped
+                if self._skip:
+                    break
+            element_id = _read_vint(self._buffer, 0, keep_marker=True)
+            if element_id is None:
+                break
+            element_id, offset, _ = element_id
+            size = _read_vint(self._buffer, offset)
+            if size is None:
+                break
+            size, offset, unknown = size
+            if element_id in _EBML_MASTERS:
+                # 只进入需要的容器元素，未知长度的Segment/Cluster同样处理
+                if element_id == _EBML_TRACK_ENTRY:
+                    self._entry_number = self._entry_codec = None
+                del self._buffer[:offset]
+                continue
+            if unknown:
+                raise OpusPacketError("无法解析未知长度的WebM元素")
+            if element_id not in _EBML_LEAVES:
+                del self._buffer[:offset]
+                self._skip = size
+                continue
+            if len(self._buffer) < offset + size:
+                break
+            body = bytes(self._buffer[offset : offset + size])
+            del self._buffer[: offset + size]
+            self._handle(element_id, body, packets)
+        return packets
+
+    def _handle(self, element_id: int, body: bytes, packets: List[bytes]):
+        if element_id == _EBML_TRACK_NUMBER:
+            self._entry_number = int.from_bytes(body, "big")
+        elif element_id == _EBML_CODEC_ID:
+            self._entry_codec = body.rstrip(b"\x00").decode("ascii", "ignore")
+        else:
+            track = _read_vint(body, 0)
+            if track is None or len(body) < track[1] + 3:
+                raise OpusPacketError("WebM音频块不完整")
+            track, offset, _ = track
+            if self._track is not None and track != self._track:
+                return
+            if (body[offset + 2] >> 1) & 3:
+                raise OpusPacketError("不支持带lacing的WebM音频块")
+            packets.append(body[offset + 3 :])
+            return
+        if self._entry_codec is not None and self._entry_number is not None:
+            if self._entry_codec == "A_OPUS":
+                self._track = self._entry_number
+            elif self._track is None and self._entry_codec.startswith("A_"):
+                raise OpusPacketError(f"WebM中不是Opus音频: {self._entry_codec}")
+
+
+class OpusPassthrough:
+    """解封装并重新组包，feed(chunk)返回可以直接下发的Opus包"""
+
+    def __init__(self, container: str, frame_duration_ms: int = FRAME_DURATION_MS):
+        if container == "webm":
+            self._demuxer = WebMOpusDemuxer()
+        else:
+            self._demuxer = OggOpusDemuxer()
+        self._repacketizer = OpusRepacketizer(frame_duration_ms)
+        # 已输出的时长（48kHz采样点）
+        self.samples = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        output = []
+        for packet in self._demuxer.feed(chunk):
+            output.extend(self._repacketizer.push(packet))
+        return self._count(output)
+
+    def flush(self) -> List[bytes]:
+        return self._count(self._repacketizer.flush())
+
+    def _count(self, packets: List[bytes]) -> List[bytes]:
+        for packet in packets:
+            self.samples += packet_samples(packet)
+        return packets
+
+
+class OpusPassthroughDecoder:
+    """与create_stream_decoder的解码器接口一致，输出重新组包后的Opus包而不是PCM"""
+
+    def __init__(
+        self,
+        container: str,
+        on_frames: Callable[[List[bytes]], None],
+        frame_duration_ms: int = FRAME_DURATION_MS,
+    ):
+        self.on_frames = on_frames
+        self._passthrough = OpusPassthrough(container, frame_duration_ms)
+
+    def feed(self, chunk: bytes):
+        frames = self._passthrough.feed(chunk)
+        if frames:
+            self.on_frames(frames)
+
+    def close(self):
+        frames = self._passthrough.flush()
+        if frames:
+            self.on_frames(frames)
+
+    def abort(self):
+        pass
+
+
+def opus_container_to_packets(
+    data: bytes, container: str, frame_duration_ms: int = FRAME_DURATION_MS
+) -> Tuple[List[bytes], float]:
+    """整段Ogg/WebM Opus音频转为设备帧时长的Opus包，返回 (包列表, 时长秒)"""
+    passthrough = OpusPassthrough(container, frame_duration_ms)
+    packets = passthrough.feed(data) + passthrough.flush()
+    if not packets:
+        raise OpusPacketError("没有解析到Opus音频包")
+    return packets, passthrough.samples / (SAMPLES_PER_MS * 1000)
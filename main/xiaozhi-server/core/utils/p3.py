@@ -1,3 +1,6 @@
+import os
+import mmap
+import array
 import struct
 
 def decode_opus_from_file(input_file):
@@ -56,4 +59,117 @@ def decode_opus_from_bytes(input_bytes):
         total_frames += 1
 
     total_duration = (total_frames * frame_duration_ms) / 1000.0
-    return opus_datas, total_duration
\ No newline at end of file
+    return opus_datas, total_duration
+
+def encode_opus_to_bytes(opus_datas):
+    """
+    将 Opus 数据包列表按p3格式封装为二进制数据，每包前加4字节头部。
+    """
+    return b"".join(
+        struct.pack('>BBH', 0, 0, len(opus_data)) + opus_data
+        for opus_data in opus_datas
+    )
+
+class MappedP3Frames:
+    """
+    内存映射的p3文件，按需读取 Opus 数据包，支持 len、下标、切片和迭代，
+    可以像数据包列表一样传给发送函数，内存占用与歌曲长度无关。
+    """
+
+    def __init__(self, mm, offsets, start=0, stop=None):
+        self._mm = mm
+        # offsets[i] 为第i包头部的位置，最后一个元素为文件长度
+        self._offsets = offsets
+        self._start = start
+        self._stop = len(offsets) - 1 if stop is None else stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            stop = max(start, stop)
+            return MappedP3Frames(
+                self._mm, self._offsets, self._start + start, self._start + stop
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("p3 frame index out of range")
+        i = self._start + index
+        return self._mm[self._offsets[i] + 4 : self._offsets[i + 1]]
+
+    def __iter__(self):
+        mm, offsets = self._mm, self._offsets
+        for i in range(self._start, self._stop):
+            yield mm[offsets[i] + 4 : offsets[i + 1]]
+
+
+def build_frame_index(buffer):
+    """
+    扫描p3数据的包头，返回每包头部位置的数组，末尾追加数据总长度。
+    """
+    offsets = array.array('Q')
+    pos = 0
+    size = len(buffer)
+    while pos + 4 <= size:
+        _, _, data_len = struct.unpack_from('>BBH', buffer, pos)
+        if pos + 4 + data_len > size:
+            raise ValueError(f"Data length({data_len}) mismatch at offset {pos}.")
+        offsets.append(pos)
+        pos += 4 + data_len
+    offsets.append(pos)
+    return offsets
+
+
+def write_frame_index(input_file, offsets=None):
+    """
+    为p3文件生成偏移索引文件（input_file + '.idx'），下次打开时不必再扫描。
+    """
+    if offsets is None:
+        with open(input_file, 'rb') as f:
+            offsets = build_frame_index(f.read())
+    tmp_file = f"{input_file}.idx.tmp"
+    with open(tmp_file, 'wb') as f:
+        offsets.tofile(f)
+    os.replace(tmp_file, f"{input_file}.idx")
+    return offsets
+
+
+def _load_frame_index(input_file, size):
+    index_file = f"{input_file}.idx"
+    try:
+        if os.path.getmtime(index_file) < os.path.getmtime(input_file):
+            return None
+        offsets = array.array('Q')
+        with open(index_file, 'rb') as f:
+            offsets.frombytes(f.read())
+        # 索引必须与当前文件完全对应
+        if offsets and offsets[-1] == size:
+            return offsets
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def open_opus_frames(input_file):
+    """
+    以内存映射方式打开p3文件，返回可按需读取的 Opus 数据包序列，首包无需等待整个文件解码。
+    """
+    size = os.path.getsize(input_file)
+    if size == 0:
+        return []
+    with open(input_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    offsets = _load_frame_index(input_file, size)
+    if offsets is None:
+        offsets = build_frame_index(mm)
+        try:
+            write_frame_index(input_file, offsets)
+        except OSError:
+            # 音乐目录可能只读，没有索引文件时每次打开扫描一遍包头即可
+            pass
+    return MappedP3Frames(mm, offsets)
@@ -0,0 +1,128 @@
+"""
+TTS文本流的增量断句
+LLM逐个token输出文本，断句器只保存尚未切出的尾部，每个字符只扫描一次
+"""
+
+from typing import Iterable, List, Optional
+from core.utils import textUtils
+
+# 首句遇到逗号等停顿就切出，尽快开始播放
+FIRST_SENTENCE_PUNCTUATIONS = (
+    "，",
+    "～",
+    "~",
+    "、",
+    ",",
+    "。",
+    "？",
+    "?",
+    "！",
+    "!",
+    "；",
+    ";",
+    "：",
+)
+# 后续句子只在句末标点处切分，减少TTS请求次数
+PUNCTUATIONS = ("。", "？", "?", "！", "!", "；", ";", "：", "~")
+# 超过最大长度被迫切分时，优先在这些位置切开
+SOFT_BREAKS = ("，", ",", "、", " ", "\n")
+
+
+class SentenceSegmenter:
+    """增量断句器
+
+    feed 接收新到达的文本，返回其中已经可以合成的句子（已去除首尾标点和表情）；
+    flush 在回复结束时返回剩余的尾部。
+    min_length: 去除标点后短于该长度的句子不单独切出，与下一句合并
+    max_length: 尾部超过该长度仍没有断句标点时强制切分，0表示不限制
+    """
+
+    def __init__(
+        self,
+        first_sentence_punctuations: Iterable[str] = FIRST_SENTENCE_PUNCTUATIONS,
+        punctuations: Iterable[str] = PUNCTUATIONS,
+        min_length: int = 0,
+        max_length: int = 0,
+    ):
+        self.first_sentence_punctuations = frozenset(first_sentence_punctuations)
+        self.punctuations = frozenset(punctuations)
+        self.min_length = max(int(min_length or 0), 0)
+        self.max_length = max(int(max_length or 0), 0)
+        self.reset()
+
+    def reset(self):
+        """开始新的一轮回复"""
+        self.is_first_sentence = True
+        self._pending = []
+        self._pending_len = 0
+        # 尾部中最后一个可强制切分位置（之后的字符数），-1表示没有
+        self._soft_break = -1
+
+    def feed(self, text: str) -> List[str]:
+        """追加一段文本，返回新切出的句子"""
+        segments = []
+        if not text:
+            return segments
+        breaks = (
+            self.first_sentence_punctuations
+            if self.is_first_sentence
+            else self.punctuations
+        )
+        start = 0
+        for i, char in enumerate(text):
+            if char in breaks:
+                segment = self._cut(text, start, i + 1)
+                start = i + 1
+                if segment:
+                    segments.append(segment)
+                    if self.is_first_sentence:
+                        self.is_first_sentence = False
+                        breaks = self.punctuations
+                continue
+            if char in SOFT_BREAKS:
+                self._soft_break = self._pending_len + i - start + 1
+            if self.max_length and self._pending_len + i - start + 1 >= self.max_length:
+                segment = self._force_cut(text, start, i + 1)
+                start = i + 1
+                if segment:
+                    segments.append(segment)
+                    if self.is_first_sentence:
+                        self.is_first_sentence = False
+                        breaks = self.punctuations
+        if start < len(text):
+            rest = text[start:]
+            self._pending.append(rest)
+            self._pending_len += len(rest)
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """取出剩余的全部文本，没有可合成内容时返回None"""
+        remaining = "".join(self._pending)
+        self.reset()
+        segment = textUtils.get_string_no_punctuation_or_emoji(remaining)
+        return segment or None
+
+    def _cut(self, text: str, start: int, end: int) -> Optional[str]:
+        """在断句标点处切分，句子过短时留在尾部继续累积并返回None"""
+        raw = "".join(self._pending) + text[start:end]
+        segment = textUtils.get_string_no_punctuation_or_emoji(raw)
+        if segment and len(segment) < self.min_length:
+            # 合并为一个片段，避免下次再拼接
+            self._pending = [raw]
+            self._pending_len = len(raw)
+            self._soft_break = len(raw)
+            return None
+        self._pending = []
+        self._pending_len = 0
+        self._soft_break = -1
+        return segment
+
+    def _force_cut(self, text: str, start: int, end: int) -> str:
+        """尾部过长，在最后一个停顿处切开，没有停顿则直接截断"""
+        raw = "".join(self._pending) + text[start:end]
+        cut = self._soft_break if self._soft_break > 0 else len(raw)
+        rest = raw[cut:]
+        self._pending = [rest] if rest else []
+        self._pending_len = len(rest)
+        self._soft_break = -1
+        return textUtils.get_string_no_punctuation_or_emoji(raw[:cut])
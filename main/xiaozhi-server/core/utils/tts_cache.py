@@ -0,0 +1,279 @@
+"""
+TTS音频缓存
+相同的提供者、音色参数和文本合成出的音频相同，按内容哈希缓存编码好的Opus帧，
+命中时跳过语音合成和Opus编码。内存中是LRU，磁盘上按p3格式保存，重启后仍可命中。
+只用于分句后按整句合成的TTS，边接收LLM输出边合成的TTS（火山双流式、阿里云流式、
+LinkerAI）合成前拿不到整句文本，不经过缓存
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from config.logger import setup_logging
+from core.utils import p3
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_CACHE_DIR = "data/tts_cache"
+DEFAULT_MEMORY_MAX_MB = 32
+DEFAULT_DISK_MAX_MB = 512
+# 只缓存短句，长句很少重复，缓存它们只会挤掉常用短语
+DEFAULT_MAX_TEXT_LENGTH = 50
+
+
+# 这些配置项不影响合成结果（密钥、输出目录、缓存开关等），不参与缓存键。
+# 按完整键名匹配，max_new_tokens之类影响合成的参数不能被误排除
+IGNORED_PARAM_KEYS = frozenset(
+    (
+        "api_key",
+        "access_key_id",
+        "access_key_secret",
+        "access_token",
+        "token",
+        "authorization",
+        "headers",
+        "secret_id",
+        "secret_key",
+        "password",
+        "output_dir",
+        "cache",
+        "use_memory_cache",
+        "tts_timeout",
+        "synthesis_concurrency",
+    )
+)
+
+
+def cache_params(config: dict) -> dict:
+    """从TTS配置中取出影响合成结果的参数"""
+    return {k: v for k, v in config.items() if k.lower() not in IGNORED_PARAM_KEYS}
+
+
+def normalize_text(text: str) -> str:
+    """合并空白字符，作为缓存键的一部分"""
+    return " ".join(text.split())
+
+
+def make_cache_key(provider: str, params: dict, text: str) -> str:
+    """由提供者类型、合成参数和规范化后的文本生成缓存键"""
+    raw = json.dumps(
+        [provider, params, normalize_text(text)],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """两级TTS音频缓存
+
+    内存层: OrderedDict实现的LRU，按Opus帧总字节数淘汰
+    磁盘层: cache_dir/键前两位/键.p3，按文件修改时间淘汰最久未使用的文件
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        memory_max_mb: float = DEFAULT_MEMORY_MAX_MB,
+        disk_max_mb: float = DEFAULT_DISK_MAX_MB,
+        max_text_length: int = DEFAULT_MAX_TEXT_LENGTH,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_max_bytes = int(float(memory_max_mb) * 1024 * 1024)
+        self.disk_max_bytes = int(float(disk_max_mb) * 1024 * 1024)
+        self.max_text_length = int(max_text_length)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._disk_bytes = self._scan_disk() if self.disk_max_bytes > 0 else 0
+
+    def accepts(self, text: str) -> bool:
+        """该文本是否值得缓存"""
+        return 0 < len(text) <= self.max_text_length
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        """查找缓存，未命中返回None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return entry[0]
+
+        opus_datas = self._read_disk(key)
+        with self._lock:
+            if opus_datas is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._put_memory(key, opus_datas)
+        return opus_datas
+
+    def put(self, key: str, opus_datas: List[bytes]):
+        """保存合成结果"""
+        if not opus_datas:
+            return
+        opus_datas = list(opus_datas)
+        with self._lock:
+            self._put_memory(key, opus_datas)
+        self._write_disk(key, opus_datas)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            total = hits + self._misses
+            return {
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _put_memory(self, key: str, opus_datas: List[bytes]):
+        """写入内存LRU，需持有锁"""
+        size = sum(len(data) for data in opus_datas)
+        if size > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (opus_datas, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.p3")
+
+    def _read_disk(self, key: str) -> Optional[List[bytes]]:
+        if self.disk_max_bytes <= 0:
+            return None
+        path = self._path(key)
+        try:
+            opus_datas, _ = p3.decode_opus_from_file(path)
+            # 更新修改时间，淘汰时作为最近使用时间
+            os.utime(path)
+            return opus_datas
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"TTS缓存文件损坏，已删除: {path}, {e}")
+            self._remove_file(path)
+            return None
+
+    def _write_disk(self, key: str, opus_datas: List[bytes]):
+        if self.disk_max_bytes <= 0:
+            return
+        path = self._path(key)
+        data = p3.encode_opus_to_bytes(opus_datas)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            # 先写临时文件再替换，避免并发读取到不完整的文件
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"TTS缓存写入失败: {path}, {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(data) - old_size
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _scan_disk(self) -> int:
+        total = 0
+        for entry in self._iter_disk():
+            total += entry[2]
+        return total
+
+    def _iter_disk(self):
+        """遍历磁盘缓存，返回 (路径, 修改时间, 大小)"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".p3"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def _evict_disk(self):
+        """删除最久未使用的文件，直到占用降到上限的90%"""
+        entries = sorted(self._iter_disk(), key=lambda e: e[1])
+        total = sum(e[2] for e in entries)
+        target = self.disk_max_bytes * 0.9
+        removed = 0
+        for path, _, size in entries:
+            if total <= target:
+                break
+            if self._remove_file(path):
+                total -= size
+                removed += 1
+        with self._lock:
+            self._disk_bytes = total
+        logger.bind(tag=TAG).info(
+            f"TTS磁盘缓存淘汰{removed}个文件，当前占用{total / 1024 / 1024:.1f}MB"
+        )
+
+    @staticmethod
+    def _remove_file(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+
+def init_tts_cache(config: dict = None) -> Optional[TTSCache]:
+    """根据配置创建全局TTS缓存，未启用时返回None"""
+    global _tts_cache
+    with _tts_cache_lock:
+        if _tts_cache is None:
+            cache_config = (config or {}).get("tts_cache", {}) or {}
+            if not cache_config.get("enabled", True):
+                return None
+            disk_max_mb = cache_config.get("disk_max_mb")
+            _tts_cache = TTSCache(
+                cache_dir=cache_config.get("cache_dir") or DEFAULT_CACHE_DIR,
+                memory_max_mb=cache_config.get("memory_max_mb")
+                or DEFAULT_MEMORY_MAX_MB,
+                # 0表示只使用内存缓存
+                disk_max_mb=(
+                    DEFAULT_DISK_MAX_MB if disk_max_mb in (None, "") else disk_max_mb
+                ),
+                max_text_length=cache_config.get("max_text_length")
+                or DEFAULT_MAX_TEXT_LENGTH,
+            )
+            logger.bind(tag=TAG).info(
+                f"TTS缓存已启用: {_tts_cache.cache_dir}, "
+                f"内存{cache_config.get('memory_max_mb') or DEFAULT_MEMORY_MAX_MB}MB"
+            )
+        return _tts_cache
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """获取全局TTS缓存，未初始化或未启用时返回None"""
+    return _tts_cache
@@ -0,0 +1,143 @@
+"""
+非流式TTS合成流水线
+非流式TTS原本一句一句串行合成，上一句播放时下一句还没开始请求，每个句子之间都多出一次TTS请求的静音。
+流水线同时进行最多 concurrency 个合成请求，结果按提交顺序输出到播放队列；
+打断时丢弃尚未开始的请求和已在进行中的请求结果，
+已在进行中的请求仍然占用并发名额直到真正结束，避免连续打断时堆积超过 concurrency 个请求
+"""
+
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, Callable, Dict
+
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 占位结果：合成失败或被跳过，输出时直接略过
+_SKIP = object()
+
+
+class TTSPipeline:
+    """按序号重排输出的并发合成流水线，线程安全"""
+
+    def __init__(
+        self,
+        submit: Callable[..., concurrent.futures.Future],
+        output: Callable[[Any], None],
+        concurrency: int,
+    ):
+        # submit(fn) 在线程池中执行fn，output(item) 把结果放入播放队列
+        self._submit = submit
+        self._output = output
+        self.concurrency = max(int(concurrency), 1)
+        # Future已完成时add_done_callback会在当前线程立即回调，需要可重入锁
+        self._lock = threading.RLock()
+        # 下一个分配的序号和下一个应输出的序号
+        self._next_seq = 0
+        self._emit_seq = 0
+        # 已完成但还不能输出的结果，序号 -> 结果
+        self._results: Dict[int, Any] = {}
+        # 等待开始的合成任务 (序号, 函数)
+        self._waiting = deque()
+        # 进行中的合成任务，序号 -> Future
+        self._running: Dict[int, concurrent.futures.Future] = {}
+        # 取消时已经开始、结果将被丢弃但尚未结束的合成任务数，仍计入并发
+        self._abandoned = 0
+        # 每次取消后递增，丢弃取消前提交的任务结果
+        self._generation = 0
+
+    def put(self, item):
+        """按顺序输出已经就绪的结果，例如缓存命中的音频或结束标记"""
+        with self._lock:
+            seq = self._reserve()
+            self._complete(seq, item)
+
+    def submit(self, fn: Callable[..., Any], *args):
+        """提交一个合成任务，fn返回要输出的结果，返回None表示没有结果"""
+        with self._lock:
+            seq = self._reserve()
+            self._waiting.append((seq, lambda: fn(*args)))
+            self._start_waiting()
+
+    def cancel(self) -> int:
+        """丢弃所有未输出的任务和结果，返回丢弃的合成任务数"""
+        with self._lock:
+            dropped = len(self._waiting) + len(self._running)
+            # 先切换代数，取消时立即触发的回调不会再修改状态
+            self._generation += 1
+            running = list(self._running.values())
+            self._running.clear()
+            # 在cancel回调之前计入，未开始的Future被取消时会立即回调并释放名额
+            self._abandoned += len(running)
+            self._waiting.clear()
+            self._results.clear()
+            for future in running:
+                # 已经开始的请求无法中断，结果在完成时丢弃
+                future.cancel()
+            self._next_seq = 0
+            self._emit_seq = 0
+        if dropped:
+            logger.bind(tag=TAG).debug(f"已取消{dropped}个TTS合成任务")
+        return dropped
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._waiting) + len(self._running)
+
+    def _reserve(self) -> int:
+        """需持有锁"""
+        seq = self._next_seq
+        self._next_seq += 1
+        return seq
+
+    def _start_waiting(self):
+        """需持有锁"""
+        while (
+            self._waiting
+            and len(self._running) + self._abandoned < self.concurrency
+        ):
+            seq, job = self._waiting.popleft()
+            generation = self._generation
+            try:
+                future = self._submit(job)
+            except Exception as e:
+                # 连接关闭后执行器不再接收任务
+                logger.bind(tag=TAG).warning(f"提交TTS合成任务失败: {e}")
+                self._complete(seq, _SKIP)
+                continue
+            self._running[seq] = future
+            future.add_done_callback(
+                lambda f, seq=seq, generation=generation: self._on_done(
+                    seq, generation, f
+                )
+            )
+
+    def _on_done(self, seq: int, generation: int, future: concurrent.futures.Future):
+        if future.cancelled():
+            item = _SKIP
+        elif future.exception() is not None:
+            logger.bind(tag=TAG).error(f"TTS合成任务出错: {future.exception()}")
+            item = _SKIP
+        else:
+            item = future.result()
+        with self._lock:
+            if generation != self._generation:
+                # 被丢弃的任务结束后才释放并发名额
+                self._abandoned -= 1
+                self._start_waiting()
+                return
+            self._running.pop(seq, None)
+            self._complete(seq, _SKIP if item is None else item)
+            self._start_waiting()
+
+    def _complete(self, seq: int, item):
+        """需持有锁，记录结果并按顺序输出所有已就绪的结果"""
+        self._results[seq] = item
+        while self._emit_seq in self._results:
+            ready = self._results.pop(self._emit_seq)
+            self._emit_seq += 1
+            if ready is not _SKIP:
+                self._output(ready)
@@ -0,0 +1,315 @@
+"""
+双流式TTS WebSocket连接池
+火山、阿里云等双流式TTS每轮对话都要新建WebSocket连接，TLS和WebSocket握手都落在首包音频的关键路径上。
+这里按 (提供者, 地址, 凭证) 在所有连接之间共享已经建立好的WebSocket：会话正常结束后归还连接，
+下一轮对话直接在已打开的连接上开始合成；后台任务保持少量预热连接，定期ping检查并淘汰空闲过久的连接
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from websockets.protocol import State
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# 每个键保持的预热连接数
+DEFAULT_MIN_IDLE = 1
+# 每个键最多保留的空闲连接数，设为0则不复用连接
+DEFAULT_MAX_IDLE = 4
+# 连接空闲多久后淘汰（秒）
+DEFAULT_MAX_IDLE_TIME = 60
+# 最后一次使用后继续保持预热的时长（秒）
+DEFAULT_KEEP_WARM_TIME = 300
+# 空闲连接健康检查间隔（秒）
+DEFAULT_HEALTH_CHECK_INTERVAL = 10
+# 健康检查ping的超时时间（秒）
+PING_TIMEOUT = 5
+
+
+def is_open(ws) -> bool:
+    return ws is not None and getattr(ws, "state", None) is State.OPEN
+
+
+class WebSocketPool:
+    """同一个键下的空闲连接，只能在创建它的事件循环中使用"""
+
+    def __init__(
+        self,
+        name: str,
+        min_idle: int = DEFAULT_MIN_IDLE,
+        max_idle: int = DEFAULT_MAX_IDLE,
+        max_idle_time: float = DEFAULT_MAX_IDLE_TIME,
+        keep_warm_time: float = DEFAULT_KEEP_WARM_TIME,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+    ):
+        self.name = name
+        self.max_idle = max(int(max_idle), 0)
+        self.min_idle = min(max(int(min_idle), 0), self.max_idle)
+        self.max_idle_time = float(max_idle_time)
+        self.keep_warm_time = float(keep_warm_time)
+        self.health_check_interval = float(health_check_interval)
+        # (连接, 放回时间)
+        self._idle = deque()
+        # 最近一次使用的建连函数，预热时使用
+        self._connect: Optional[Callable[[], Awaitable[Any]]] = None
+        self._opening = 0
+        self._last_used = time.monotonic()
+        self._maintain_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.leases = 0
+        self.warm_hits = 0
+        self.connects = 0
+        self.evicted = 0
+
+    async def acquire(self, connect: Callable[[], Awaitable[Any]]):
+        """租用一个已打开的连接，没有可用的空闲连接时用connect新建
+
+        会话正常结束后调用release归还，出错的连接由调用方自行关闭
+        """
+        self._connect = connect
+        self._last_used = time.monotonic()
+        self.leases += 1
+        ws = None
+        while self._idle:
+            candidate, since = self._idle.pop()
+            if is_open(candidate) and time.monotonic() - since < self.max_idle_time:
+                ws = candidate
+                self.warm_hits += 1
+                break
+            self.evicted += 1
+            self._close_later(candidate)
+        if ws is None:
+            ws = await self._open()
+        self._ensure_maintenance()
+        return ws
+
+    def warm(self, connect: Callable[[], Awaitable[Any]]):
+        """在后台预先建立连接，设备连上服务器时调用，第一轮对话也能用上预热连接"""
+        self._connect = connect
+        self._last_used = time.monotonic()
+        self._ensure_maintenance()
+
+    def release(self, ws):
+        """归还会话已正常结束的连接，连接已断开或空闲连接已满时关闭"""
+        if not self._closed and is_open(ws) and len(self._idle) < self.max_idle:
+            self._idle.append((ws, time.monotonic()))
+        else:
+            self._close_later(ws)
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "leases": self.leases,
+            "warm_hits": self.warm_hits,
+            "connects": self.connects,
+            "evicted": self.evicted,
+        }
+
+    async def close(self):
+        self._closed = True
+        if self._maintain_task is not None:
+            self._maintain_task.cancel()
+            self._maintain_task = None
+        idle = [ws for ws, _ in self._idle]
+        self._idle.clear()
+        await asyncio.gather(*(self._close(ws) for ws in idle))
+
+    async def _open(self):
+        self._opening += 1
+        try:
+            ws = await self._connect()
+            self.connects += 1
+            return ws
+        finally:
+            self._opening -= 1
+
+    def _ensure_maintenance(self):
+        if self._closed or self.max_idle == 0:
+            return
+        if self._maintain_task is None or self._maintain_task.done():
+            self._maintain_task = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        """淘汰失效的空闲连接，最近有使用时补足预热连接，长时间无人使用后退出"""
+        # 检查间隔不超过空闲淘汰时间的三分之一，连接过期前就能补上新连接
+        interval = max(min(self.health_check_interval, self.max_idle_time / 3), 1)
+        try:
+            while not self._closed:
+                await self._check_idle()
+                if time.monotonic() - self._last_used < self.keep_warm_time:
+                    self._refill()
+                elif not self._idle and not self._opening:
+                    break
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"TTS连接池维护任务出错 {self.name}: {e}")
+
+    def _refill(self):
+        if self._connect is None:
+            return
+        for _ in range(self.min_idle - len(self._idle) - self._opening):
+            asyncio.create_task(self._refill_one())
+
+    async def _refill_one(self):
+        try:
+            ws = await self._open()
+        except Exception as e:
+            logger.bind(tag=TAG).warning(f"TTS预热连接建立失败 {self.name}: {e}")
+            return
+        self.release(ws)
+
+    async def _check_idle(self):
+        now = time.monotonic()
+        for item in list(self._idle):
+            ws, since = item
+            if not is_open(ws) or now - since >= self.max_idle_time:
+                self._evict(item)
+        items = list(self._idle)
+        if not items:
+            return
+        results = await asyncio.gather(*(self._ping(ws) for ws, _ in items))
+        for item, ok in zip(items, results):
+            if not ok:
+                self._evict(item)
+
+    def _evict(self, item):
+        try:
+            self._idle.remove(item)
+        except ValueError:
+            # 检查期间已被租出
+            return
+        self.evicted += 1
+        self._close_later(item[0])
+
+    @staticmethod
+    async def _ping(ws) -> bool:
+        try:
+            pong = await ws.ping()
+            await asyncio.wait_for(pong, timeout=PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    def _close_later(self, ws):
+        asyncio.ensure_future(self._close(ws))
+
+    @staticmethod
+    async def _close(ws):
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+
+class TTSWebSocketPools:
+    """按键和事件循环分配连接池"""
+
+    def __init__(
+        self,
+        min_idle: int = DEFAULT_MIN_IDLE,
+        max_idle: int = DEFAULT_MAX_IDLE,
+        max_idle_time: float = DEFAULT_MAX_IDLE_TIME,
+        keep_warm_time: float = DEFAULT_KEEP_WARM_TIME,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+    ):
+        self.defaults = {
+            "min_idle": min_idle,
+            "max_idle": max_idle,
+            "max_idle_time": max_idle_time,
+            "keep_warm_time": keep_warm_time,
+            "health_check_interval": health_check_interval,
+        }
+        self._lock = threading.Lock()
+        # (键, 事件循环) -> 连接池
+        self._pools: Dict[tuple, WebSocketPool] = {}
+
+    def pool(self, key: Hashable, name: str = None, **overrides) -> WebSocketPool:
+        """获取当前事件循环上键对应的连接池，需在事件循环中调用
+
+        key中应包含建立连接时使用的凭证，name用于日志，不要包含凭证。
+        overrides可以按提供者覆盖默认参数，例如服务端会主动断开空闲连接时缩短max_idle_time
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for stale in [k for k in self._pools if k[1].is_closed()]:
+                self._pools.pop(stale)
+            pool = self._pools.get((key, loop))
+            if pool is None:
+                options = dict(self.defaults)
+                for option, value in overrides.items():
+                    if value is not None:
+                        # 按提供者设置的空闲时间不超过全局配置
+                        if option == "max_idle_time":
+                            value = min(float(value), float(options[option]))
+                        options[option] = value
+                pool = self._pools[(key, loop)] = WebSocketPool(
+                    name or "tts", **options
+                )
+            return pool
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            pools = list(self._pools.values())
+        result = {}
+        for pool in pools:
+            item = result.setdefault(
+                pool.name,
+                {"idle": 0, "leases": 0, "warm_hits": 0, "connects": 0, "evicted": 0},
+            )
+            for field, value in pool.stats().items():
+                item[field] += value
+        return result
+
+    def log_stats(self):
+        for name, item in self.stats().items():
+            logger.bind(tag=TAG).info(
+                f"TTS连接池 {name}: 会话{item['leases']}次, "
+                f"使用已打开连接{item['warm_hits']}次, 新建连接{item['connects']}个"
+            )
+
+    async def close_async(self):
+        """关闭当前事件循环上的所有连接池"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [k for k in self._pools if k[1] is loop]
+            pools = [self._pools.pop(k) for k in keys]
+        await asyncio.gather(*(pool.close() for pool in pools))
+
+
+_tts_ws_pools = None
+_tts_ws_pools_lock = threading.Lock()
+
+
+def init_tts_ws_pools(config: dict = None) -> TTSWebSocketPools:
+    """根据配置创建全局TTS连接池，已创建时直接返回"""
+    global _tts_ws_pools
+    with _tts_ws_pools_lock:
+        if _tts_ws_pools is None:
+            pool_config = (config or {}).get("tts_ws_pool", {}) or {}
+
+            def option(name, default):
+                value = pool_config.get(name)
+                return default if value in (None, "") else value
+
+            _tts_ws_pools = TTSWebSocketPools(
+                min_idle=option("min_idle", DEFAULT_MIN_IDLE),
+                max_idle=option("max_idle", DEFAULT_MAX_IDLE),
+                max_idle_time=option("max_idle_time", DEFAULT_MAX_IDLE_TIME),
+                keep_warm_time=option("keep_warm_time", DEFAULT_KEEP_WARM_TIME),
+                health_check_interval=option(
+                    "health_check_interval", DEFAULT_HEALTH_CHECK_INTERVAL
+                ),
+            )
+        return _tts_ws_pools
+
+
+def get_tts_ws_pools() -> TTSWebSocketPools:
+    """获取全局TTS连接池"""
+    return _tts_ws_pools or init_tts_ws_pools()
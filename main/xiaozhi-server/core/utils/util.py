@@ -6,10 +6,18 @@ import os
 import wave
 from io import BytesIO
 from core.utils import p3
-import numpy as np
+from core.utils.opus_codec import (
+    DEFAULT_AUDIO_PARAMS,
+    MAX_PACKET_DURATION_MS,
+    SAMPLE_RATE,
+    opus_decoder,
+    iter_pcm_frames,
+    encode_pcm_frames,
+    decode_opus_frames,
+)
 import requests
-import opuslib_next
-from pydub import AudioSegment
+from core.utils.audio_decode import decode_audio, sniff_audio_format
+from core.utils.opus_packet import OpusPacketError, opus_container_to_packets
 import copy
 import io
 import logging
@@ -221,92 +229,73 @@ def extract_json_from_string(input_string):
     return None
 
 
-def audio_to_data(audio_file_path, is_opus=True):
+def audio_to_data(audio_file_path, is_opus=True, audio_params=None):
     # 获取文件后缀名
     file_type = os.path.splitext(audio_file_path)[1]
     if file_type:
         file_type = file_type.lstrip(".")
-    # 读取音频文件，-nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
-    audio = AudioSegment.from_file(
-        audio_file_path, format=file_type, parameters=["-nostdin"]
-    )
-
-    # 转换为单声道/16kHz采样率/16位小端编码（确保与编码器匹配）
-    audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-
-    # 音频时长(秒)
-    duration = len(audio) / 1000.0
-
-    # 获取原始PCM数据（16位小端）
-    raw_data = audio.raw_data
-    return pcm_to_data(raw_data, is_opus), duration
+    with open(audio_file_path, "rb") as f:
+        audio_bytes = f.read()
+    return audio_bytes_to_data(audio_bytes, file_type, is_opus, audio_params)
 
 
-def audio_bytes_to_data(audio_bytes, file_type, is_opus=True):
+def audio_bytes_to_data(audio_bytes, file_type, is_opus=True, audio_params=None):
     """
-    直接用音频二进制数据转为opus/pcm数据，支持wav、mp3、p3
+    直接用音频二进制数据转为opus/pcm数据，支持wav、mp3、pcm、p3、Ogg/WebM Opus等格式
+    audio_params为设备协商的采样率和帧时长，默认16kHz、60ms
     """
+    audio_params = audio_params or DEFAULT_AUDIO_PARAMS
     if file_type == "p3":
-        # 直接用p3解码
-        return p3.decode_opus_from_bytes(audio_bytes)
-    else:
-        # 其他格式用pydub
-        audio = AudioSegment.from_file(
-            BytesIO(audio_bytes), format=file_type, parameters=["-nostdin"]
+        opus_datas, duration = p3.decode_opus_from_bytes(audio_bytes)
+        if audio_params.is_default:
+            # 直接用p3解码
+            return opus_datas, duration
+        # p3固定为16kHz、60ms一帧，按协商的参数重新编码
+        raw_data = b"".join(
+            decode_opus_frames(
+                opus_datas,
+                audio_params.sample_rate,
+                frame_duration_ms=MAX_PACKET_DURATION_MS,
+            )
         )
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        duration = len(audio) / 1000.0
-        raw_data = audio.raw_data
-        return pcm_to_data(raw_data, is_opus), duration
-
-
-def pcm_to_data(raw_data, is_opus=True):
-    # 初始化Opus编码器
-    encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
-
-    # 编码参数
-    frame_duration = 60  # 60ms per frame
-    frame_size = int(16000 * frame_duration / 1000)  # 960 samples/frame
-
-    datas = []
-    # 按帧处理所有音频数据（包括最后一帧可能补零）
-    for i in range(0, len(raw_data), frame_size * 2):  # 16bit=2bytes/sample
-        # 获取当前帧的二进制数据
-        chunk = raw_data[i : i + frame_size * 2]
-
-        # 如果最后一帧不足，补零
-        if len(chunk) < frame_size * 2:
-            chunk += b"\x00" * (frame_size * 2 - len(chunk))
-
-        if is_opus:
-            # 转换为numpy数组处理
-            np_frame = np.frombuffer(chunk, dtype=np.int16)
-            # 编码Opus数据
-            frame_data = encoder.encode(np_frame.tobytes(), frame_size)
-        else:
-            frame_data = chunk if isinstance(chunk, bytes) else bytes(chunk)
-
-        datas.append(frame_data)
-
-    return datas
+        return pcm_to_data(raw_data, is_opus, audio_params), duration
+    audio_format = sniff_audio_format(audio_bytes, file_type)
+    if is_opus and audio_format in ("ogg", "webm"):
+        # Opus音频直接重新组包，不解码再编码
+        try:
+            return opus_container_to_packets(
+                audio_bytes, audio_format, audio_params.frame_duration
+            )
+        except OpusPacketError as e:
+            logger.debug(f"无法直通Opus音频，改为解码: {e}")
+    # 转换为单声道/协商采样率/16位小端编码（确保与编码器匹配）
+    raw_data = decode_audio(audio_bytes, file_type, audio_params.sample_rate)
+    # 音频时长(秒)
+    duration = len(raw_data) / (audio_params.sample_rate * 2)
+    return pcm_to_data(raw_data, is_opus, audio_params), duration
+
+
+def pcm_to_data(raw_data, is_opus=True, audio_params=None):
+    # 按协商的帧时长（默认60ms）切分，最后一帧不足时补零
+    audio_params = audio_params or DEFAULT_AUDIO_PARAMS
+    if is_opus:
+        # 编码器从共享池借用，不再每次新建
+        return encode_pcm_frames(
+            raw_data,
+            sample_rate=audio_params.sample_rate,
+            frame_duration_ms=audio_params.frame_duration,
+        )
+    return [
+        frame.tobytes() for frame in iter_pcm_frames(raw_data, audio_params.frame_bytes)
+    ]
 
 
 def opus_datas_to_wav_bytes(opus_datas, sample_rate=16000, channels=1):
     """
     将opus帧列表解码为wav字节流
     """
-    decoder = opuslib_next.Decoder(sample_rate, channels)
-    pcm_datas = []
-
-    frame_duration = 60  # ms
-    frame_size = int(sample_rate * frame_duration / 1000)  # 960
-
-    for opus_frame in opus_datas:
-        # 解码为PCM（返回bytes，2字节/采样点）
-        pcm = decoder.decode(opus_frame, frame_size)
-        pcm_datas.append(pcm)
-
-    pcm_bytes = b"".join(pcm_datas)
+    # 解码为PCM（返回bytes，2字节/采样点）
+    pcm_bytes = b"".join(decode_opus_frames(opus_datas, sample_rate, channels))
 
     # 写入wav字节流
     wav_buffer = BytesIO()
@@ -488,46 +477,42 @@ logger = logging.getLogger(__name__)
 def decode_opus(opus_packets: List[bytes]) -> bytes:
     """
     Декодирует Opus-пакеты в PCM 16-bit, 16kHz, mono.
-    Использует opuslib.
-    Установка: pip install opuslib
+    Декодер берётся из общего пула opus_codec.
     """
     try:
-        import opuslib
-
-        # Создаём декодер: 16 кГц, 1 канал
-        decoder = opuslib.Decoder(fs=16000, channels=1)
-
-        pcm_data = b""
-
-        for i, packet in enumerate(opus_packets):
-            try:
-                # Убедимся, что packet — это bytes
-                if isinstance(packet, memoryview):
-                    packet = packet.tobytes()
-                elif isinstance(packet, bytearray):
-                    packet = bytes(packet)
-                elif not isinstance(packet, (bytes, bytearray)):
-                    logger.warning(f"Пакет {i} имеет тип {type(packet)}, пропущен")
+        pcm_data = []
+
+        with opus_decoder() as decoder:
+            for i, packet in enumerate(opus_packets):
+                try:
+                    # Убедимся, что packet — это bytes
+                    if isinstance(packet, (memoryview, bytearray)):
+                        packet = bytes(packet)
+                    elif not isinstance(packet, bytes):
+                        logger.warning(f"Пакет {i} имеет тип {type(packet)}, пропущен")
+                        continue
+
+                    # Длина пакета
+                    if len(packet) == 0:
+                        continue
+
+                    # Буфер на максимальную длину пакета Opus (120 мс при 16 кГц),
+                    # чтобы принимать кадры любой согласованной длительности
+                    frame = decoder.decode(
+                        packet, SAMPLE_RATE * MAX_PACKET_DURATION_MS // 1000
+                    )
+
+                    if frame:
+                        pcm_data.append(frame)
+                    else:
+                        logger.debug(f"Декодер вернул пустой фрейм для пакета {i}")
+
+                except Exception as e:
+                    logger.warning(f"Ошибка декодирования пакета {i} (длина {len(packet)}): {e}")
                     continue
 
-                # Длина пакета
-                if len(packet) == 0:
-                    continue
-
-                # Декодируем пакет
-                # opuslib требует, чтобы frame_size был кратен 2.5, 5, 10, 20, 40 или 60 мс
-                # При 16 кГц: 960 сэмплов = 60 мс
-                frame = decoder.decode(packet, frame_size=960)
-
-                if frame:
-                    pcm_data += frame
-                else:
-                    logger.debug(f"Декодер вернул пустой фрейм для пакета {i}")
-
-            except Exception as e:
-                logger.warning(f"Ошибка декодирования пакета {i} (длина {len(packet)}): {e}")
-                continue
-
+        # Склеиваем один раз, а не на каждом пакете
+        pcm_data = b"".join(pcm_data)
         if not pcm_data:
             logger.error("После декодирования PCM-данные пусты")
         else:
@@ -535,9 +520,6 @@ def decode_opus(opus_packets: List[bytes]) -> bytes:
 
         return pcm_data
 
-    except ImportError:
-        logger.critical("Модуль 'opuslib' не установлен. Выполните: pip install opuslib")
-        raise
     except Exception as e:
         logger.error(f"Критическая ошибка при декодировании Opus: {e}")
-        return b""
\ No newline at end of file
+        return b""
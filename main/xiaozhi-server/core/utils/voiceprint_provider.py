@@ -5,6 +5,7 @@ import aiohttp
 from urllib.parse import urlparse, parse_qs
 from typing import Optional, Dict
 from config.logger import setup_logging
+from core.utils.http_client import async_http_session
 
 TAG = __name__
 logger = setup_logging()
@@ -99,31 +100,32 @@ class VoiceprintProvider:
             timeout = aiohttp.ClientTimeout(total=10)
             
             # 网络请求
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(self.api_url, headers=headers, data=data) as response:
+            # 使用按主机共享的连接池，复用keep-alive连接
+            session = async_http_session(self.api_url)
+            async with session.post(self.api_url, headers=headers, data=data, timeout=timeout) as response:
+                
+                if response.status == 200:
+                    result = await response.json()
+                    speaker_id = result.get("speaker_id")
+                    score = result.get("score", 0)
+                    total_elapsed_time = time.monotonic() - api_start_time
+                    
+                    logger.bind(tag=TAG).info(f"声纹识别耗时: {total_elapsed_time:.3f}s")
+                    
+                    # 置信度检查
+                    if score < 0.5:
+                        logger.bind(tag=TAG).warning(f"声纹识别置信度较低: {score:.3f}")
                     
-                    if response.status == 200:
-                        result = await response.json()
-                        speaker_id = result.get("speaker_id")
-                        score = result.get("score", 0)
-                        total_elapsed_time = time.monotonic() - api_start_time
-                        
-                        logger.bind(tag=TAG).info(f"声纹识别耗时: {total_elapsed_time:.3f}s")
-                        
-                        # 置信度检查
-                        if score < 0.5:
-                            logger.bind(tag=TAG).warning(f"声纹识别置信度较低: {score:.3f}")
-                        
-                        if speaker_id and speaker_id in self.speaker_map:
-                            result_name = self.speaker_map[speaker_id]["name"]
-                            return result_name
-                        else:
-                            logger.bind(tag=TAG).warning(f"未识别的说话人ID: {speaker_id}")
-                            return "未知说话人"
+                    if speaker_id and speaker_id in self.speaker_map:
+                        result_name = self.speaker_map[speaker_id]["name"]
+                        return result_name
                     else:
-                        logger.bind(tag=TAG).error(f"声纹识别API错误: HTTP {response.status}")
-                        return None
-                        
+                        logger.bind(tag=TAG).warning(f"未识别的说话人ID: {speaker_id}")
+                        return "未知说话人"
+                else:
+                    logger.bind(tag=TAG).error(f"声纹识别API错误: HTTP {response.status}")
+                    return None
+                    
         except asyncio.TimeoutError:
             elapsed = time.monotonic() - api_start_time
             logger.bind(tag=TAG).error(f"声纹识别超时: {elapsed:.3f}s")
@@ -0,0 +1,274 @@
+"""
+连接运行时的共享工作线程池
+所有连接共用有界线程池执行阻塞任务，按连接轮询调度保证公平，线程数量不随连接数增长。
+LLM对话在整段流式输出期间一直占用线程，放在单独的对话线程池中，
+共享线程池只执行TTS、本地ASR、连接初始化等时延敏感的任务，不会被长对话占满
+"""
+
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from collections import OrderedDict, deque
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_MAX_PER_CONNECTION = 4
+# LLM对话使用的独立线程池大小
+DEFAULT_CHAT_WORKERS = 32
+# 阻塞插件使用的独立线程池大小
+DEFAULT_PLUGIN_WORKERS = 8
+
+
+class AsyncQueue(queue.Queue):
+    """线程安全队列，除了阻塞的get外，还可以在事件循环中用 get_async 等待
+
+    生产者可以在任意线程中调用 put，消费者作为事件循环中的任务运行，不需要单独的轮询线程
+    """
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._async_waiters = []
+
+    def _put(self, item):
+        super()._put(item)
+        # put 调用时已持有 self.mutex
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake_waiter, waiter)
+
+    async def get_async(self):
+        """在事件循环中等待并取出一条数据"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.mutex:
+                if self._qsize():
+                    item = self._get()
+                    self.not_full.notify()
+                    return item
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class WorkerPool:
+    """按连接公平调度的有界线程池
+
+    每个连接有自己的待执行队列，同一连接最多同时占用 max_per_connection 个线程，
+    空闲线程按轮询顺序分配给有待执行任务的连接，避免单个连接占满线程池
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_per_connection: int = DEFAULT_MAX_PER_CONNECTION,
+    ):
+        self.max_workers = max(int(max_workers), 1)
+        self.max_per_connection = max(int(max_per_connection), 1)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="conn-worker"
+        )
+        self._lock = threading.Lock()
+        # owner -> deque[(future, fn, args, kwargs)]，顺序即轮询顺序
+        self._pending = OrderedDict()
+        self._running = {}
+        self._active = 0
+
+    def submit(self, owner, fn, *args, **kwargs) -> concurrent.futures.Future:
+        """提交阻塞任务，返回 concurrent.futures.Future"""
+        future = concurrent.futures.Future()
+        with self._lock:
+            jobs = self._pending.get(owner)
+            if jobs is None:
+                jobs = self._pending[owner] = deque()
+            jobs.append((future, fn, args, kwargs))
+        self._dispatch()
+        return future
+
+    async def run(self, owner, fn, *args, **kwargs):
+        """在事件循环中提交阻塞任务并等待结果"""
+        return await asyncio.wrap_future(self.submit(owner, fn, *args, **kwargs))
+
+    def executor_for(self, owner) -> "ConnectionExecutor":
+        """返回绑定到某个连接的执行器，接口与 ThreadPoolExecutor 的 submit/shutdown 一致"""
+        return ConnectionExecutor(self, owner)
+
+    def cancel_pending(self, owner) -> int:
+        """取消某个连接尚未开始执行的任务，返回取消的数量"""
+        with self._lock:
+            jobs = self._pending.pop(owner, None)
+        if not jobs:
+            return 0
+        for future, _, _, _ in jobs:
+            future.cancel()
+        return len(jobs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "pending": sum(len(jobs) for jobs in self._pending.values()),
+                "connections": len(self._pending.keys() | self._running.keys()),
+            }
+
+    def _dispatch(self):
+        """把空闲线程分配给下一个可执行的连接"""
+        ready = []
+        with self._lock:
+            while self._active < self.max_workers and self._pending:
+                owner = next(
+                    (
+                        o
+                        for o in self._pending
+                        if self._running.get(o, 0) < self.max_per_connection
+                    ),
+                    None,
+                )
+                if owner is None:
+                    break
+                jobs = self._pending[owner]
+                job = jobs.popleft()
+                if jobs:
+                    self._pending.move_to_end(owner)
+                else:
+                    del self._pending[owner]
+                self._running[owner] = self._running.get(owner, 0) + 1
+                self._active += 1
+                ready.append((owner, job))
+        for owner, job in ready:
+            self._executor.submit(self._run_job, owner, *job)
+
+    def _run_job(self, owner, future, fn, args, kwargs):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._active -= 1
+                running = self._running.get(owner, 1) - 1
+                if running > 0:
+                    self._running[owner] = running
+                else:
+                    self._running.pop(owner, None)
+            self._dispatch()
+
+
+class ConnectionExecutor:
+    """单个连接在共享线程池中的执行器"""
+
+    def __init__(self, pool: WorkerPool, owner):
+        self._pool = pool
+        self._owner = owner
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs) -> concurrent.futures.Future:
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        return self._pool.submit(self._owner, fn, *args, **kwargs)
+
+    async def run(self, fn, *args, **kwargs):
+        return await self._pool.run(self._owner, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = False, cancel_futures: bool = False):
+        """停止接收新任务；线程属于共享线程池，不会被关闭"""
+        self._shutdown = True
+        if cancel_futures:
+            self._pool.cancel_pending(self._owner)
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def init_worker_pool(config: dict = None) -> WorkerPool:
+    """根据配置创建全局线程池，已创建时直接返回"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            pool_config = (config or {}).get("worker_pool", {}) or {}
+            _worker_pool = WorkerPool(
+                max_workers=pool_config.get("max_workers") or DEFAULT_MAX_WORKERS,
+                max_per_connection=pool_config.get("max_per_connection")
+                or DEFAULT_MAX_PER_CONNECTION,
+            )
+            logger.bind(tag=TAG).info(
+                f"共享线程池已创建: max_workers={_worker_pool.max_workers}, "
+                f"max_per_connection={_worker_pool.max_per_connection}"
+            )
+        return _worker_pool
+
+
+def get_worker_pool() -> WorkerPool:
+    """获取全局线程池"""
+    return _worker_pool or init_worker_pool()
+
+
+_chat_pool = None
+
+
+def init_chat_pool(config: dict = None) -> WorkerPool:
+    """创建执行LLM对话的独立线程池，已创建时直接返回
+
+    对话任务在整段流式输出期间占用线程，与TTS、连接初始化共用线程池时，
+    并发对话数达到线程数后所有连接的TTS和新连接都要等某个对话结束
+    """
+    global _chat_pool
+    with _worker_pool_lock:
+        if _chat_pool is None:
+            pool_config = (config or {}).get("worker_pool", {}) or {}
+            _chat_pool = WorkerPool(
+                max_workers=pool_config.get("chat_workers") or DEFAULT_CHAT_WORKERS,
+                max_per_connection=pool_config.get("max_per_connection")
+                or DEFAULT_MAX_PER_CONNECTION,
+            )
+            logger.bind(tag=TAG).info(
+                f"对话线程池已创建: max_workers={_chat_pool.max_workers}"
+            )
+        return _chat_pool
+
+
+def get_chat_pool() -> WorkerPool:
+    """获取执行LLM对话的线程池"""
+    return _chat_pool or init_chat_pool()
+
+
+_plugin_pool = None
+
+
+def init_plugin_pool(config: dict = None) -> WorkerPool:
+    """创建执行阻塞插件的独立线程池，已创建时直接返回
+
+    插件调用发生在LLM对话任务中，对话任务本身占着对话线程池的线程并同步等待插件结果，
+    插件再向同一个线程池申请线程会形成嵌套，对话多时所有插件都等不到线程
+    """
+    global _plugin_pool
+    with _worker_pool_lock:
+        if _plugin_pool is None:
+            pool_config = (config or {}).get("worker_pool", {}) or {}
+            _plugin_pool = WorkerPool(
+                max_workers=pool_config.get("plugin_workers")
+                or DEFAULT_PLUGIN_WORKERS,
+                max_per_connection=pool_config.get("max_per_connection")
+                or DEFAULT_MAX_PER_CONNECTION,
+            )
+            logger.bind(tag=TAG).info(
+                f"插件线程池已创建: max_workers={_plugin_pool.max_workers}"
+            )
+        return _plugin_pool
+
+
+def get_plugin_pool() -> WorkerPool:
+    """获取执行阻塞插件的线程池"""
+    return _plugin_pool or init_plugin_pool()
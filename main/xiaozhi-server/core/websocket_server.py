@@ -3,8 +3,15 @@ import websockets
 from config.logger import setup_logging
 from core.connection import ConnectionHandler
 from config.config_loader import get_config_from_api
+from config.agent_config_service import get_agent_config_service
 from core.utils.modules_initialize import initialize_modules
-from core.utils.util import check_vad_update, check_asr_update
+from core.utils.worker_pool import init_worker_pool, init_chat_pool, init_plugin_pool
+from core.utils.tts_cache import init_tts_cache
+from core.utils.http_client import init_http_clients
+from core.utils.tts_ws_pool import init_tts_ws_pools
+from core.utils.model_registry import init_model_registry, get_model_registry
+from core.utils.audio_decode import init_ffmpeg_pool
+from core.utils.audio_assets import preload_audio_assets
 
 TAG = __name__
 
@@ -14,6 +21,21 @@ class WebSocketServer:
         self.config = config
         self.logger = setup_logging()
         self.config_lock = asyncio.Lock()
+        # 所有连接共享一个有界线程池
+        init_worker_pool(self.config)
+        init_chat_pool(self.config)
+        init_plugin_pool(self.config)
+        # 各提供者按主机共享keep-alive连接
+        init_http_clients(self.config)
+        # 双流式TTS共享预热的WebSocket连接
+        init_tts_ws_pools(self.config)
+        # VAD和本地ASR模型按配置在所有连接之间共享
+        init_model_registry(self.config)
+        init_tts_cache(self.config)
+        # mp3等压缩格式由预先启动的ffmpeg进程解码
+        init_ffmpeg_pool(self.config)
+        # 提示音等静态音频提前转码到内存
+        preload_audio_assets(self.config)
         modules = initialize_modules(
             self.logger,
             self.config,
@@ -100,30 +122,31 @@ class WebSocketServer:
                     self.logger.bind(tag=TAG).error("获取新配置失败")
                     return False
                 self.logger.bind(tag=TAG).info(f"获取新配置成功")
-                # 检查 VAD 和 ASR 类型是否需要更新
-                update_vad = check_vad_update(self.config, new_config)
-                update_asr = check_asr_update(self.config, new_config)
-                self.logger.bind(tag=TAG).info(
-                    f"检查VAD和ASR类型是否需要更新: {update_vad} {update_asr}"
-                )
+                # 配置已更新，设备的差异化配置需要重新获取
+                get_agent_config_service().invalidate()
                 # 更新配置
                 self.config = new_config
-                # 重新初始化组件
+                # 重新初始化组件，VAD和ASR从共享模型注册表获取，配置未变化时复用原实例
                 modules = initialize_modules(
                     self.logger,
                     new_config,
-                    update_vad,
-                    update_asr,
+                    "VAD" in new_config["selected_module"],
+                    "ASR" in new_config["selected_module"],
                     "LLM" in new_config["selected_module"],
                     False,
                     "Memory" in new_config["selected_module"],
                     "Intent" in new_config["selected_module"],
                 )
 
-                # 更新组件实例
+                # 更新组件实例，旧实例交还注册表，正在使用的连接仍持有引用
+                registry = get_model_registry()
                 if "vad" in modules:
+                    if self._vad is not None:
+                        registry.release(self._vad)
                     self._vad = modules["vad"]
                 if "asr" in modules:
+                    if self._asr is not None:
+                        registry.release(self._asr)
                     self._asr = modules["asr"]
                 if "llm" in modules:
                     self._llm = modules["llm"]
@@ -0,0 +1,88 @@
+import asyncio
+import io
+import logging
+import time
+import wave
+
+import numpy as np
+from tabulate import tabulate
+
+from core.utils.audio_decode import (
+    FFmpegProcessPool,
+    decode_audio,
+    ffmpeg_decode_command,
+)
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "TTS音频解码微基准测试，对比每句启动ffmpeg、预启动ffmpeg进程池和进程内解析wav的耗时"
+
+
+class AudioDecodePerformanceTester:
+    def __init__(self, rounds: int = 20, seconds: float = 3.0, sample_rate: int = 24000):
+        self.rounds = rounds
+        # 模拟一句TTS返回的wav音频
+        self.wav_bytes = self._make_wav(seconds, sample_rate)
+        self.results = []
+
+    @staticmethod
+    def _make_wav(seconds: float, sample_rate: int) -> bytes:
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        samples = (np.sin(2 * np.pi * 440 * t) * 10000).astype("<i2")
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+    def _measure(self, name: str, decode):
+        timings = []
+        for _ in range(self.rounds):
+            start = time.perf_counter()
+            pcm = decode(self.wav_bytes)
+            timings.append(time.perf_counter() - start)
+            # 给进程池留出补充进程的时间，模拟句子之间的间隔
+            time.sleep(0.05)
+        timings.sort()
+        self.results.append(
+            [
+                name,
+                f"{sum(timings) / len(timings) * 1000:.1f}",
+                f"{timings[len(timings) // 2] * 1000:.1f}",
+                len(pcm),
+            ]
+        )
+
+    async def run(self):
+        print("开始TTS音频解码微基准测试...")
+        command = ffmpeg_decode_command(["-f", "wav"])
+        cold = FFmpegProcessPool(size=0)
+        warm = FFmpegProcessPool(size=2)
+        try:
+            self._measure("每句启动ffmpeg", lambda data: cold.decode(data, command))
+            self._measure("预启动ffmpeg进程池", lambda data: warm.decode(data, command))
+        except FileNotFoundError:
+            print("未找到ffmpeg，跳过ffmpeg相关测试")
+        finally:
+            cold.close()
+            warm.close()
+        self._measure("进程内解析wav", lambda data: decode_audio(data, "wav"))
+        print(
+            tabulate(
+                self.results,
+                headers=["实现", "平均耗时(ms)", "中位耗时(ms)", "PCM字节数"],
+                tablefmt="github",
+            )
+        )
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    await AudioDecodePerformanceTester().run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+import logging
+import time
+
+import numpy as np
+import opuslib_next
+from opuslib_next import constants
+from tabulate import tabulate
+
+from core.utils.util import pcm_to_data
+from core.utils.opus_codec import decode_opus_frames
+from core.utils.opus_encoder_utils import OpusEncoderUtils
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "Opus编解码微基准测试，对比每次新建编解码器与共享编解码器池的帧处理速度"
+
+FRAME_SIZE = 960  # 16kHz下60ms
+
+
+def legacy_pcm_to_data(raw_data):
+    """改造前的实现：每次新建编码器，每帧 frombuffer/tobytes 往返，末帧用字节拼接补零"""
+    encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
+    datas = []
+    for i in range(0, len(raw_data), FRAME_SIZE * 2):
+        chunk = raw_data[i : i + FRAME_SIZE * 2]
+        if len(chunk) < FRAME_SIZE * 2:
+            chunk += b"\x00" * (FRAME_SIZE * 2 - len(chunk))
+        np_frame = np.frombuffer(chunk, dtype=np.int16)
+        datas.append(encoder.encode(np_frame.tobytes(), FRAME_SIZE))
+    return datas
+
+
+def legacy_decode(opus_datas):
+    """改造前的实现：每次新建解码器"""
+    decoder = opuslib_next.Decoder(16000, 1)
+    return [decoder.decode(opus_data, FRAME_SIZE) for opus_data in opus_datas]
+
+
+class LegacyStreamEncoder:
+    """改造前的流式编码：每次用 np.append 追加缓冲区，编码参数与OpusEncoderUtils一致"""
+
+    def __init__(self):
+        self.encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
+        self.encoder.bitrate = 24000
+        self.encoder.complexity = 10
+        self.encoder.signal = constants.SIGNAL_VOICE
+        self.buffer = np.array([], dtype=np.int16)
+
+    def encode_pcm_to_opus(self, pcm_data, end_of_stream):
+        self.buffer = np.append(self.buffer, np.frombuffer(pcm_data, dtype=np.int16))
+        packets = []
+        offset = 0
+        while offset <= len(self.buffer) - FRAME_SIZE:
+            frame = self.buffer[offset : offset + FRAME_SIZE]
+            packets.append(self.encoder.encode(frame.tobytes(), FRAME_SIZE))
+            offset += FRAME_SIZE
+        self.buffer = self.buffer[offset:]
+        if end_of_stream and len(self.buffer) > 0:
+            last_frame = np.zeros(FRAME_SIZE, dtype=np.int16)
+            last_frame[: len(self.buffer)] = self.buffer
+            packets.append(self.encoder.encode(last_frame.tobytes(), FRAME_SIZE))
+            self.buffer = np.array([], dtype=np.int16)
+        return packets
+
+
+class CodecPerformanceTester:
+    def __init__(
+        self,
+        clip_seconds: float = 3,
+        clips: int = 50,
+        chunk_bytes: int = 640,
+        repeats: int = 5,
+    ):
+        self.clip_seconds = clip_seconds
+        self.clips = clips
+        # 每项重复测量取最快的一次，减少调度抖动的影响
+        self.repeats = repeats
+        # 流式TTS每次推送的PCM大小，默认20ms
+        self.chunk_bytes = chunk_bytes
+        rng = np.random.default_rng(0)
+        samples = rng.integers(-3000, 3000, int(16000 * clip_seconds), dtype=np.int16)
+        self.pcm = samples.tobytes()
+        self.results = []
+
+    def _measure(self, name, legacy_fn, new_fn, frames_per_clip, clips=None):
+        clips = clips or self.clips
+        best = {}
+        for fn in (legacy_fn, new_fn):
+            fn()  # 预热
+        # 两种实现交替测量，避免CPU频率变化只影响其中一种
+        for _ in range(self.repeats):
+            for label, fn in (("改造前", legacy_fn), ("改造后", new_fn)):
+                start = time.perf_counter()
+                for _ in range(clips):
+                    fn()
+                elapsed = time.perf_counter() - start
+                best[label] = min(best.get(label, elapsed), elapsed)
+        for label in ("改造前", "改造后"):
+            self.results.append(
+                [name, label, f"{frames_per_clip * clips / best[label]:,.0f}"]
+            )
+
+    def _stream(self, encoder):
+        for i in range(0, len(self.pcm), self.chunk_bytes):
+            end_of_stream = i + self.chunk_bytes >= len(self.pcm)
+            encoder.encode_pcm_to_opus(
+                self.pcm[i : i + self.chunk_bytes], end_of_stream
+            )
+
+    def run(self):
+        print("开始Opus编解码微基准测试...")
+        opus_datas = pcm_to_data(self.pcm)
+        frames = len(opus_datas)
+        self._measure(
+            "pcm_to_data",
+            lambda: legacy_pcm_to_data(self.pcm),
+            lambda: pcm_to_data(self.pcm),
+            frames,
+        )
+        self._measure(
+            "Opus解码",
+            lambda: legacy_decode(opus_datas),
+            lambda: decode_opus_frames(opus_datas),
+            frames,
+        )
+        # 单帧调用（如上报、唤醒词判断时解码少量音频包），编解码器的创建开销占比最大
+        single = opus_datas[:1]
+        self._measure(
+            "Opus解码(单帧)",
+            lambda: legacy_decode(single),
+            lambda: decode_opus_frames(single),
+            1,
+            clips=self.clips * 40,
+        )
+        legacy_stream = LegacyStreamEncoder()
+        new_stream = OpusEncoderUtils(16000, 1, 60)
+        self._measure(
+            "流式编码",
+            lambda: self._stream(legacy_stream),
+            lambda: self._stream(new_stream),
+            frames,
+        )
+        print(
+            tabulate(
+                self.results, headers=["测试项", "实现", "帧/秒"], tablefmt="github"
+            )
+        )
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    CodecPerformanceTester().run()
+
+
+if __name__ == "__main__":
+    CodecPerformanceTester().run()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import threading
+import time
+
+import requests
+from aiohttp import web
+from tabulate import tabulate
+
+from core.utils.http_client import HttpClientRegistry
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "HTTP连接池微基准测试，对比每次请求新建连接与按主机复用keep-alive连接"
+
+
+class LocalServer:
+    """在后台线程中运行的本地HTTP服务，模拟TTS接口"""
+
+    def __init__(self, payload_bytes: int = 32 * 1024):
+        self.payload = b"\x00" * payload_bytes
+        # 客户端地址(IP, 端口)各不相同即为新的TCP连接
+        self.peers = set()
+        self.port = None
+        self._ready = threading.Event()
+
+    @property
+    def connections(self):
+        return len(self.peers)
+
+    async def _handle(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        await request.read()
+        return web.Response(body=self.payload, content_type="audio/mpeg")
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        app = web.Application()
+        app.router.add_post("/tts", self._handle)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+        self.port = runner.addresses[0][1]
+        self._ready.set()
+        loop.run_forever()
+
+
+class HttpClientPerformanceTester:
+    def __init__(self, requests_count: int = 300, threads: int = 4):
+        self.requests_count = requests_count
+        self.threads = threads
+        self.server = LocalServer()
+        self.results = []
+
+    def _run_threads(self, post):
+        per_thread = self.requests_count // self.threads
+
+        def worker():
+            for _ in range(per_thread):
+                post("text=你好".encode("utf-8"))
+
+        threads = [threading.Thread(target=worker) for _ in range(self.threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+    def _measure(self, label, post):
+        before = self.server.connections
+        elapsed = self._run_threads(post)
+        self.results.append(
+            [
+                label,
+                f"{elapsed * 1000 / self.requests_count:.2f}",
+                self.server.connections - before,
+            ]
+        )
+
+    def run(self):
+        print("开始HTTP连接池微基准测试...")
+        self.server.start()
+        url = f"http://127.0.0.1:{self.server.port}/tts"
+
+        self._measure(
+            "requests.post(每次新建连接)",
+            lambda data: requests.post(url, data=data, timeout=10),
+        )
+        registry = HttpClientRegistry()
+        self._measure(
+            "http_session(url).post(复用连接)",
+            lambda data: registry.session(url).post(url, data=data, timeout=10),
+        )
+        print(
+            tabulate(
+                self.results,
+                headers=["实现", "平均耗时(ms)", "新建TCP连接数"],
+                tablefmt="github",
+            )
+        )
+        print("连接池统计:", registry.stats())
+        print("注意：本地回环没有TLS握手，远程HTTPS接口节省的耗时更多")
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    await asyncio.to_thread(HttpClientPerformanceTester().run)
+
+
+if __name__ == "__main__":
+    HttpClientPerformanceTester().run()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import numpy as np
+from tabulate import tabulate
+
+from config.settings import load_config
+from core.utils.asr import create_instance as create_stt_instance
+from core.providers.asr.local_scheduler import LocalASRScheduler, SAMPLE_RATE
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "本地语音识别并发性能测试，模拟多人同时说话时的排队与组批延迟"
+
+LOCAL_ASR_TYPES = ["fun_local", "sherpa_onnx_local"]
+
+
+class LocalASRPerformanceTester:
+    def __init__(self, concurrency=(1, 10, 50), rounds: int = 3, batch_sizes=(1, 8)):
+        self.config = load_config()
+        self.concurrency = concurrency
+        self.rounds = rounds
+        self.batch_sizes = batch_sizes
+        self.results = []
+
+    def _make_utterances(self, count: int) -> list:
+        """生成2~6秒的测试音频，长度不一，用于观察按长度组批的效果"""
+        rng = np.random.default_rng(0)
+        return [
+            rng.uniform(-0.1, 0.1, int(SAMPLE_RATE * rng.uniform(2, 6))).astype(
+                np.float32
+            )
+            for _ in range(count)
+        ]
+
+    async def _test_scheduler(self, scheduler: LocalASRScheduler, speakers: int) -> Dict:
+        """speakers个连接同时提交一句话，重复rounds轮"""
+        utterances = self._make_utterances(speakers)
+        latencies = []
+
+        async def speak(samples):
+            start = time.monotonic()
+            await scheduler.transcribe(samples)
+            latencies.append(time.monotonic() - start)
+
+        for _ in range(self.rounds):
+            await asyncio.gather(*(speak(samples) for samples in utterances))
+
+        stats = scheduler.stats()
+        return {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "queue_wait_p95": stats["queue_wait_p95_ms"] / 1000,
+            "avg_batch_size": stats["avg_batch_size"],
+        }
+
+    async def _test_asr(self, name: str, config: Dict):
+        try:
+            module_type = config.get("type", name)
+            if module_type not in LOCAL_ASR_TYPES:
+                return
+            asr = create_stt_instance(module_type, config, delete_audio_file=True)
+            print(f"测试 ASR: {name}")
+            for batch_size in self.batch_sizes:
+                for speakers in self.concurrency:
+                    # 每组测试使用独立的调度器，避免指标互相影响
+                    scheduler = LocalASRScheduler(
+                        asr._transcribe_batch,
+                        max_batch_size=batch_size,
+                        max_queue_size=max(speakers, 1) * 2,
+                        metrics_log_interval=0,
+                    )
+                    result = await self._test_scheduler(scheduler, speakers)
+                    result.update(
+                        {"name": name, "batch_size": batch_size, "speakers": speakers}
+                    )
+                    self.results.append(result)
+        except Exception as e:
+            print(f"{name} 测试失败: {str(e)}")
+
+    def _print_results(self):
+        """打印测试结果"""
+        if not self.results:
+            print("没有可用的本地ASR模块进行测试。")
+            return
+        table = [
+            [
+                r["name"],
+                r["batch_size"],
+                r["speakers"],
+                f"{r['p50']:.3f}秒",
+                f"{r['p95']:.3f}秒",
+                f"{r['queue_wait_p95']:.3f}秒",
+                f"{r['avg_batch_size']:.1f}",
+            ]
+            for r in self.results
+        ]
+        print("\n本地ASR并发测试结果:")
+        print(
+            tabulate(
+                table,
+                headers=[
+                    "模型名称",
+                    "最大批大小",
+                    "并发人数",
+                    "延迟P50",
+                    "延迟P95",
+                    "排队P95",
+                    "平均批大小",
+                ],
+                tablefmt="github",
+            )
+        )
+
+    async def run(self):
+        """执行测试"""
+        print("开始本地ASR并发测试...")
+        for name, config in self.config.get("ASR", {}).items():
+            await self._test_asr(name, config)
+        self._print_results()
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    tester = LocalASRPerformanceTester()
+    await tester.run()
+
+
+if __name__ == "__main__":
+    tester = LocalASRPerformanceTester()
+    asyncio.run(tester.run())
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from core.utils.opus_codec import (
+    SUPPORTED_FRAME_DURATIONS,
+    decode_opus_frames,
+    encode_pcm_frames,
+)
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "Opus帧长微基准测试，对比不同帧长和采样率下每秒音频的编解码CPU耗时和包数"
+
+
+class OpusFrameSizePerformanceTester:
+    def __init__(self, rounds: int = 5, seconds: float = 10.0):
+        self.rounds = rounds
+        self.seconds = seconds
+        self.results = []
+
+    def _make_pcm(self, sample_rate: int) -> bytes:
+        t = np.arange(int(self.seconds * sample_rate)) / sample_rate
+        # 带噪声的正弦波，避免编码器对纯音过度压缩
+        rng = np.random.default_rng(0)
+        samples = np.sin(2 * np.pi * 440 * t) * 8000 + rng.normal(0, 500, len(t))
+        return samples.astype("<i2").tobytes()
+
+    def _measure(self, sample_rate: int, frame_duration: int, pcm: bytes):
+        encode_times = []
+        decode_times = []
+        packets = []
+        for _ in range(self.rounds):
+            start = time.process_time()
+            packets = encode_pcm_frames(
+                pcm, sample_rate, frame_duration_ms=frame_duration
+            )
+            encode_times.append(time.process_time() - start)
+            start = time.process_time()
+            decode_opus_frames(packets, sample_rate, frame_duration_ms=frame_duration)
+            decode_times.append(time.process_time() - start)
+        encode_ms = min(encode_times) / self.seconds * 1000
+        decode_ms = min(decode_times) / self.seconds * 1000
+        self.results.append(
+            [
+                sample_rate,
+                frame_duration,
+                f"{encode_ms:.2f}",
+                f"{decode_ms:.2f}",
+                f"{len(packets) / self.seconds:.1f}",
+                f"{sum(len(p) for p in packets) / len(packets):.0f}",
+            ]
+        )
+
+    async def run(self):
+        print("开始Opus帧长微基准测试...")
+        for sample_rate in (16000, 24000):
+            pcm = self._make_pcm(sample_rate)
+            for frame_duration in SUPPORTED_FRAME_DURATIONS:
+                self._measure(sample_rate, frame_duration, pcm)
+        print(
+            tabulate(
+                self.results,
+                headers=[
+                    "采样率",
+                    "帧长(ms)",
+                    "编码CPU(ms/秒音频)",
+                    "解码CPU(ms/秒音频)",
+                    "包数/秒",
+                    "平均包大小(字节)",
+                ],
+                tablefmt="github",
+            )
+        )
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    await OpusFrameSizePerformanceTester().run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
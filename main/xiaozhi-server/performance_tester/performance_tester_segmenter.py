@@ -0,0 +1,113 @@
+import logging
+import time
+
+from tabulate import tabulate
+
+from core.utils import textUtils
+from core.utils.sentence_segmenter import (
+    SentenceSegmenter,
+    FIRST_SENTENCE_PUNCTUATIONS,
+    PUNCTUATIONS,
+)
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "TTS断句微基准测试，对比每个token全量拼接与增量断句的耗时"
+
+SAMPLE_TEXT = (
+    "好的，我来为你详细介绍一下。量子计算利用量子比特的叠加和纠缠特性进行运算，"
+    "在某些问题上比经典计算机快得多！比如大数分解、量子化学模拟等；"
+    "不过目前的量子计算机还处在早期阶段，噪声和纠错仍然是主要挑战。"
+    "你还想了解哪些方面呢？"
+)
+
+
+class LegacySegmenter:
+    """改造前的断句方式：每个token都拼接全部文本，再对未处理部分逐个标点rfind"""
+
+    def __init__(self):
+        self.tts_text_buff = []
+        self.processed_chars = 0
+        self.is_first_sentence = True
+
+    def feed(self, token):
+        self.tts_text_buff.append(token)
+        full_text = "".join(self.tts_text_buff)
+        current_text = full_text[self.processed_chars :]
+        punctuations = (
+            FIRST_SENTENCE_PUNCTUATIONS if self.is_first_sentence else PUNCTUATIONS
+        )
+        last_punct_pos = -1
+        for punct in punctuations:
+            pos = current_text.rfind(punct)
+            if pos != -1 and (last_punct_pos == -1 or pos < last_punct_pos):
+                last_punct_pos = pos
+        if last_punct_pos == -1:
+            return []
+        segment_text_raw = current_text[: last_punct_pos + 1]
+        self.processed_chars += len(segment_text_raw)
+        self.is_first_sentence = False
+        return [textUtils.get_string_no_punctuation_or_emoji(segment_text_raw)]
+
+    def flush(self):
+        full_text = "".join(self.tts_text_buff)
+        return textUtils.get_string_no_punctuation_or_emoji(
+            full_text[self.processed_chars :]
+        )
+
+
+class SegmenterPerformanceTester:
+    def __init__(self, reply_lengths=(500, 2000, 10000), token_size: int = 2):
+        self.reply_lengths = reply_lengths
+        self.token_size = token_size
+        self.results = []
+
+    def _make_tokens(self, length: int) -> list:
+        """把示例文本重复到指定长度，按token_size切成模拟的LLM输出"""
+        text = (SAMPLE_TEXT * (length // len(SAMPLE_TEXT) + 1))[:length]
+        return [
+            text[i : i + self.token_size] for i in range(0, len(text), self.token_size)
+        ]
+
+    def _run(self, segmenter, tokens: list):
+        start = time.perf_counter()
+        segments = 0
+        for token in tokens:
+            segments += len(segmenter.feed(token))
+        if segmenter.flush():
+            segments += 1
+        return time.perf_counter() - start, segments
+
+    def run(self):
+        print("开始TTS断句微基准测试...")
+        for length in self.reply_lengths:
+            tokens = self._make_tokens(length)
+            legacy_time, legacy_segments = self._run(LegacySegmenter(), tokens)
+            new_time, new_segments = self._run(SentenceSegmenter(), tokens)
+            self.results.append(
+                [
+                    length,
+                    len(tokens),
+                    f"{legacy_time * 1000:.2f}ms",
+                    f"{new_time * 1000:.2f}ms",
+                    f"{legacy_time / new_time:.1f}x" if new_time else "-",
+                    f"{legacy_segments}/{new_segments}",
+                ]
+            )
+        print(
+            tabulate(
+                self.results,
+                headers=["回复长度", "token数", "全量拼接", "增量断句", "加速比", "句子数(旧/新)"],
+                tablefmt="github",
+            )
+        )
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    SegmenterPerformanceTester().run()
+
+
+if __name__ == "__main__":
+    SegmenterPerformanceTester().run()
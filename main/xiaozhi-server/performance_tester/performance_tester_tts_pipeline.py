@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+
+from tabulate import tabulate
+
+from core.utils.worker_pool import WorkerPool
+from core.utils.tts_pipeline import TTSPipeline
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "非流式TTS流水线微基准测试，对比逐句合成与并发合成时句子之间的等待时间"
+
+
+class TTSPipelinePerformanceTester:
+    def __init__(
+        self,
+        sentences: int = 8,
+        synthesis_time: float = 0.8,
+        play_time: float = 0.5,
+    ):
+        self.sentences = sentences
+        # 模拟一次TTS请求的耗时和一句话的播放时长
+        self.synthesis_time = synthesis_time
+        self.play_time = play_time
+        self.pool = WorkerPool(max_workers=8, max_per_connection=4)
+        self.results = []
+
+    def _synthesize(self, index):
+        time.sleep(self.synthesis_time)
+        return index
+
+    async def _measure(self, concurrency: int):
+        """按顺序播放所有句子，统计每两句之间播放器空等的时间"""
+        loop = asyncio.get_running_loop()
+        audio_queue = asyncio.Queue()
+
+        def output(item):
+            loop.call_soon_threadsafe(audio_queue.put_nowait, item)
+
+        start = time.perf_counter()
+        if concurrency > 1:
+            pipeline = TTSPipeline(
+                submit=lambda fn: self.pool.submit("bench", fn),
+                output=output,
+                concurrency=concurrency,
+            )
+            for i in range(self.sentences):
+                pipeline.submit(self._synthesize, i)
+        else:
+
+            def serial():
+                for i in range(self.sentences):
+                    output(self._synthesize(i))
+
+            self.pool.submit("bench", serial)
+
+        order = []
+        gaps = []
+        first_audio = None
+        last_end = None
+        for _ in range(self.sentences):
+            order.append(await audio_queue.get())
+            now = time.perf_counter()
+            if first_audio is None:
+                first_audio = now - start
+            elif now > last_end:
+                gaps.append(now - last_end)
+            last_end = max(now, last_end or now) + self.play_time
+            await asyncio.sleep(max(last_end - time.perf_counter(), 0))
+
+        assert order == list(range(self.sentences)), order
+        self.results.append(
+            [
+                "逐句合成" if concurrency == 1 else f"流水线 concurrency={concurrency}",
+                f"{first_audio * 1000:.0f}",
+                f"{sum(gaps) * 1000:.0f}",
+                f"{(time.perf_counter() - start) * 1000:.0f}",
+            ]
+        )
+
+    async def run(self):
+        print("开始非流式TTS流水线微基准测试...")
+        for concurrency in (1, 2, 3):
+            await self._measure(concurrency)
+        print(
+            tabulate(
+                self.results,
+                headers=["实现", "首句耗时(ms)", "句间静音合计(ms)", "总耗时(ms)"],
+                tablefmt="github",
+            )
+        )
+        print(
+            f"注意：按每句合成{self.synthesis_time * 1000:.0f}ms、"
+            f"播放{self.play_time * 1000:.0f}ms模拟，共{self.sentences}句"
+        )
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    await TTSPipelinePerformanceTester().run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+
+import websockets
+from tabulate import tabulate
+
+from core.utils.tts_ws_pool import WebSocketPool
+
+# 设置全局日志级别为WARNING，抑制INFO级别日志
+logging.basicConfig(level=logging.WARNING)
+
+description = "双流式TTS WebSocket连接池微基准测试，对比每轮对话新建连接与租用预热连接的首包耗时"
+
+
+class LocalTTSServer:
+    """本地WebSocket服务，模拟双流式TTS：收到开始请求后返回一帧音频，收到结束请求后返回会话结束"""
+
+    def __init__(self, handshake_delay: float = 0.05):
+        # 模拟远程TLS+WebSocket握手的网络耗时
+        self.handshake_delay = handshake_delay
+        self.connections = 0
+        self.port = None
+        self._server = None
+
+    async def _process_request(self, connection, request):
+        await asyncio.sleep(self.handshake_delay)
+        self.connections += 1
+        return None
+
+    async def _handle(self, ws):
+        try:
+            async for msg in ws:
+                if msg == "start":
+                    await ws.send(b"\x00" * 640)
+                elif msg == "finish":
+                    await ws.send("finished")
+        except websockets.ConnectionClosed:
+            pass
+
+    async def start(self):
+        self._server = await websockets.serve(
+            self._handle, "127.0.0.1", 0, process_request=self._process_request
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+class TTSWebSocketPoolPerformanceTester:
+    def __init__(self, sessions: int = 30, think_time: float = 0.05):
+        self.sessions = sessions
+        # 两轮对话之间的间隔
+        self.think_time = think_time
+        self.server = LocalTTSServer()
+        self.results = []
+
+    async def _connect(self):
+        return await websockets.connect(f"ws://127.0.0.1:{self.server.port}")
+
+    async def _session(self, ws) -> float:
+        """开始会话到收到首帧音频的耗时由调用方统计，这里完成一轮会话"""
+        await ws.send("start")
+        await ws.recv()
+        first_audio = time.perf_counter()
+        await ws.send("finish")
+        await ws.recv()
+        return first_audio
+
+    async def _measure(self, label, lease, give_back):
+        before = self.server.connections
+        latencies = []
+        for _ in range(self.sessions):
+            start = time.perf_counter()
+            ws = await lease()
+            first_audio = await self._session(ws)
+            latencies.append(first_audio - start)
+            await give_back(ws)
+            await asyncio.sleep(self.think_time)
+        latencies.sort()
+        self.results.append(
+            [
+                label,
+                f"{sum(latencies) * 1000 / len(latencies):.2f}",
+                f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f}",
+                self.server.connections - before,
+            ]
+        )
+
+    async def run(self):
+        print("开始双流式TTS WebSocket连接池微基准测试...")
+        await self.server.start()
+
+        async def close(ws):
+            await ws.close()
+
+        await self._measure("每轮对话新建连接", self._connect, close)
+
+        pool = WebSocketPool("benchmark", min_idle=1, max_idle=4)
+        # 设备连上时预热
+        pool.warm(self._connect)
+        await asyncio.sleep(0.2)
+
+        async def lease():
+            return await pool.acquire(self._connect)
+
+        async def give_back(ws):
+            pool.release(ws)
+
+        await self._measure("连接池租用/归还", lease, give_back)
+        stats = pool.stats()
+        await pool.close()
+        await self.server.stop()
+
+        print(
+            tabulate(
+                self.results,
+                headers=["实现", "首帧平均耗时(ms)", "首帧P95(ms)", "新建连接数"],
+                tablefmt="github",
+            )
+        )
+        print("连接池统计:", stats)
+        print(
+            f"注意：握手耗时按{self.server.handshake_delay * 1000:.0f}ms模拟，"
+            "实际远程wss握手通常更慢"
+        )
+
+
+# 为了performance_tester.py的调用需求
+async def main():
+    await TTSWebSocketPoolPerformanceTester().run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -109,12 +109,12 @@ WEATHER_CODE_MAP = {
 
 def fetch_city_info(location, api_key, api_host):
     url = f"https://{api_host}/geo/v2/city/lookup?key={api_key}&location={location}&lang=zh"
-    response = requests.get(url, headers=HEADERS).json()
+    response = requests.get(url, headers=HEADERS, timeout=10).json()
     return response.get("location", [])[0] if response.get("location") else None
 
 
 def fetch_weather_page(url):
-    response = requests.get(url, headers=HEADERS)
+    response = requests.get(url, headers=HEADERS, timeout=10)
     return BeautifulSoup(response.text, "html.parser") if response.ok else None
 
 
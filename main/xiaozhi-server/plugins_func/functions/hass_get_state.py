@@ -1,8 +1,13 @@
-from plugins_func.register import register_function, ToolType, ActionResponse, Action
+from plugins_func.register import (
+    register_function,
+    get_http_session,
+    ToolType,
+    ActionResponse,
+    Action,
+)
 from plugins_func.functions.hass_init import initialize_hass_handler
 from config.logger import setup_logging
 import asyncio
-import requests
 
 TAG = __name__
 logger = setup_logging()
@@ -27,14 +32,12 @@ hass_get_state_function_desc = {
 
 
 @register_function("hass_get_state", hass_get_state_function_desc, ToolType.SYSTEM_CTL)
-def hass_get_state(conn, entity_id=""):
+async def hass_get_state(conn, entity_id=""):
     try:
-
-        future = asyncio.run_coroutine_threadsafe(
-            handle_hass_get_state(conn, entity_id), conn.loop
-        )
         # 添加10秒超时
-        ha_response = future.result(timeout=10)
+        ha_response = await asyncio.wait_for(
+            handle_hass_get_state(conn, entity_id), timeout=10
+        )
         return ActionResponse(Action.REQLLM, ha_response, None)
     except asyncio.TimeoutError:
         logger.bind(tag=TAG).error("获取Home Assistant状态超时")
@@ -51,44 +54,46 @@ async def handle_hass_get_state(conn, entity_id):
     base_url = ha_config.get("base_url")
     url = f"{base_url}/api/states/{entity_id}"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        responsetext = "设备状态:" + response.json()["state"] + " "
-        logger.bind(tag=TAG).info(f"api返回内容: {response.json()}")
+    async with get_http_session().get(url, headers=headers) as response:
+        status_code = response.status
+        response_json = await response.json() if status_code == 200 else None
+    if status_code == 200:
+        responsetext = "设备状态:" + response_json["state"] + " "
+        logger.bind(tag=TAG).info(f"api返回内容: {response_json}")
 
-        if "media_title" in response.json()["attributes"]:
+        if "media_title" in response_json["attributes"]:
             responsetext = (
                 responsetext
                 + "正在播放的是:"
-                + str(response.json()["attributes"]["media_title"])
+                + str(response_json["attributes"]["media_title"])
                 + " "
             )
-        if "volume_level" in response.json()["attributes"]:
+        if "volume_level" in response_json["attributes"]:
             responsetext = (
                 responsetext
                 + "音量是:"
-                + str(response.json()["attributes"]["volume_level"])
+                + str(response_json["attributes"]["volume_level"])
                 + " "
             )
-        if "color_temp_kelvin" in response.json()["attributes"]:
+        if "color_temp_kelvin" in response_json["attributes"]:
             responsetext = (
                 responsetext
                 + "色温是:"
-                + str(response.json()["attributes"]["color_temp_kelvin"])
+                + str(response_json["attributes"]["color_temp_kelvin"])
                 + " "
             )
-        if "rgb_color" in response.json()["attributes"]:
+        if "rgb_color" in response_json["attributes"]:
             responsetext = (
                 responsetext
                 + "rgb颜色是:"
-                + str(response.json()["attributes"]["rgb_color"])
+                + str(response_json["attributes"]["rgb_color"])
                 + " "
             )
-        if "brightness" in response.json()["attributes"]:
+        if "brightness" in response_json["attributes"]:
             responsetext = (
                 responsetext
                 + "亮度是:"
-                + str(response.json()["attributes"]["brightness"])
+                + str(response_json["attributes"]["brightness"])
                 + " "
             )
         logger.bind(tag=TAG).info(f"查询返回内容: {responsetext}")
@@ -97,4 +102,4 @@ async def handle_hass_get_state(conn, entity_id):
         # response.attributes
 
     else:
-        return f"切换失败，错误码: {response.status_code}"
+        return f"切换失败，错误码: {status_code}"
@@ -8,6 +8,7 @@ from pathlib import Path
 from core.handle.sendAudioHandle import send_stt_message
 from plugins_func.register import register_function, ToolType, ActionResponse, Action
 from core.utils.dialogue import Message
+from core.utils.music_library import get_music_library, DEFAULT_CACHE_DIR
 from core.providers.tts.dto.dto import TTSMessageDTO, SentenceType, ContentType
 
 TAG = __name__
@@ -33,7 +34,10 @@ play_music_function_desc = {
 }
 
 
-@register_function("play_music", play_music_function_desc, ToolType.SYSTEM_CTL)
+# 需要在事件循环线程中创建播放任务，不放入线程池
+@register_function(
+    "play_music", play_music_function_desc, ToolType.SYSTEM_CTL, blocking=False
+)
 def play_music(conn, song_name: str):
     try:
         music_intent = (
@@ -129,15 +133,24 @@ def initialize_music_handler(conn):
             MUSIC_CACHE["refresh_time"] = MUSIC_CACHE["music_config"].get(
                 "refresh_time", 60
             )
+            MUSIC_CACHE["cache_dir"] = MUSIC_CACHE["music_config"].get(
+                "cache_dir", DEFAULT_CACHE_DIR
+            )
         else:
             MUSIC_CACHE["music_dir"] = os.path.abspath("./music")
             MUSIC_CACHE["music_ext"] = (".mp3", ".wav", ".p3")
             MUSIC_CACHE["refresh_time"] = 60
+            MUSIC_CACHE["cache_dir"] = DEFAULT_CACHE_DIR
         # 获取音乐文件列表
         MUSIC_CACHE["music_files"], MUSIC_CACHE["music_file_names"] = get_music_files(
             MUSIC_CACHE["music_dir"], MUSIC_CACHE["music_ext"]
         )
         MUSIC_CACHE["scan_time"] = time.time()
+        # 后台把音乐库转码为p3，播放时直接读取
+        MUSIC_CACHE["library"] = get_music_library(
+            MUSIC_CACHE["music_dir"], MUSIC_CACHE["cache_dir"]
+        )
+        MUSIC_CACHE["library"].sync(MUSIC_CACHE["music_files"])
     return MUSIC_CACHE
 
 
@@ -157,6 +170,7 @@ async def handle_music_command(conn, text):
                 get_music_files(MUSIC_CACHE["music_dir"], MUSIC_CACHE["music_ext"])
             )
             MUSIC_CACHE["scan_time"] = time.time()
+            MUSIC_CACHE["library"].sync(MUSIC_CACHE["music_files"])
 
         potential_song = _extract_song_name(clean_text)
         if potential_song:
@@ -211,6 +225,9 @@ async def play_local_music(conn, specific_file=None):
         if not os.path.exists(music_path):
             conn.logger.bind(tag=TAG).error(f"选定的音乐文件不存在: {music_path}")
             return
+        # 已转码为p3时按需读取，PCM连接和协商了其他采样率、帧时长的设备仍使用原文件解码
+        if conn.audio_format != "pcm" and conn.audio_params.is_default:
+            music_path = MUSIC_CACHE["library"].get_p3_path(music_path) or music_path
         text = _get_random_play_prompt(selected_music)
         await send_stt_message(conn, text)
         conn.dialogue.put(Message(role="assistant", content=text))
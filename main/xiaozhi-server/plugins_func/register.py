@@ -1,10 +1,18 @@
+import asyncio
+import aiohttp
 from config.logger import setup_logging
+from core.utils.http_client import async_http_session
 from enum import Enum
 
 TAG = __name__
 
 logger = setup_logging()
 
+# 插件默认执行超时（秒），超时后直接返回错误，不再等待
+DEFAULT_PLUGIN_TIMEOUT = 15
+# 插件HTTP请求的默认超时（秒），单个请求可以用timeout参数覆盖
+PLUGIN_HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
 
 class ToolType(Enum):
     NONE = (1, "调用完工具后，不做其他操作")
@@ -42,11 +50,17 @@ class ActionResponse:
 
 
 class FunctionItem:
-    def __init__(self, name, description, func, type):
+    def __init__(self, name, description, func, type, blocking=True, timeout=None):
         self.name = name
         self.description = description
         self.func = func
         self.type = type
+        # 协程函数直接在事件循环中await
+        self.is_async = asyncio.iscoroutinefunction(func)
+        # 同步函数默认视为阻塞调用，放到线程池执行；
+        # 需要在事件循环线程中操作conn的轻量函数可声明blocking=False
+        self.blocking = blocking and not self.is_async
+        self.timeout = timeout or DEFAULT_PLUGIN_TIMEOUT
 
 
 class DeviceTypeRegistry:
@@ -79,17 +93,28 @@ class DeviceTypeRegistry:
 all_function_registry = {}
 
 
-def register_function(name, desc, type=None):
-    """注册函数到函数注册字典的装饰器"""
+def register_function(name, desc, type=None, blocking=True, timeout=None):
+    """注册函数到函数注册字典的装饰器
+
+    async def 定义的插件在事件循环中执行，可通过 get_http_session() 发起请求；
+    同步插件默认在共享线程池中执行，timeout 为执行超时秒数
+    """
 
     def decorator(func):
-        all_function_registry[name] = FunctionItem(name, desc, func, type)
+        all_function_registry[name] = FunctionItem(
+            name, desc, func, type, blocking=blocking, timeout=timeout
+        )
         logger.bind(tag=TAG).debug(f"函数 '{name}' 已加载，可以注册使用")
         return func
 
     return decorator
 
 
+def get_http_session() -> aiohttp.ClientSession:
+    """获取异步插件共享的aiohttp会话，需在事件循环中调用，不要关闭它"""
+    return async_http_session(timeout=PLUGIN_HTTP_TIMEOUT)
+
+
 def register_device_function(name, desc, type=None):
     """注册设备级别的函数到函数注册字典的装饰器"""
 